@@ -0,0 +1,38 @@
+"""Retention job: move old games out of the hot game_stats table.
+
+Games older than --max-age-days are moved into per-month archive tables
+(game_stats_archive_YYYY_MM) and added to the game_stats_summary totals used
+by show_stats. Charts read the archive with scan(include_archive=True) and
+training can mix a recent window with a sample of archived games.
+
+Usage:
+    python archive.py --max-age-days 90
+"""
+import sys
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from storage import open_store
+
+
+def archive_old_games(max_age_days, store=None):
+    """Archive games older than max_age_days. Returns the number of games moved"""
+    store = store or open_store()
+    # Stored timestamps are UTC (SQLite CURRENT_TIMESTAMP)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    return store.archive(cutoff.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-age-days", type=int, required=True, help="Archive games older than this")
+    args = parser.parse_args()
+    try:
+        moved = archive_old_games(args.max_age_days)
+    except NotImplementedError as e:  # e.g. GUESSNUMBER_STORAGE=columnar: segments are never archived
+        sys.exit(f"Cannot archive: {e}")
+    print(f"Archived {moved} games older than {args.max_age_days} days")
+
+
+if __name__ == "__main__":
+    main()
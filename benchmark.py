@@ -0,0 +1,449 @@
+"""Micro-benchmarks for the game, simulator and analytics.
+
+Usage:
+    python benchmark.py generator [--games N] [--persona NAME]
+    python benchmark.py storage [--rows N] [--scans N]
+    python benchmark.py startup [--runs N]
+    python benchmark.py writer [--games N]
+    python benchmark.py credentials [--seconds S] [--threads N]
+    python benchmark.py headless [--games N] [--batch N]
+    python benchmark.py ranges [--games N]
+    python benchmark.py snapshots [--players N]
+    python benchmark.py approximate [--players N]
+    python benchmark.py ingest [--players N] [--max-workers N]
+    python benchmark.py replay [--games N] [--workers N] [--model SPEC]
+"""
+import os
+import sys
+import subprocess
+import argparse
+import random
+import tempfile
+import time
+
+import database
+import simulation
+import storage
+
+
+def bench_generator(args):
+    """Compare the per-game generator with the vectorized batch generator"""
+    loop_games = min(args.games, 100_000)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(loop_games):
+        range_min = rng.randint(1, 50)
+        range_max = range_min + rng.randint(20, 100)
+        target = rng.randint(range_min, range_max)
+        simulation.generate_realistic_attempts(target, range_min, range_max, 7, rng)
+    loop_elapsed = time.perf_counter() - start
+    print(f"loop:  {loop_games:>11,} games in {loop_elapsed:.2f}s "
+          f"({loop_games / loop_elapsed:,.0f} games/s)")
+
+    start = time.perf_counter()
+    won = 0
+    for chunk in simulation.generate_synthetic_games(args.games, seed=0, persona=args.persona):
+        won += int(chunk["won"].sum())
+    batch_elapsed = time.perf_counter() - start
+    print(f"batch: {args.games:>11,} games in {batch_elapsed:.2f}s "
+          f"({args.games / batch_elapsed:,.0f} games/s, win rate {won / args.games:.1%})")
+
+
+def synthetic_rows(n_rows, seed=0):
+    """Game rows in storage.GAME_COLUMNS order for 100 synthetic users"""
+    rows = []
+    for chunk in simulation.generate_synthetic_games(n_rows, seed=seed):
+        for i in range(len(chunk["won"])):
+            count = int(chunk["attempts_count"][i])
+            rows.append(storage.game_row(
+                len(rows) % 100 + 1, str(chunk["difficulty"][i]),
+                chunk["attempts"][i, :count].tolist(), bool(chunk["won"][i]),
+                int(chunk["number_to_guess"][i]), int(chunk["range_min"][i]), int(chunk["range_max"][i]),
+                timestamp="2024-01-01 00:00:00"))
+    return rows
+
+
+def bench_storage(args):
+    """Write-heavy and scan-heavy throughput of each storage backend"""
+    rows = synthetic_rows(args.rows)
+    training_columns = ["attempts_array", "range_min", "range_max", "number_to_guess"]
+    with tempfile.TemporaryDirectory() as tmp:
+        specs = {
+            "sqlite": f"sqlite:{os.path.join(tmp, 'bench.db')}",
+            "columnar": f"columnar:{os.path.join(tmp, 'segments')}",
+        }
+        for name, spec in specs.items():
+            store = storage.open_store(spec)
+
+            # Write-heavy: one game per call (live play), then large batches (simulation)
+            single = rows[:min(len(rows), 2_000)]
+            start = time.perf_counter()
+            for row in single:
+                store.append([row])
+                store.flush()
+            single_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for offset in range(0, len(rows), 10_000):
+                store.append(rows[offset:offset + 10_000])
+            store.flush()
+            batch_elapsed = time.perf_counter() - start
+
+            # Scan-heavy: the projection used for training, repeated
+            start = time.perf_counter()
+            for _ in range(args.scans):
+                scanned = len(store.scan(training_columns))
+            scan_elapsed = (time.perf_counter() - start) / args.scans
+
+            print(f"{name:<9} single writes: {len(single) / single_elapsed:>10,.0f} rows/s   "
+                  f"batch writes: {len(rows) / batch_elapsed:>10,.0f} rows/s   "
+                  f"scan: {scanned / scan_elapsed:>12,.0f} rows/s ({scanned:,} rows)")
+            store.close()
+        database.close_all()
+
+
+def bench_writer(args):
+    """Caller-side latency of recording a game, synchronous store vs background writer"""
+    rows = synthetic_rows(args.games)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, wrap in (("synchronous", lambda store: store),
+                            ("background writer", storage.BackgroundWriter)):
+            store = wrap(storage.SQLiteGameStore(os.path.join(tmp, f"{label}.db")))
+            latencies = []
+            for row in rows:
+                start = time.perf_counter()
+                store.append([row])
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.close()
+            drain = time.perf_counter() - start
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1e6
+            p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+            print(f"{label:<18} p50 {p50:>8.1f} us   p99 {p99:>8.1f} us   "
+                  f"total {sum(latencies):.2f}s (+{drain:.2f}s drain on close)")
+        database.close_all()
+
+
+def bench_credentials(args):
+    """Password verifications per second, single thread and across a thread pool"""
+    import credentials
+    from concurrent.futures import ThreadPoolExecutor
+    configs = [("scrypt", credentials.SCHEMES["scrypt"]), ("pbkdf2", credentials.SCHEMES["pbkdf2"])]
+    if credentials.DEFAULT_PARAMS not in [params for _, params in configs]:
+        configs.insert(0, (credentials.DEFAULT_SCHEME, credentials.DEFAULT_PARAMS))
+    for scheme, params in configs:
+        stored = credentials.hash_password("correct horse", scheme, params)
+
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.seconds:
+            credentials.verify_password("correct horse", stored)
+            count += 1
+        single = count / (time.perf_counter() - start)
+
+        batch = max(args.threads, int(single * args.seconds * args.threads))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda _: credentials.verify_password("correct horse", stored), range(batch)))
+        pooled = batch / (time.perf_counter() - start)
+
+        print(f"{scheme} {params}: {single:,.1f} logins/s on 1 core, "
+              f"{pooled:,.1f} logins/s with {args.threads} threads "
+              f"({pooled / args.threads:,.1f} per thread)")
+
+    service = credentials.CredentialService()
+    stored = credentials.hash_password("correct horse")
+    service.verify("correct horse", stored).result()
+    start = time.perf_counter()
+    for _ in range(10_000):
+        service.verify("correct horse", stored).result()
+    print(f"cached verification: {10_000 / (time.perf_counter() - start):,.0f} logins/s")
+    service.shutdown()
+
+
+def bench_headless(args):
+    """Games/s through the headless API with a binary-search bot, per-game vs batched"""
+    import headless
+    from regression import initialize_model
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_db_path(os.path.join(tmp, "headless.db"))
+        simulation.run_simulation(simulation.SQLiteSink(), player_count=50, seed=0)
+        model = initialize_model(verbose=False)
+        user_id = database.get_connection().execute("SELECT MIN(id) FROM users").fetchone()[0]
+
+        for label, batch in (("one game per call", 1), (f"{args.batch} games per call", args.batch)):
+            api = headless.HeadlessGame(user_id, model=model, rng=random.Random(0))
+            start = time.perf_counter()
+            played = 0
+            while played < args.games:
+                size = min(batch, args.games - played)
+                bounds = {api.new_game("medium", 1, 1000): [1, 1000] for _ in range(size)}
+                while bounds:
+                    guesses = [(game_id, (low + high) // 2) for game_id, (low, high) in bounds.items()]
+                    for (game_id, guess), feedback in zip(guesses, api.submit_guesses(guesses)):
+                        if feedback["finished"]:
+                            del bounds[game_id]
+                        elif feedback["result"] == "higher":
+                            bounds[game_id][0] = guess + 1
+                        else:
+                            bounds[game_id][1] = guess - 1
+                played += size
+            api.close()
+            elapsed = time.perf_counter() - start
+            print(f"{label:<22} {played / elapsed:>10,.0f} games/s")
+        database.close_all()
+
+
+def bench_ranges(args):
+    """AI attempts and per-move latency, and attempt storage size, as the range grows to 2^63"""
+    import json
+    from regression import initialize_model
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_db_path(os.path.join(tmp, "ranges.db"))
+        simulation.run_simulation(simulation.SQLiteSink(), player_count=20, seed=0)
+        model = initialize_model(verbose=False)
+        database.close_all()
+
+    rng = random.Random(0)
+    print(f"{'range':>22} {'attempts':>9} {'max':>4} {'us/move':>9} {'JSON B':>7} {'packed B':>9}")
+    for range_max in (100, 10 ** 4, 10 ** 6, 10 ** 9, 10 ** 12, 10 ** 15, 2 ** 63 - 1):
+        games = []
+        start = time.perf_counter()
+        for _ in range(args.games):
+            target = rng.randint(1, range_max)
+            games.append(simulation.simulate_ai_game(model, target, 1, range_max, range(500)))
+        elapsed = time.perf_counter() - start
+        moves = sum(len(attempts) for attempts in games)
+        json_bytes = sum(len(json.dumps(attempts)) for attempts in games) / len(games)
+        packed_bytes = sum(len(storage.encode_attempts(attempts)) for attempts in games) / len(games)
+        print(f"{range_max:>22,} {moves / len(games):>9.1f} {max(map(len, games)):>4} "
+              f"{elapsed / moves * 1e6:>9.0f} {json_bytes:>7.0f} {packed_bytes:>9.0f}")
+
+
+def bench_snapshots(args):
+    """Chart dataset export (cold and cached) and snapshot size against JSON"""
+    import snapshots
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_db_path(os.path.join(tmp, "snapshots.db"))
+        simulation.run_simulation(simulation.SQLiteSink(), player_count=args.players, seed=0,
+                                  options={**simulation.DEFAULT_OPTIONS, "games": (50, 100)})
+        for fmt in ("arrow", "npz"):
+            directory = os.path.join(tmp, fmt)
+            start = time.perf_counter()
+            manifest = snapshots.export_snapshot(directory, fmt)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            snapshots.export_snapshot(directory, fmt)
+            cached = time.perf_counter() - start
+            start = time.perf_counter()
+            datasets = snapshots.load_snapshot(directory)
+            load = time.perf_counter() - start
+            size = sum(entry["bytes"] for entry in manifest["datasets"].values())
+            json_size = sum(len(df.to_json(orient="columns", date_format="iso")) for df in datasets.values())
+            print(f"{fmt:<6} export {cold * 1000:>8.1f} ms  cached {cached * 1000:>6.1f} ms  "
+                  f"load {load * 1000:>6.1f} ms  {size:>11,} bytes (JSON {json_size:,})")
+        database.close_all()
+
+
+def bench_approximate(args):
+    """Exact against sketch-based chart datasets: export time and error"""
+    import sketches
+    import snapshots
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_db_path(os.path.join(tmp, "approximate.db"))
+        sketches.SKETCH_DIR = os.path.join(tmp, "sketches")  # The simulator's sink maintains them
+        start = time.perf_counter()
+        simulation.run_simulation(simulation.SQLiteSink(), player_count=args.players, seed=0,
+                                  options={**simulation.DEFAULT_OPTIONS, "games": (50, 100)})
+        print(f"simulation with sketches {time.perf_counter() - start:>8.2f} s")
+        results = {}
+        for approximate in (False, True):
+            start = time.perf_counter()
+            manifest = snapshots.export_snapshot(os.path.join(tmp, str(approximate)), "arrow",
+                                                 force=True, approximate=approximate)
+            elapsed = time.perf_counter() - start
+            results[approximate] = snapshots.load_snapshot(os.path.join(tmp, str(approximate)))
+            rows = sum(entry["rows"] for entry in manifest["datasets"].values())
+            print(f"{'approximate' if approximate else 'exact':<11} export {elapsed * 1000:>8.1f} ms  {rows:>9,} rows")
+        for name, key, column in [("number_distribution", "number_to_guess", "frequency"),
+                                  ("win_rate_by_range_size", "range_size", "win_rate"),
+                                  ("win_rate_comparison", "player", "win_rate")]:
+            merged = results[False][name].merge(results[True][name], on=key, suffixes=("_exact", "_approx"))
+            error = (merged[f"{column}_approx"] - merged[f"{column}_exact"]).abs()
+            print(f"{name:<23} {len(merged):>6} keys  mean error {error.mean():>9.4f}  max {error.max():>9.4f}")
+        database.close_all()
+
+
+def bench_ingest(args):
+    """Simulation ingestion throughput: single writer against 1..N sharded workers"""
+    import shards
+    options = {**simulation.DEFAULT_OPTIONS, "games": (50, 100)}
+    print(f"{os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "single.db")
+        start = time.perf_counter()
+        rows = simulation.run_simulation(simulation.SQLiteSink(path), player_count=args.players, seed=0,
+                                         options=options)
+        elapsed = time.perf_counter() - start
+        print(f"single writer   {rows:>9,} rows  {elapsed:>7.2f} s  {rows / elapsed:>10,.0f} rows/s")
+        for workers in range(1, args.max_workers + 1):
+            path = os.path.join(tmp, f"sharded{workers}.db")
+            directory = os.path.join(tmp, f"shards{workers}")
+            start = time.perf_counter()
+            rows = shards.write_shards(directory, args.players, seed=0, workers=workers, options=options)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            shards.merge_shards(directory, path)
+            merged = time.perf_counter() - start
+            print(f"{workers:>2} workers      {rows:>9,} rows  {written + merged:>7.2f} s  "
+                  f"{rows / (written + merged):>10,.0f} rows/s  (write {written:.2f} s, merge {merged:.2f} s)")
+        database.close_all()
+
+
+def bench_replay(args):
+    """Replay of recorded games: per-game AI loop against lock-step batches, cold and cached"""
+    import replay
+    from tournament import make_targets, load_strategy
+    model = load_strategy(args.model)
+    games = make_targets(args.games, seed=0)
+    difficulties, range_mins, range_maxs, targets = zip(*games)
+    # Recorded player moves: the simulator's noisy binary-search player
+    player_attempts, counts = simulation.generate_realistic_attempts_batch(
+        targets, range_mins, range_maxs, [simulation.LEVELS[difficulty] for difficulty in difficulties],
+        simulation.make_np_rng(0, "replay"))
+    keys = [game + (tuple(attempts[:count].tolist()),) for game, attempts, count in zip(games, player_attempts, counts)]
+    loop_games = keys[:min(len(keys), 200)]
+    start = time.perf_counter()
+    for game in loop_games:
+        replay.replay_games(model, [game])  # One model call per move
+    loop = (time.perf_counter() - start) / len(loop_games)
+    print(f"per game       {len(loop_games):>8,} games  {loop * 1e3:>8.2f} ms/game")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = replay.ReplayCache(os.path.join(tmp, "replay.db"))
+        for label in ("batched cold", "batched cached"):
+            start = time.perf_counter()
+            replay.replay_model(model, keys, cache, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<14} {len(keys):>8,} games  {elapsed / len(keys) * 1e3:>8.2f} ms/game")
+        cache.close()
+
+
+# Time from process start to the login prompt that startup must stay under
+TARGET_FIRST_PROMPT_MS = 250
+
+
+def import_times(module):
+    """Parse `python -X importtime` for a module: (total_us, [(self_us, name), ...])"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    entries = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), name.strip()))
+        if name == f" {module}":
+            total = int(cumulative_us)
+    return total, sorted(entries, reverse=True)
+
+
+def time_to_first_prompt(args_list, db_path):
+    """Seconds from launching guessNumber.py until the login prompt is printed"""
+    env = dict(os.environ, GUESSNUMBER_DB=db_path, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "guessNumber.py", *args_list], env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    output = b""
+    while b"Choose an option" not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            break
+        output += chunk
+    elapsed = time.perf_counter() - start
+    process.kill()
+    process.wait()
+    return elapsed
+
+
+def bench_startup(args):
+    """Import cost of the game module and time-to-first-prompt"""
+    total, entries = import_times("guessNumber")
+    print(f"import guessNumber: {total / 1000:.1f} ms (cumulative, -X importtime)")
+    for self_us, name in entries[:8]:
+        print(f"  {self_us / 1000:>7.1f} ms  {name}")
+    regression_total, _ = import_times("regression")
+    print(f"import regression (loaded in the background): {regression_total / 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        for label, args_list in (("default", []), ("--human-only", ["--human-only"])):
+            best = min(time_to_first_prompt(args_list, db_path) for _ in range(args.runs)) * 1000
+            status = "OK" if best <= TARGET_FIRST_PROMPT_MS else "SLOW"
+            print(f"first prompt ({label}): {best:.0f} ms "
+                  f"[target {TARGET_FIRST_PROMPT_MS} ms: {status}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generator = subparsers.add_parser("generator", help="Synthetic human-player generator throughput")
+    generator.add_argument("--games", type=int, default=10_000_000)
+    generator.add_argument("--persona", choices=sorted(simulation.PERSONAS), default="default")
+    generator.set_defaults(func=bench_generator)
+
+    storage_parser = subparsers.add_parser("storage", help="Write and scan throughput of the storage backends")
+    storage_parser.add_argument("--rows", type=int, default=200_000)
+    storage_parser.add_argument("--scans", type=int, default=5)
+    storage_parser.set_defaults(func=bench_storage)
+
+    startup = subparsers.add_parser("startup", help="Import time and time to the first prompt of guessNumber.py")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    writer = subparsers.add_parser("writer", help="Game recording latency with and without the background writer")
+    writer.add_argument("--games", type=int, default=20_000)
+    writer.set_defaults(func=bench_writer)
+
+    credentials_parser = subparsers.add_parser("credentials", help="Password verification throughput")
+    credentials_parser.add_argument("--seconds", type=float, default=2.0)
+    credentials_parser.add_argument("--threads", type=int, default=os.cpu_count())
+    credentials_parser.set_defaults(func=bench_credentials)
+
+    headless_parser = subparsers.add_parser("headless", help="Game throughput through the headless API")
+    headless_parser.add_argument("--games", type=int, default=2_000)
+    headless_parser.add_argument("--batch", type=int, default=500)
+    headless_parser.set_defaults(func=bench_headless)
+
+    ranges = subparsers.add_parser("ranges", help="AI attempts, per-move latency and storage size by range size")
+    ranges.add_argument("--games", type=int, default=50)
+    ranges.set_defaults(func=bench_ranges)
+
+    snapshots_parser = subparsers.add_parser("snapshots", help="Analytics snapshot export, cache and size")
+    snapshots_parser.add_argument("--players", type=int, default=2_000)
+    snapshots_parser.set_defaults(func=bench_snapshots)
+
+    approximate_parser = subparsers.add_parser("approximate", help="Sketch-based against exact chart datasets")
+    approximate_parser.add_argument("--players", type=int, default=2_000)
+    approximate_parser.set_defaults(func=bench_approximate)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Single writer against sharded simulation writers")
+    ingest_parser.add_argument("--players", type=int, default=2_000)
+    ingest_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ingest_parser.set_defaults(func=bench_ingest)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay engine throughput and cache")
+    replay_parser.add_argument("--games", type=int, default=5_000)
+    replay_parser.add_argument("--workers", type=int, default=1)
+    replay_parser.add_argument("--model", default="midpoint", help="Model spec as in tournament.py")
+    replay_parser.set_defaults(func=bench_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Game rules and data settings shared by the game, the headless API, the
+simulator, training and the data checks.
+
+Only the standard library is imported, so validation code can use them
+without loading the game runtime or the ML stack.
+"""
+import os
+import re
+
+# Difficulty levels and their number of attempts
+LEVELS = {"easy": 10, "medium": 7, "hard": 5}
+
+# Largest number the database stores as an integer; attempts are packed as signed 64-bit values
+MAX_VALUE = 2 ** 63 - 1
+
+# Users created by simulation.py; every other human user is a real player
+SIMULATED_EMAIL = re.compile(r"player\d+@test\.com")
+
+
+def parse_weights(value):
+    """Parse 'real=1,simulated=0.2' into {source: weight} (None if empty)"""
+    if not value:
+        return None
+    weights = {}
+    for item in value.split(","):
+        source, _, weight = item.partition("=")
+        weights[source.strip()] = float(weight)
+    return weights
+
+
+# Training sample weight per source ("real", "simulated"); 0 leaves a source out
+SOURCE_WEIGHTS = parse_weights(os.environ.get("GUESSNUMBER_SOURCE_WEIGHTS"))
@@ -0,0 +1,150 @@
+"""Password hashing for the users table.
+
+Stored passwords are self-describing strings:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+(salt and hash are base64). Rows written before hashing was added hold the
+plaintext password; they still verify and are rehashed on the next login, as
+are hashes made with parameters other than the current ones.
+
+The scheme and cost come from GUESSNUMBER_PASSWORD_HASH, e.g.
+"scrypt:n=16384,r=8,p=1" (default) or "pbkdf2:iterations=600000".
+
+The KDFs release the GIL, so CredentialService runs them in a thread pool and
+a slow login never stalls other threads. Successful verifications are cached
+(keyed by an HMAC of the stored hash and password, never the password itself)
+so repeated logins in the same process skip the KDF.
+"""
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import increment, timed
+
+SCHEMES = {
+    "scrypt": {"n": 2 ** 14, "r": 8, "p": 1},
+    "pbkdf2": {"iterations": 600_000},
+}
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def parse_config(spec):
+    """Parse "scheme:key=value,..." into (scheme, params) with defaults filled in"""
+    scheme, _, options = spec.partition(":")
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown password hash scheme: {scheme}")
+    params = dict(SCHEMES[scheme])
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in params:
+            raise ValueError(f"Unknown {scheme} parameter: {key}")
+        params[key] = int(value)
+    return scheme, params
+
+
+DEFAULT_SCHEME, DEFAULT_PARAMS = parse_config(os.environ.get("GUESSNUMBER_PASSWORD_HASH", "scrypt"))
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _derive(password, scheme, params, salt):
+    if scheme == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + 1024 * 1024, dklen=HASH_BYTES)
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params["iterations"], HASH_BYTES)
+
+
+@timed("credentials.hash")
+def hash_password(password, scheme=None, params=None):
+    """Hash a password with a fresh salt (default: the configured scheme and cost)"""
+    scheme = scheme or DEFAULT_SCHEME
+    params = params or (DEFAULT_PARAMS if scheme == DEFAULT_SCHEME else SCHEMES[scheme])
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _b64(_derive(password, scheme, params, salt))
+    if scheme == "scrypt":
+        return f"scrypt${params['n']}${params['r']}${params['p']}${_b64(salt)}${digest}"
+    return f"pbkdf2_sha256${params['iterations']}${_b64(salt)}${digest}"
+
+
+def _parse_stored(stored):
+    """(scheme, params, salt, digest) of a stored hash, or None for a legacy plaintext password"""
+    parts = stored.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        return "scrypt", {"n": int(parts[1]), "r": int(parts[2]), "p": int(parts[3])}, \
+            base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        return "pbkdf2", {"iterations": int(parts[1])}, base64.b64decode(parts[2]), base64.b64decode(parts[3])
+    return None
+
+
+@timed("credentials.verify")
+def verify_password(password, stored):
+    """Check a password against a stored hash (or legacy plaintext) in constant time"""
+    parsed = _parse_stored(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode())
+    scheme, params, salt, digest = parsed
+    return hmac.compare_digest(_derive(password, scheme, params, salt), digest)
+
+
+def needs_rehash(stored, scheme=None, params=None):
+    """True if a stored password is plaintext or hashed with other than the current parameters"""
+    parsed = _parse_stored(stored)
+    if parsed is None:
+        return True
+    scheme = scheme or DEFAULT_SCHEME
+    params = params or (DEFAULT_PARAMS if scheme == DEFAULT_SCHEME else SCHEMES[scheme])
+    return parsed[0] != scheme or parsed[1] != params
+
+
+class CredentialService:
+    """Runs hashing and verification in a thread pool, with a cache of recent successes"""
+
+    def __init__(self, max_workers=None, cache_size=1024):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                           thread_name_prefix="credentials")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_key = secrets.token_bytes(32)  # Per-process, so cache keys are useless elsewhere
+        self._lock = threading.Lock()
+
+    def _key(self, password, stored):
+        return hmac.new(self._cache_key, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def _verify(self, password, stored):
+        key = self._key(password, stored)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                increment("credentials.cache_hits")
+                return True
+        increment("credentials.cache_misses")
+        if not verify_password(password, stored):
+            return False
+        with self._lock:
+            self._cache[key] = True
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return True
+
+    def verify(self, password, stored):
+        """Future resolving to True if the password matches the stored hash"""
+        return self.executor.submit(self._verify, password, stored)
+
+    def hash(self, password):
+        """Future resolving to a new hash of the password"""
+        return self.executor.submit(hash_password, password)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
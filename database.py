@@ -0,0 +1,162 @@
+import os
+import atexit
+import sqlite3
+import threading
+
+# Database location, overridable with the GUESSNUMBER_DB environment variable
+DB_PATH = os.environ.get("GUESSNUMBER_DB", "guessNumber.db")
+
+# Settings applied to every connection. WAL lets readers run alongside a writer,
+# busy_timeout waits for a lock instead of failing with "database is locked".
+PRAGMAS = {
+    "busy_timeout": 5000,         # milliseconds
+    "cache_size": -64000,         # negative = KiB, so 64 MB of page cache
+    "mmap_size": 268435456,       # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+}
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # Safe with WAL, avoids an fsync per commit
+}
+
+# Connections reused per thread, keyed by (path, readonly)
+_pool = threading.local()
+_all_connections = []
+_lock = threading.Lock()
+
+
+def set_db_path(path):
+    """Change the default database used by get_connection and connect"""
+    global DB_PATH
+    DB_PATH = path
+
+
+def connect(path=None, readonly=False):
+    """Open a new connection with the standard PRAGMAs.
+
+    Read-only connections are opened with mode=ro, so analytics cannot take
+    the write lock. The caller owns the returned connection and must close it.
+    """
+    path = path or DB_PATH
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+        for name, value in WRITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection(path=None, readonly=False):
+    """Return this thread's shared connection for a database, opening it on first use.
+
+    Pooled connections stay open until close_all() (called at exit); do not close them.
+    """
+    key = (path or DB_PATH, readonly)
+    connections = getattr(_pool, "connections", None)
+    if connections is None:
+        connections = _pool.connections = {}
+    if key not in connections:
+        conn = connect(*key)
+        connections[key] = conn
+        with _lock:
+            _all_connections.append(conn)
+    return connections[key]
+
+
+def close_all():
+    """Close every pooled connection"""
+    with _lock:
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass  # Connection owned by a thread that already exited
+        _all_connections.clear()
+    _pool.connections = {}
+
+
+atexit.register(close_all)
+
+
+def add_match_id_column(conn, table):
+    """Add match_id to a games table created before it existed.
+
+    Rows written before then were paired by equal timestamps, so each group of
+    rows sharing a timestamp gets the id of its first row as match_id (new
+    match ids are random 63-bit values and do not collide with these).
+    """
+    if "match_id" in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+        return
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN match_id INTEGER")
+    conn.execute(f'''
+        UPDATE {table} SET match_id = paired.first_id
+        FROM (SELECT timestamp, MIN(id) AS first_id FROM {table}
+              GROUP BY timestamp HAVING COUNT(*) > 1) AS paired
+        WHERE {table}.timestamp = paired.timestamp
+    ''')
+
+
+def initialize_db(conn):
+    """Create the users and game_stats tables if they don't exist"""
+    cursor = conn.cursor()
+    # Create users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Modified game_stats table to store JSON array
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS game_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            difficulty TEXT,
+            attempts_array JSON,  -- storage.encode_attempts() bytes; JSON text in older rows
+            attempts_count INTEGER,
+            won BOOLEAN,
+            number_to_guess INTEGER,
+            range_min INTEGER,
+            range_max INTEGER,
+            match_id INTEGER,  -- Shared by the human and AI rows of one match
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    add_match_id_column(conn, "game_stats")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_stats_match_id ON game_stats (match_id)')
+
+    # One row per hot match with both a human and an AI game (a keyed join on the index above)
+    from users import AI_EMAIL
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS match_pairs AS
+        SELECT human.match_id, human.id AS human_game_id, ai.id AS ai_game_id,
+               human.user_id, human.timestamp, human.difficulty, human.number_to_guess,
+               human.range_min, human.range_max,
+               human.won AS human_won, human.attempts_count AS human_attempts,
+               ai.won AS ai_won, ai.attempts_count AS ai_attempts
+        FROM game_stats AS human
+        JOIN game_stats AS ai ON ai.match_id = human.match_id AND ai.user_id != human.user_id
+        JOIN users ON users.id = ai.user_id AND users.email = '{AI_EMAIL}'
+    ''')
+
+    # Per user, difficulty and month totals of the games moved to archive tables
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS game_stats_summary (
+            user_id INTEGER NOT NULL,
+            difficulty TEXT,
+            month TEXT NOT NULL,
+            games INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            attempts_sum INTEGER NOT NULL,
+            best_score INTEGER,
+            PRIMARY KEY (user_id, difficulty, month)
+        )
+    ''')
+    conn.commit()
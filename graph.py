@@ -1,32 +1,27 @@
-import sqlite3
 import pandas as pd
 from bokeh.layouts import column, row, grid
 from bokeh.plotting import figure, show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool, ColorBar, LinearColorMapper, NumeralTickFormatter
 from bokeh.transform import transform
 from bokeh.palettes import Spectral6, RdYlBu11
-import json
 from datetime import datetime
+import os
 import numpy as np
+from snapshots import export_snapshot, load_snapshot, VS_PLAYER
+from instrumentation import set_gauge, timer
+from users import AI_EMAIL
 
-# Connect to the database
-conn = sqlite3.connect('guessNumber.db')
+# Chart datasets from the binary snapshot, re-exported only if the games changed.
+# GUESSNUMBER_APPROXIMATE=1 estimates them from the streaming sketches (sketches.py)
+APPROXIMATE = os.environ.get("GUESSNUMBER_APPROXIMATE", "") not in ("", "0")
+manifest = export_snapshot(approximate=APPROXIMATE)
+datasets = load_snapshot(manifest=manifest)
 
 # Create a single HTML output file for all plots
 output_file("game_analytics.html")
 
 # 1. Heatmap of Number Distribution
-query1 = """
-SELECT number_to_guess, COUNT(*) as frequency
-FROM game_stats
-WHERE user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-GROUP BY number_to_guess
-"""
-df_numbers = pd.read_sql_query(query1, conn)
+df_numbers = datasets['number_distribution']
 
 p1 = figure(width=800, height=400, title="Number Distribution Heatmap")
 source = ColumnDataSource(df_numbers)
@@ -43,19 +38,7 @@ p1.xaxis.axis_label = 'Number to Guess'
 p1.yaxis.axis_label = 'Frequency'
 
 # 2. First Guess Analysis
-query2 = """
-SELECT 
-    JSON_EXTRACT(attempts_array, '$[0]') as first_guess,
-    number_to_guess
-FROM game_stats
-WHERE user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-"""
-df_first_guess = pd.read_sql_query(query2, conn)
-df_first_guess['first_guess'] = df_first_guess['first_guess'].astype(float)
+df_first_guess = datasets['first_guess']
 
 p2 = figure(width=800, height=400, title="First Guess vs Actual Number")
 source = ColumnDataSource(df_first_guess)
@@ -71,19 +54,7 @@ p2.xaxis.axis_label = 'Actual Number'
 p2.yaxis.axis_label = 'First Guess'
 
 # 3. Success by Range Size
-query3 = """
-SELECT 
-    (range_max - range_min) as range_size,
-    AVG(CASE WHEN won = 1 THEN 1.0 ELSE 0.0 END) as win_rate
-FROM game_stats
-WHERE user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-GROUP BY range_size
-"""
-df_range = pd.read_sql_query(query3, conn)
+df_range = datasets['win_rate_by_range_size']
 
 p3 = figure(width=800, height=400, title="Win Rate by Range Size")
 source = ColumnDataSource(df_range)
@@ -98,17 +69,7 @@ p3.yaxis.axis_label = 'Win Rate'
 p3.yaxis.formatter = NumeralTickFormatter(format='0.0%')
 
 # 4. Guess Distribution
-query4 = """
-SELECT difficulty, attempts_count
-FROM game_stats
-WHERE won = 1
-AND user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-"""
-df_dist = pd.read_sql_query(query4, conn)
+df_dist = datasets['attempts_distribution']  # 20-bin histogram per difficulty
 
 p4 = figure(width=800, height=400, title="Attempts Distribution by Difficulty")
 
@@ -121,11 +82,10 @@ difficulty_colors = {
 
 for difficulty in df_dist['difficulty'].unique():
     df_diff = df_dist[df_dist['difficulty'] == difficulty]
-    hist, edges = np.histogram(df_diff['attempts_count'], bins=20)
     source = ColumnDataSource(data=dict(
-        top=hist,
-        left=edges[:-1],
-        right=edges[1:]
+        top=df_diff['top'].to_numpy(),
+        left=df_diff['left'].to_numpy(),
+        right=df_diff['right'].to_numpy()
     ))
     p4.quad(top='top', bottom=0, left='left', right='right',
             fill_color=difficulty_colors[difficulty],
@@ -145,23 +105,7 @@ p4.xaxis.axis_label = 'Number of Attempts'
 p4.yaxis.axis_label = 'Number of Games'
 
 # 5. Streak Analysis with player colors (yellow to red)
-query5 = """
-SELECT 
-    u.email,
-    g.timestamp,
-    g.won,
-    SUM(CASE WHEN g.won = 1 THEN 1 ELSE 0 END) 
-        OVER (PARTITION BY u.id ORDER BY g.timestamp) as cumulative_wins
-FROM game_stats g
-JOIN users u ON g.user_id = u.id
-WHERE g.user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-"""
-df_streak = pd.read_sql_query(query5, conn)
-df_streak['timestamp'] = pd.to_datetime(df_streak['timestamp'])
+df_streak = datasets['streaks']
 
 p5 = figure(width=800, height=400, x_axis_type="datetime", 
            title="Cumulative Wins Over Time")
@@ -198,20 +142,7 @@ p5.xaxis.axis_label = 'Date'
 p5.yaxis.axis_label = 'Cumulative Wins'
 
 # 6. Range vs Success Rate
-query6 = """
-SELECT 
-    range_min, 
-    range_max,
-    AVG(CASE WHEN won = 1 THEN 1.0 ELSE 0.0 END) as success_rate
-FROM game_stats
-WHERE user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
-GROUP BY range_min, range_max
-"""
-df_range_success = pd.read_sql_query(query6, conn)
+df_range_success = datasets['success_by_range']
 
 p6 = figure(width=800, height=400, title="Success Rate by Range")
 source = ColumnDataSource(df_range_success)
@@ -247,19 +178,7 @@ p6.xaxis.axis_label = 'Minimum Range'
 p6.yaxis.axis_label = 'Maximum Range'
 
 # Win Rate Comparison
-query_win_rate = """
-SELECT 
-    CASE 
-        WHEN user_id = (SELECT id FROM users WHERE email = 'ai.player@game.com') THEN 'AI'
-        ELSE u.email 
-    END as player,
-    AVG(CASE WHEN won = 1 THEN 1.0 ELSE 0.0 END) as win_rate
-FROM game_stats g
-JOIN users u ON g.user_id = u.id
-GROUP BY player
-"""
-
-df_win_rate = pd.read_sql_query(query_win_rate, conn)
+df_win_rate = datasets['win_rate_comparison']
 
 p_win_rate = figure(x_range=df_win_rate['player'], title="Win Rate Comparison",
                     x_axis_label='Player', y_axis_label='Win Rate', width=800, height=400)
@@ -270,48 +189,8 @@ p_win_rate.vbar(x='player', top='win_rate', width=0.9, source=ColumnDataSource(d
 p_win_rate.yaxis.formatter = NumeralTickFormatter(format='0.0%')
 p_win_rate.add_tools(HoverTool(tooltips=[('Player', '@player'), ('Win Rate', '@win_rate{0.0%}')]))
 
-# Query to select games for benjaminruelle42@gmail.com and ai.player@game.com with the same target value and matching timestamps
-query_games = """
-SELECT
-    g.user_id,
-    g.number_to_guess,
-    JSON_EXTRACT(g.attempts_array, '$') as attempts_array,
-    g.timestamp,
-    u.email,
-    g2.number_to_guess AS ai_number_to_guess,
-    g2.timestamp AS ai_timestamp
-FROM game_stats g
-JOIN users u ON g.user_id = u.id
-JOIN game_stats g2 ON g.timestamp = g2.timestamp
-WHERE g2.user_id = (SELECT id FROM users WHERE email = 'ai.player@game.com')
-AND g.user_id = (SELECT id FROM users WHERE email = 'player1@test.com')
-UNION ALL  -- Include both player's and AI's data
-SELECT
-    g2.user_id,
-    g2.number_to_guess,
-    JSON_EXTRACT(g2.attempts_array, '$') as attempts_array,
-    g2.timestamp,
-    u2.email,
-    g2.number_to_guess AS ai_number_to_guess,
-    g2.timestamp AS ai_timestamp
-FROM game_stats g2
-JOIN users u2 ON g2.user_id = u2.id
-WHERE g2.user_id = (SELECT id FROM users WHERE email = 'ai.player@game.com')
-AND g2.timestamp IN (
-    SELECT g.timestamp
-    FROM game_stats g
-    WHERE g.user_id = (SELECT id FROM users WHERE email = 'player1@test.com')
-)
-ORDER BY timestamp;
-"""
-df_games = pd.read_sql_query(query_games, conn)
-
-# Prepare data for plotting
-df_games['attempts_array'] = df_games['attempts_array'].apply(lambda x: json.loads(x))  # Convert JSON string to list
-df_games_exploded = df_games.explode('attempts_array')  # Explode the attempts_array into separate rows
-
-# Create a guess number for each guess after exploding
-df_games_exploded['guess_number'] = df_games_exploded.groupby(['number_to_guess', 'email']).cumcount() + 1  # Create a guess number for each guess
+# Guesses of player1@test.com and the AI in the same matches
+df_games_exploded = datasets['ai_vs_player']
 
 # Group by target value to find games with the same target
 grouped_games = df_games_exploded.groupby('number_to_guess')
@@ -329,16 +208,16 @@ player_color = 'green'
 # Add lines for each game
 for target_value, group in grouped_games:
     # Separate AI and Player data
-    ai_data = group[group['email'] == 'ai.player@game.com']
-    player_data = group[group['email'] == 'player1@test.com']
+    ai_data = group[group['email'] == AI_EMAIL]
+    player_data = group[group['email'] == VS_PLAYER]
     
     # Plot AI guesses
-    p_guesses.line(ai_data['guess_number'], ai_data['attempts_array'], 
+    p_guesses.line(ai_data['guess_number'], ai_data['guess'], 
                    line_width=2, color=ai_color, 
                    legend_label="AI Guesses")
     
     # Plot Player guesses
-    p_guesses.line(player_data['guess_number'], player_data['attempts_array'], 
+    p_guesses.line(player_data['guess_number'], player_data['guess'], 
                    line_width=2, color=player_color, 
                    legend_label="Player Guesses")
     
@@ -358,7 +237,14 @@ layout = grid([
     [p_win_rate, p_guesses]
 ], sizing_mode="stretch_width")
 
-# Save all plots to a single HTML file
-save(layout)
-
-conn.close()
\ No newline at end of file
+# Save all plots to a single HTML file. The datasets are embedded in the page
+# (Bokeh's base64 binary arrays) rather than fetched from the snapshot files:
+# browsers do not let a page opened from disk read the files next to it. The
+# page therefore grows with the history in exact mode (about 28 MB for 100k
+# games, mostly the per-game streak lines) and stays bounded by the 10,000
+# sampled games with GUESSNUMBER_APPROXIMATE=1.
+with timer("graph.save"):
+    save(layout)
+page_bytes = os.path.getsize("game_analytics.html")
+set_gauge("graph.page_bytes", page_bytes)
+print(f"game_analytics.html: {page_bytes / 1e6:.1f} MB")
\ No newline at end of file
@@ -1,61 +1,107 @@
+import sys
 import random
-import time
-import sqlite3  # Add import at the top
-import json  # Add this import at the top
-from regression import initialize_model, predict_next_guess  # Import both functions
+import threading
+# regression (pandas + scikit-learn) is imported lazily: see _start_ai_warmup
+from database import get_connection, initialize_db
+from storage import BackgroundWriter, WriteError, open_store, new_match_id
+from instrumentation import timer
+from credentials import CredentialService, needs_rehash
+from users import get_user_cache
+from models import ModelCache
+from config import LEVELS, MAX_VALUE
+
 
 class GuessNumberGame:
-    def __init__(self):
-        self.levels = {"easy": 10, "medium": 7, "hard": 5}  # Difficulty levels and number of attempts
+    def __init__(self, human_only=False):
+        self.levels = dict(LEVELS)  # Difficulty levels and number of attempts
         self.stats = {"games_played": 0, "games_won": 0, "games_lost": 0}  # Game statistics
         self.best_scores = []  # Storing best scores (by number of attempts)
         self.number_to_guess = None  # The number to guess
         self.max_attempts = None  # Maximum number of attempts
         self.range_min = None  # Minimum value of the range
         self.range_max = None  # Maximum value of the range
+        self.match_id = None  # Links the human and AI rows of the current game
         self.current_user = None  # Add current user tracking
+        self.human_only = human_only  # Never load the AI (no pandas/scikit-learn import)
+        self._warmup_thread = None  # Background import + training of the AI model
+        self._warmup_result = None  # Model or exception produced by the warmup thread
         
-        # Database connection setup
-        self.conn = sqlite3.connect('guessNumber.db')
+        # Database connection setup (shared, configured connection)
+        self.conn = get_connection()
         self.cursor = self.conn.cursor()
         self._initialize_db()
+        self.store = BackgroundWriter(open_store())  # Game results are saved by a writer thread
+        self.credentials = CredentialService()  # Password hashing off the game thread
+        self.users = get_user_cache()  # Cached email -> id lookups, shared with other modules
+        self.profile = None  # Profile of the logged-in user
+        self.models = None  # Per-player AI models, created with the global model
 
     def _initialize_db(self):
         """Initialize database tables if they don't exist"""
-        # Create users table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Modified game_stats table to store JSON array
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS game_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                difficulty TEXT,
-                attempts_array JSON,  
-                attempts_count INTEGER,
-                won BOOLEAN,
-                number_to_guess INTEGER,
-                range_min INTEGER,
-                range_max INTEGER,
-                FOREIGN KEY (user_id) REFERENCES users (id)
+        initialize_db(self.conn)
+
+    def _record_game(self, user_id, attempts, won):
+        """Store the result of the current game for a user"""
+        with timer("game.record"):
+            self.store.append_game(
+                user_id,
+                list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
+                attempts,
+                won,
+                self.number_to_guess,
+                self.range_min,
+                self.range_max,
+                match_id=self.match_id
             )
-        ''')
-        self.conn.commit()
+
+    def _report_save_errors(self):
+        """Print the results the writer thread could not save (without waiting for it)"""
+        failures = self.store.pop_failures()
+        if failures:
+            print(f"Error saving game results: {WriteError(failures)}")
+
+    def _start_ai_warmup(self):
+        """Import the ML stack and train the AI model in a background thread,
+        so it is ready (or nearly) once the user has logged in"""
+        def warmup():
+            try:
+                from regression import initialize_model
+                self._warmup_result = initialize_model(verbose=False)
+            except Exception as e:
+                self._warmup_result = e
+
+        self._warmup_thread = threading.Thread(target=warmup, name="ai-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def _load_ai_model(self):
+        """Return the model trained by the warmup thread, or train a fresh one"""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+            self._warmup_thread = None
+            result, self._warmup_result = self._warmup_result, None
+            if isinstance(result, Exception):
+                raise result
+            return result
+        from regression import initialize_model
+        return initialize_model()
 
     def start_game(self):
         if not self.current_user:
+            if not self.human_only:
+                self._start_ai_warmup()
             self.handle_user_auth()
 
+        if self.human_only:
+            print("Welcome to the 'Guess the Number' game!")
+            self.choose_level()  # Choosing the difficulty level
+            self.choose_range()  # Specifying the number range
+            self.play_human_only_game()
+            return
+
         try:
-            self.ai_model = initialize_model()  # Initialize the AI model
+            if self.models is None:
+                self.models = ModelCache(fallback=self._load_ai_model())  # Global model for cold players
+            self.ai_model = self.models.get(self.current_user)  # The player's own model if trained
         except Exception as e:  # Catch any exception raised by initialize_model
             print(f"Error initializing AI model: {e}")
             print(f"Player only mode is active")
@@ -83,6 +129,9 @@ class GuessNumberGame:
                     break
             else:
                 print("Invalid choice. Please try again.")
+        if self.profile:
+            since = f", player since {self.profile['created_at'][:10]}" if self.profile["created_at"] else ""
+            print(f"Playing as {self.profile['email']}{since}")
 
     def register(self):
         print("\nRegister new account")
@@ -93,8 +142,7 @@ class GuessNumberGame:
                 continue
             
             # Check if email exists
-            self.cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-            if self.cursor.fetchone():
+            if self.users.get_id(email) is not None:
                 print("Email already registered")
                 return False
             
@@ -103,14 +151,16 @@ class GuessNumberGame:
                 print("Password must be at least 6 characters")
                 continue
             
-            # Insert new user
+            # Insert new user with a hashed password
+            password_hash = self.credentials.hash(password).result()
             self.cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)',
-                              (email, password))  # In real app, hash the password!
+                              (email, password_hash))
             self.conn.commit()
             
             # Set current user
-            self.cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-            self.current_user = self.cursor.fetchone()[0]
+            self.current_user = self.cursor.lastrowid
+            self.users.add(email, self.current_user)
+            self.profile = self.users.profile(self.current_user)
             print("Registration successful!")
             return True
 
@@ -122,8 +172,15 @@ class GuessNumberGame:
         self.cursor.execute('SELECT id, password FROM users WHERE email = ?', (email,))
         result = self.cursor.fetchone()
         
-        if result and result[1] == password:  # In real app, verify hash!
+        if result and self.credentials.verify(password, result[1]).result():
             self.current_user = result[0]
+            # Upgrade plaintext passwords and hashes made with an older cost
+            if needs_rehash(result[1]):
+                self.cursor.execute('UPDATE users SET password = ? WHERE id = ?',
+                                    (self.credentials.hash(password).result(), self.current_user))
+                self.conn.commit()
+            self.users.add(email, self.current_user)
+            self.profile = self.users.profile(self.current_user)
             print("Login successful!")
             return True
         else:
@@ -154,7 +211,9 @@ class GuessNumberGame:
             if min_input.isdigit() and max_input.isdigit():
                 self.range_min = int(min_input)
                 self.range_max = int(max_input)
-                if self.range_min < self.range_max:
+                if self.range_max > MAX_VALUE:
+                    print(f"The maximum value cannot exceed {MAX_VALUE}!")
+                elif self.range_min < self.range_max:
                     print(f"Range set: from {self.range_min} to {self.range_max}")
                     break
                 else:
@@ -164,6 +223,7 @@ class GuessNumberGame:
 
     def play_game(self):
         self.number_to_guess = random.randint(self.range_min, self.range_max)
+        self.match_id = new_match_id()
         human_attempts = []
         ai_attempts = []
         print("\nGame started! Guess the number.")
@@ -171,6 +231,8 @@ class GuessNumberGame:
         ai_user_id = self.ensure_ai_user()
         ai_won = False
         human_won = False
+        from regression import GuessBounds
+        self.ai_bounds = GuessBounds(self.range_min, self.range_max)  # What the AI knows of the number
         
         while len(human_attempts) < self.max_attempts:
             # AI's turn
@@ -186,20 +248,7 @@ class GuessNumberGame:
                 print(f"AI won in {len(ai_attempts)} attempts!")
                 ai_won = True
                 
-                # Store AI game result
-                self.cursor.execute('''
-                    INSERT INTO game_stats 
-                    (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (ai_user_id,
-                      list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                      json.dumps(ai_attempts),
-                      len(ai_attempts),
-                      True, 
-                      self.number_to_guess, 
-                      self.range_min, 
-                      self.range_max))
-                self.conn.commit()
+                self._record_game(ai_user_id, ai_attempts, True)
             
             # Human's turn
             guess_input = input(f"Attempt {len(human_attempts) + 1}/{self.max_attempts}. Enter a number: ").strip()
@@ -218,20 +267,7 @@ class GuessNumberGame:
                 self.stats["games_played"] += 1
                 self.stats["games_won"] += 1
                 
-                # Store human game result
-                self.cursor.execute('''
-                    INSERT INTO game_stats 
-                    (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (self.current_user,
-                      list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                      json.dumps(human_attempts),
-                      len(human_attempts),
-                      True, 
-                      self.number_to_guess, 
-                      self.range_min, 
-                      self.range_max))
-                self.conn.commit()
+                self._record_game(self.current_user, human_attempts, True)
                 break
             
             elif guess < self.number_to_guess:
@@ -240,42 +276,19 @@ class GuessNumberGame:
             else:
                 print("The number is lower!")
                 last_feedback = -1
+            self.ai_bounds.update(guess, last_feedback)
 
         if not human_won and not ai_won:
             print(f"Both you and AI lost! The number was: {self.number_to_guess}")
             self.stats["games_played"] += 1
             self.stats["games_lost"] += 1
             
-            # Store human loss
-            self.cursor.execute('''
-                INSERT INTO game_stats 
-                (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (self.current_user,
-                  list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                  json.dumps(human_attempts),
-                  len(human_attempts),
-                  False, 
-                  self.number_to_guess, 
-                  self.range_min, 
-                  self.range_max))
+            self._record_game(self.current_user, human_attempts, False)
             
-            # Store AI loss
-            self.cursor.execute('''
-                INSERT INTO game_stats 
-                (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (ai_user_id,
-                  list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                  json.dumps(ai_attempts),
-                  len(ai_attempts),
-                  False, 
-                  self.number_to_guess, 
-                  self.range_min, 
-                  self.range_max))
-            self.conn.commit()
+            self._record_game(ai_user_id, ai_attempts, False)
 
-        self.show_stats()
+        self.show_stats()  # Waits for this game's results: the stats include them
+        self._report_save_errors()
         self.restart_game()
 
     def get_ai_guess(self, last_guess, feedback, attempt_count):
@@ -294,37 +307,24 @@ class GuessNumberGame:
             return (self.range_max + self.range_min) // 2  # Start with middle of range
         
         # Use the AI model for subsequent guesses
+        from regression import predict_next_guess
         ai_guess = predict_next_guess(
             self.ai_model,
             range_start=self.range_min,
             range_end=self.range_max,
             last_guess=last_guess,
             attempt_count=attempt_count,
-            feedback=feedback
+            feedback=feedback,
+            bounds=self.ai_bounds  # Keeps the AI at O(log range) guesses on large ranges
         )
         
-        # Ensure guess stays within valid range
-        ai_guess = max(self.range_min, min(self.range_max, ai_guess))
-        
-        # Round to nearest integer since we're guessing whole numbers
-        ai_guess = round(ai_guess)
-        
         return ai_guess
 
     def show_stats(self):
         print("\nGame Statistics from Database:")
         
-        # Get overall statistics
-        self.cursor.execute('''
-            SELECT 
-                COUNT(*) as total_games,
-                SUM(CASE WHEN won = 1 THEN 1 ELSE 0 END) as wins,
-                AVG(attempts_count) as avg_attempts
-            FROM game_stats
-            WHERE user_id = ?
-        ''', (self.current_user,))
-        
-        total_games, wins, avg_attempts = self.cursor.fetchone()
+        with timer("game.show_stats_query"):
+            (total_games, wins, avg_attempts), by_difficulty = self.store.user_summary(self.current_user)
         losses = total_games - wins if total_games else 0
         
         print(f"\nOverall Stats:")
@@ -333,21 +333,8 @@ class GuessNumberGame:
         print(f"Losses: {losses}")
         print(f"Average Attempts: {avg_attempts:.1f}" if avg_attempts else "N/A")
         
-        # Get statistics by difficulty
-        self.cursor.execute('''
-            SELECT 
-                difficulty,
-                COUNT(*) as games,
-                SUM(CASE WHEN won = 1 THEN 1 ELSE 0 END) as wins,
-                AVG(attempts_count) as avg_attempts,
-                MIN(attempts_count) as best_score
-            FROM game_stats
-            WHERE user_id = ?
-            GROUP BY difficulty
-        ''', (self.current_user,))
-        
         print("\nStats by Difficulty:")
-        for diff, games, diff_wins, diff_avg, best in self.cursor.fetchall():
+        for diff, games, diff_wins, diff_avg, best in by_difficulty:
             print(f"\n{diff.capitalize()}:")
             print(f"  Games: {games}")
             print(f"  Wins: {diff_wins} ({(diff_wins/games)*100:.1f}% win rate)")
@@ -362,32 +349,14 @@ class GuessNumberGame:
         else:
             print("Thanks for playing!")
 
-    def __del__(self):
-        """Cleanup database connection"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
-
     def ensure_ai_user(self):
-        """Ensure AI user exists in the database"""
-        AI_EMAIL = "ai.player@game.com"
-        AI_PASSWORD = "ai_password"  # In real app, use secure password
-        
-        # Check if AI user exists
-        self.cursor.execute('SELECT id FROM users WHERE email = ?', (AI_EMAIL,))
-        result = self.cursor.fetchone()
-        
-        if result:
-            return result[0]
-        
-        # Create AI user if doesn't exist
-        self.cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)',
-                           (AI_EMAIL, AI_PASSWORD))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        """Ensure AI user exists in the database (cached after the first call)"""
+        return self.users.ai_user_id()
 
     def play_human_only_game(self):
         """Play the game in human-only mode without AI."""
         self.number_to_guess = random.randint(self.range_min, self.range_max)
+        self.match_id = None
         human_attempts = []
         print("\nGame started in human-only mode! Guess the number.")
         
@@ -405,20 +374,7 @@ class GuessNumberGame:
                 self.stats["games_played"] += 1
                 self.stats["games_won"] += 1
                 
-                # Store human game result on win
-                self.cursor.execute(''' 
-                    INSERT INTO game_stats 
-                    (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (self.current_user,
-                      list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                      json.dumps(human_attempts),
-                      len(human_attempts),
-                      True, 
-                      self.number_to_guess, 
-                      self.range_min, 
-                      self.range_max))
-                self.conn.commit()
+                self._record_game(self.current_user, human_attempts, True)
                 break
             elif guess < self.number_to_guess:
                 print("The number is higher!")
@@ -430,25 +386,13 @@ class GuessNumberGame:
             self.stats["games_played"] += 1
             self.stats["games_lost"] += 1
             
-            # Store human game result on loss
-            self.cursor.execute(''' 
-                INSERT INTO game_stats 
-                (user_id, difficulty, attempts_array, attempts_count, won, number_to_guess, range_min, range_max)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (self.current_user,
-                  list(self.levels.keys())[list(self.levels.values()).index(self.max_attempts)],
-                  json.dumps(human_attempts),
-                  len(human_attempts),
-                  False, 
-                  self.number_to_guess, 
-                  self.range_min, 
-                  self.range_max))
-            self.conn.commit()
+            self._record_game(self.current_user, human_attempts, False)
 
-        self.show_stats()
+        self.show_stats()  # Waits for this game's results: the stats include them
+        self._report_save_errors()
         self.restart_game()
 
 
 if __name__ == "__main__":
-    game = GuessNumberGame()
+    game = GuessNumberGame(human_only="--human-only" in sys.argv[1:])
     game.start_game()
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""Headless game API: play Guess the Number programmatically, without input().
+
+Games follow the same rules, AI and persistence as GuessNumberGame.play_game:
+each round the AI guesses first (from the player's last feedback), then the
+player; results go to the configured store through the background writer.
+
+    api = HeadlessGame(user_id)
+    game_id = api.new_game("medium", 1, 100)
+    api.ai_move(game_id)               # optional, done by submit_guess otherwise
+    api.submit_guess(game_id, 50)      # {"result": "higher", ...}
+
+submit_guesses() plays one round of many games at once, with a single batched
+model call for all their AI moves, for load tests and bots.
+"""
+import random
+import itertools
+
+from storage import BackgroundWriter, open_store, game_row, new_match_id
+from users import get_user_cache
+from config import LEVELS, MAX_VALUE
+from instrumentation import timer
+
+
+class HeadlessGame:
+    def __init__(self, user_id, model=None, store=None, human_only=False, rng=None):
+        """
+        Args:
+            user_id (int): Player the human results are stored for
+            model: Trained AI model (default: trained with regression.initialize_model)
+            store (GameStore): Where results go (default: background writer over open_store())
+            human_only (bool): Play without the AI
+            rng (random.Random): Source of targets (default: the random module)
+        """
+        self.user_id = user_id
+        self.human_only = human_only
+        self.store = store or BackgroundWriter(open_store())
+        self.rng = rng or random
+        self.games = {}
+        self._ids = itertools.count(1)
+        if human_only:
+            self.model = None
+            self.ai_user_id = None
+        else:
+            if model is None:
+                from regression import initialize_model
+                model = initialize_model(verbose=False)
+            self.model = model
+            self.ai_user_id = get_user_cache().ai_user_id()
+
+    def new_game(self, level, range_min, range_max, target=None):
+        """Start a game and return its id"""
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}")
+        if range_min < 0 or range_max > MAX_VALUE:
+            raise ValueError(f"The range must be within 0 and {MAX_VALUE}!")
+        if not range_min < range_max:
+            raise ValueError("The minimum value must be less than the maximum!")
+        if target is not None and not range_min <= target <= range_max:
+            raise ValueError("The number to guess must be within the range!")
+        if not self.human_only:
+            from regression import GuessBounds
+        game_id = next(self._ids)
+        self.games[game_id] = {
+            "level": level,
+            "max_attempts": LEVELS[level],
+            "range_min": range_min,
+            "range_max": range_max,
+            "target": self.rng.randint(range_min, range_max) if target is None else target,
+            "human_attempts": [],
+            "ai_attempts": [],
+            "last_feedback": None,
+            "bounds": None if self.human_only else GuessBounds(range_min, range_max),
+            "match_id": None if self.human_only else new_match_id(),
+            "ai_won": False,
+            "human_won": False,
+            "finished": False,
+        }
+        return game_id
+
+    def _game(self, game_id):
+        game = self.games.get(game_id)
+        if game is None:
+            raise KeyError(f"Unknown game: {game_id}")
+        if game["finished"]:
+            raise ValueError(f"Game {game_id} is finished")
+        return game
+
+    def _needs_ai_move(self, game):
+        return not self.human_only and len(game["ai_attempts"]) == len(game["human_attempts"])
+
+    def _ai_state(self, game):
+        """Model features for the AI's next guess, or None for the opening guess"""
+        if game["last_feedback"] is None:
+            return None
+        return (game["range_min"], game["range_max"], game["ai_attempts"][-1],
+                len(game["ai_attempts"]), game["last_feedback"])
+
+    def _apply_ai_guess(self, game, guess):
+        game["ai_attempts"].append(guess)
+        if guess == game["target"] and not game["human_won"] and not game["ai_won"]:
+            game["ai_won"] = True
+            self._record(game, self.ai_user_id, game["ai_attempts"], True)
+        return guess
+
+    def _ai_moves(self, games):
+        """Play the AI's turn for several games with one model call"""
+        from regression import predict_next_guesses
+        states = [self._ai_state(game) for game in games]
+        predicted = iter(predict_next_guesses(self.model, [state for state in states if state],
+                                              [game["bounds"] for game, state in zip(games, states) if state]))
+        return [self._apply_ai_guess(game, next(predicted) if state else
+                                     (game["range_max"] + game["range_min"]) // 2)
+                for game, state in zip(games, states)]
+
+    def ai_move(self, game_id):
+        """Play the AI's turn of the current round and return its guess"""
+        game = self._game(game_id)
+        if self.human_only:
+            raise ValueError("The AI is disabled (human_only)")
+        if not self._needs_ai_move(game):
+            raise ValueError(f"The AI already played this round of game {game_id}")
+        with timer("headless.ai_move"):
+            return self._ai_moves([game])[0]
+
+    def _apply_guess(self, game, guess):
+        """The player's turn; returns the feedback for the guess"""
+        game["human_attempts"].append(guess)
+        attempts = len(game["human_attempts"])
+        if guess == game["target"]:
+            result = "correct"
+            game["human_won"] = game["finished"] = True
+            self._record(game, self.user_id, game["human_attempts"], True)
+        else:
+            result = "higher" if guess < game["target"] else "lower"
+            game["last_feedback"] = 1 if guess < game["target"] else -1
+            if game["bounds"] is not None:
+                game["bounds"].update(guess, game["last_feedback"])
+            if attempts >= game["max_attempts"]:
+                game["finished"] = True
+                if not game["ai_won"]:
+                    self._record(game, self.user_id, game["human_attempts"], False)
+                    if not self.human_only:
+                        self._record(game, self.ai_user_id, game["ai_attempts"], False)
+        return {
+            "result": result,
+            "attempts": attempts,
+            "attempts_left": game["max_attempts"] - attempts,
+            "finished": game["finished"],
+            "won": game["human_won"],
+            "ai_guess": game["ai_attempts"][-1] if game["ai_attempts"] else None,
+            "ai_won": game["ai_won"],
+            "target": game["target"] if game["finished"] else None,
+        }
+
+    def submit_guess(self, game_id, guess):
+        """Submit the player's guess (the AI moves first if it has not this round)"""
+        return self.submit_guesses([(game_id, guess)])[0]
+
+    def submit_guesses(self, guesses):
+        """Submit one guess for each of many games: [(game_id, guess), ...] -> [feedback, ...].
+
+        AI moves still due this round are computed in a single batched model call.
+        """
+        with timer("headless.submit_guesses"):
+            games = [self._game(game_id) for game_id, _ in guesses]
+            if len({id(game) for game in games}) != len(games):
+                raise ValueError("At most one guess per game per call")
+            pending = [game for game in games if self._needs_ai_move(game)]
+            if pending:
+                self._ai_moves(pending)
+            return [self._apply_guess(game, int(guess)) for game, (_, guess) in zip(games, guesses)]
+
+    def _record(self, game, user_id, attempts, won):
+        self.store.append([game_row(user_id, game["level"], list(attempts), won, game["target"],
+                                    game["range_min"], game["range_max"], match_id=game["match_id"])])
+
+    def close(self):
+        """Flush pending results and forget finished games"""
+        self.store.flush()
+        self.games = {game_id: game for game_id, game in self.games.items() if not game["finished"]}
@@ -0,0 +1,166 @@
+"""Timers, counters and profiling hooks for the hot paths.
+
+Every timed stage records a latency histogram (seconds), every counter a
+running total and every gauge its last value. Nothing is written unless asked for:
+
+    GUESSNUMBER_METRICS=metrics.prom   export at exit (Prometheus text format;
+                                       any other extension writes JSON)
+    GUESSNUMBER_PROFILE=game.pstats    run cProfile for the whole process and
+                                       dump the stats at exit
+
+Usage:
+    with timer("db.record_game"):
+        ...
+
+    @timed("model.predict")
+    def predict_next_guess(...):
+        ...
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float("inf"))
+
+_lock = threading.Lock()
+_histograms = {}  # name -> {"count", "sum", "buckets": [count per bucket]}
+_counters = {}    # name -> total
+_gauges = {}      # name -> last value
+_profiler = None
+
+
+def observe(name, seconds):
+    """Record one latency sample for a stage"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = {"count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+                break
+
+
+def increment(name, amount=1):
+    """Add to a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    """Set a gauge to an absolute value (e.g. a queue depth)"""
+    with _lock:
+        _gauges[name] = value
+
+
+@contextmanager
+def timer(name):
+    """Time the enclosed block as one sample of the `name` stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator: time every call of the function as the `name` stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Copy of the current metrics: {"histograms": {...}, "counters": {...}, "gauges": {...}}"""
+    with _lock:
+        return {
+            "histograms": {name: {"count": h["count"], "sum": h["sum"], "buckets": list(h["buckets"])}
+                           for name, h in _histograms.items()},
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def _metric_name(name):
+    return "guessnumber_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text():
+    """Render the metrics in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = []
+    for name, histogram in sorted(data["histograms"].items()):
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum {histogram['sum']}")
+        lines.append(f"{metric}_count {histogram['count']}")
+    for name, value in sorted(data["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, value in sorted(data["gauges"].items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(path):
+    """Write the metrics to a file: Prometheus text for .prom, JSON otherwise"""
+    if path.endswith(".prom"):
+        content = prometheus_text()
+    else:
+        data = snapshot()
+        data["buckets"] = [str(bound) for bound in BUCKETS]
+        content = json.dumps(data, indent=2)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def start_profiling():
+    """Start cProfile for the rest of the process (main thread)"""
+    global _profiler
+    import cProfile
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profiling(path):
+    """Stop cProfile and dump the stats (readable with python -m pstats)"""
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(path)
+        _profiler = None
+
+
+if os.environ.get("GUESSNUMBER_PROFILE"):
+    start_profiling()
+    atexit.register(stop_profiling, os.environ["GUESSNUMBER_PROFILE"])
+
+if os.environ.get("GUESSNUMBER_METRICS"):
+    atexit.register(export_metrics, os.environ["GUESSNUMBER_METRICS"])
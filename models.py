@@ -0,0 +1,146 @@
+"""Per-player AI models with a size-bounded LRU cache.
+
+Per-player models are trained on each user's own games and saved to
+MODEL_DIR (GUESSNUMBER_MODEL_DIR, default "models") as player_<id>.v<format>.pkl.
+ModelCache loads them lazily, keeps at most max_models of them (and at most
+max_bytes of pickled model data) in memory, and falls back to the global model
+for users without one.
+
+Usage:
+    python models.py train [--min-games N] [--model-dir DIR]
+"""
+import os
+import time
+import pickle
+import argparse
+import threading
+from collections import OrderedDict
+
+from instrumentation import increment, observe, set_gauge, timed
+from users import get_user_cache
+
+MODEL_DIR = os.environ.get("GUESSNUMBER_MODEL_DIR", "models")
+MODEL_FORMAT = 2  # Bump when the features in regression.py change; older files are ignored
+
+
+def model_path(user_id, model_dir=None):
+    return os.path.join(model_dir or MODEL_DIR, f"player_{user_id}.v{MODEL_FORMAT}.pkl")
+
+
+@timed("models.train_player")
+def train_player_model(user_id, model_dir=None, store=None):
+    """Train and save the model of one player. Raises ValueError without enough data"""
+    from regression import initialize_model
+    model = initialize_model(verbose=False, store=store, user_ids=[user_id])
+    path = model_path(user_id, model_dir)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write then rename, so a concurrent load never reads a partial file
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class ModelCache:
+    """LRU cache of per-player models, loaded from disk on first use.
+
+    Metrics: models.cache_hits, models.cache_misses, models.fallbacks,
+    models.cache_hit_rate, models.cached_bytes, models.load (latency).
+    """
+
+    def __init__(self, fallback=None, max_models=64, max_bytes=512 * 1024 * 1024, model_dir=None):
+        self.fallback = fallback  # Global model for players without their own
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.model_dir = model_dir
+        self._models = OrderedDict()  # user_id -> (model, size in bytes)
+        self._bytes = 0
+        self._hits = 0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def _record(self, hit):
+        self._requests += 1
+        self._hits += hit
+        increment("models.cache_hits" if hit else "models.cache_misses")
+        set_gauge("models.cache_hit_rate", self._hits / self._requests)
+
+    def get(self, user_id):
+        """The player's own model, or the fallback model if there is none"""
+        with self._lock:
+            if user_id in self._models:
+                self._models.move_to_end(user_id)
+                self._record(True)
+                return self._models[user_id][0]
+            self._record(False)
+
+        path = model_path(user_id, self.model_dir)
+        try:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                data = f.read()
+            model = pickle.loads(data)
+            observe("models.load", time.perf_counter() - start)
+        except FileNotFoundError:
+            increment("models.fallbacks")
+            return self.fallback
+
+        with self._lock:
+            if user_id not in self._models:
+                self._models[user_id] = (model, len(data))
+                self._bytes += len(data)
+                self._evict()
+            return self._models[user_id][0]
+
+    def _evict(self):
+        while self._models and (len(self._models) > self.max_models or self._bytes > self.max_bytes):
+            _, (_, size) = self._models.popitem(last=False)
+            self._bytes -= size
+            increment("models.evictions")
+        set_gauge("models.cached_bytes", self._bytes)
+
+    def invalidate(self, user_id=None):
+        """Drop one player's model (e.g. after retraining), or all of them"""
+        with self._lock:
+            if user_id is None:
+                self._models.clear()
+                self._bytes = 0
+            elif user_id in self._models:
+                self._bytes -= self._models.pop(user_id)[1]
+            set_gauge("models.cached_bytes", self._bytes)
+
+    @property
+    def hit_rate(self):
+        return self._hits / self._requests if self._requests else 0.0
+
+
+def train_all(min_games=20, model_dir=None):
+    """Train a model for every non-AI player with at least min_games games. Returns the number trained"""
+    from storage import open_store
+    store = open_store()
+    ai_user_id = get_user_cache().ai_user_id(readonly=True)
+    games = store.scan(["user_id"], exclude_user_ids=[ai_user_id] if ai_user_id else [])["user_id"].value_counts()
+    trained = 0
+    for user_id in sorted(int(user_id) for user_id, count in games.items() if count >= min_games):
+        try:
+            train_player_model(user_id, model_dir, store)
+            trained += 1
+        except ValueError:
+            pass  # Not enough games for this player, the global model is used
+    return trained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Train per-player models")
+    train.add_argument("--min-games", type=int, default=20, help="Games a player needs for a model (default: 20)")
+    train.add_argument("--model-dir", default=None, help=f"Output directory (default: {MODEL_DIR})")
+    args = parser.parse_args()
+    if args.command == "train":
+        trained = train_all(args.min_games, args.model_dir)
+        print(f"Trained {trained} player models in {args.model_dir or MODEL_DIR}")
+
+
+if __name__ == "__main__":
+    main()
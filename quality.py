@@ -0,0 +1,328 @@
+"""Data-quality and drift monitoring of the AI training data.
+
+Each run profiles only the games appended since the previous run (read with
+GameStore.scan_after, so a run costs O(new games)):
+
+    quality checks     issues per game (bad ranges, guesses out of range,
+                       inconsistent won/attempts_count, ...) counted per source
+    distributions      fixed-bin histograms of every model feature
+                       (regression.FEATURES) and of the target, per source
+    drift              population stability index (PSI) of the new games
+                       against the baseline: every game profiled before
+
+Histograms are mergeable, so the baseline is the running total of the new
+games of every run. Sources: "simulated" for the player<N>@test.com users of
+simulation.py, "real" for everyone else; AI games are not training data and
+are skipped. Training can weight or drop a source with
+GUESSNUMBER_SOURCE_WEIGHTS, e.g. "real=1,simulated=0.2" (see
+regression.load_and_process_data).
+
+State lives in QUALITY_DIR (GUESSNUMBER_QUALITY_DIR, default "data_quality"):
+
+    profile.json    checkpoint and baseline profile
+    runs.jsonl      one report per run
+
+Usage:
+    python quality.py run [--max-psi 0.25] [--max-issue-rate 0.01] [--min-rows 500]
+    python quality.py show
+    python quality.py reset
+
+`run` exits with status 1 when a check fails, so a scheduled retrain can be
+gated on it: python quality.py run && python models.py train
+"""
+import os
+import sys
+import json
+import math
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+import database
+from config import LEVELS
+from users import user_sources
+from instrumentation import increment, timer
+
+QUALITY_DIR = os.environ.get("GUESSNUMBER_QUALITY_DIR", "data_quality")
+PROFILE_FORMAT = 1  # Bump when BINS or the checks change; older profiles are rebuilt
+
+# Bucket i counts values in [edges[i], edges[i + 1])
+_POSITION_EDGES = [-math.inf] + [i / 20 for i in range(20)] + [math.nextafter(1.0, 2.0), math.inf]
+BINS = {
+    "position": _POSITION_EDGES,                                  # Out of [0, 1]: first or last bucket
+    "attempt_count": [-math.inf] + list(range(1, 16)) + [math.inf],
+    "feedback": [-math.inf, -0.5, 0.5, math.inf],                 # -1, 0, 1
+    "log_span": [-math.inf] + list(range(0, 65)) + [math.inf],
+    "next_position": _POSITION_EDGES,
+}
+
+# Per-game checks, in report order
+ISSUES = ["missing_attempts", "malformed_attempts", "bad_range", "target_out_of_range", "guess_out_of_range",
+          "count_mismatch", "won_mismatch", "over_budget", "unknown_difficulty", "repeated_guess"]
+WARNINGS = {"repeated_guess"}  # Reported, but plausible play: not counted as a bad game
+
+
+def check_game(attempts_array, attempts_count, won, difficulty, target, range_min, range_max):
+    """Issues (names from ISSUES) of one stored game, and its decoded attempts (None if unreadable)"""
+    from storage import decode_attempts
+    issues = []
+    try:
+        attempts = decode_attempts(attempts_array)
+    except (ValueError, TypeError):
+        return ["malformed_attempts"], None
+    if not attempts:
+        issues.append("missing_attempts")
+    if range_max <= range_min:
+        issues.append("bad_range")
+    elif not range_min <= target <= range_max:
+        issues.append("target_out_of_range")
+    if any(not range_min <= guess <= range_max for guess in attempts):
+        issues.append("guess_out_of_range")
+    if attempts_count != len(attempts):
+        issues.append("count_mismatch")
+    if bool(won) != (bool(attempts) and attempts[-1] == target):
+        issues.append("won_mismatch")
+    if difficulty not in LEVELS:
+        issues.append("unknown_difficulty")
+    elif len(attempts) > LEVELS[difficulty]:
+        issues.append("over_budget")
+    if len(set(attempts)) != len(attempts):
+        issues.append("repeated_guess")
+    return issues, attempts
+
+
+class SourceProfile:
+    """Game count, issue counts and feature histograms of one source"""
+
+    def __init__(self):
+        self.games = 0
+        self.flagged = 0  # Games with at least one issue that is not in WARNINGS
+        self.rows = 0  # Training rows (one per guess with a successor)
+        self.issues = dict.fromkeys(ISSUES, 0)
+        self.histograms = {feature: [0] * (len(edges) - 1) for feature, edges in BINS.items()}
+
+    def add_rows(self, rows):
+        """Count training rows (FEATURES + next_position values)"""
+        if not rows:
+            return
+        values = np.asarray(rows, dtype=float)
+        for column, (feature, edges) in enumerate(BINS.items()):
+            buckets = np.searchsorted(edges, values[:, column], side="right") - 1
+            counts = np.bincount(buckets, minlength=len(edges) - 1)
+            self.histograms[feature] = [int(a + b) for a, b in zip(self.histograms[feature], counts)]
+        self.rows += len(rows)
+
+    def merge(self, other):
+        self.games += other.games
+        self.flagged += other.flagged
+        self.rows += other.rows
+        for issue, count in other.issues.items():
+            self.issues[issue] = self.issues.get(issue, 0) + count
+        for feature, counts in other.histograms.items():
+            self.histograms[feature] = [a + b for a, b in zip(self.histograms[feature], counts)]
+
+    def to_dict(self):
+        return {"games": self.games, "flagged": self.flagged, "rows": self.rows, "issues": self.issues,
+                "histograms": self.histograms}
+
+    @classmethod
+    def from_dict(cls, data):
+        profile = cls()
+        profile.games, profile.flagged, profile.rows = data["games"], data["flagged"], data["rows"]
+        profile.issues.update(data["issues"])
+        profile.histograms.update(data["histograms"])
+        return profile
+
+
+def profile_games(df, sources):
+    """{source: SourceProfile} of a DataFrame of games (AI games skipped)"""
+    from regression import game_training_rows
+    profiles = {}
+    rows_by_source = {}
+    columns = ["user_id", "attempts_array", "attempts_count", "won", "difficulty",
+               "number_to_guess", "range_min", "range_max"]
+    for (user_id, attempts_array, attempts_count, won, difficulty,
+         target, range_min, range_max) in df[columns].itertuples(index=False, name=None):
+        source = sources.get(user_id, "real")
+        if source == "ai":
+            continue
+        profile = profiles.get(source)
+        if profile is None:
+            profile = profiles[source] = SourceProfile()
+            rows_by_source[source] = []
+        target, range_min, range_max = int(target), int(range_min), int(range_max)
+        issues, attempts = check_game(attempts_array, attempts_count, won, difficulty,
+                                      target, range_min, range_max)
+        profile.games += 1
+        profile.flagged += any(issue not in WARNINGS for issue in issues)
+        for issue in issues:
+            profile.issues[issue] += 1
+        if attempts and range_max > range_min:  # The games load_and_process_data trains on
+            rows_by_source[source].extend(game_training_rows(attempts, range_min, range_max, target))
+    for source, profile in profiles.items():
+        profile.add_rows(rows_by_source[source])
+    return profiles
+
+
+def psi(expected, actual):
+    """Population stability index between two histograms (0: same distribution).
+
+    Common reading: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 major shift.
+    """
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    # Additive smoothing, so empty buckets do not make the index infinite
+    p = (expected + 0.5) / (expected.sum() + 0.5 * len(expected))
+    q = (actual + 0.5) / (actual.sum() + 0.5 * len(actual))
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def _combined(profiles):
+    combined = SourceProfile()
+    for profile in profiles.values():
+        combined.merge(profile)
+    return combined
+
+
+def drift(baseline, batch, min_rows=500):
+    """{source: {feature: PSI}} of a batch against the baseline (sources and "all").
+
+    Sources with fewer than min_rows training rows on either side are left
+    out: the index is too noisy on small samples.
+    """
+    pairs = {source: (baseline[source], batch[source]) for source in batch if source in baseline}
+    if baseline and batch:
+        pairs["all"] = (_combined(baseline), _combined(batch))
+    return {source: {feature: round(psi(before.histograms[feature], after.histograms[feature]), 4)
+                     for feature in BINS}
+            for source, (before, after) in pairs.items()
+            if before.rows >= min_rows and after.rows >= min_rows}
+
+
+def _store_spec():
+    """Identity of the configured store, so a checkpoint is never applied to another one"""
+    spec = os.environ.get("GUESSNUMBER_STORAGE", "sqlite")
+    return f"sqlite:{database.DB_PATH}" if spec == "sqlite" else spec
+
+
+def load_state(directory=None):
+    try:
+        with open(os.path.join(directory or QUALITY_DIR, "profile.json")) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get("format") == PROFILE_FORMAT else None
+
+
+def _save_state(directory, state):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "profile.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_checks(store=None, directory=None, max_psi=0.25, max_issue_rate=0.01, min_rows=500):
+    """Profile the games appended since the last run, compare them to the baseline and save the report.
+
+    Returns:
+        dict: The report (new_games, sources, drift, alerts); alerts is empty when every check passed
+    """
+    from storage import open_store
+    directory = directory or QUALITY_DIR
+    store = store or open_store()
+    spec = _store_spec()
+    state = load_state(directory)
+    if state is None or state["store"] != spec:
+        state = {"format": PROFILE_FORMAT, "store": spec, "checkpoint": None, "profiles": {}}
+    baseline = {source: SourceProfile.from_dict(data) for source, data in state["profiles"].items()}
+
+    with timer("quality.scan"):
+        df, checkpoint = store.scan_after(state["checkpoint"])
+    with timer("quality.profile"):
+        # Only the players of the batch, from the database holding the store's users
+        sources = user_sources(path=getattr(store, "path", None), user_ids=df["user_id"].unique())
+        batch = profile_games(df, sources)
+        scores = drift(baseline, batch, min_rows)
+
+    alerts = []
+    for source, profile in sorted(batch.items()):
+        rate = profile.flagged / profile.games if profile.games else 0.0
+        if rate > max_issue_rate:
+            worst = max((issue for issue in ISSUES if issue not in WARNINGS), key=profile.issues.get)
+            alerts.append(f"{source}: {rate:.1%} of new games have issues (mostly {worst})")
+    for source, features in sorted(scores.items()):
+        for feature, score in features.items():
+            if score > max_psi:
+                alerts.append(f"{source}: {feature} drifted (PSI {score:.3f} > {max_psi})")
+
+    report = {
+        "run_at": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        "store": spec,
+        "checkpoint": [state["checkpoint"], checkpoint],
+        "new_games": len(df),
+        "sources": {source: {"games": profile.games, "flagged": profile.flagged, "rows": profile.rows,
+                             "issues": {issue: count for issue, count in profile.issues.items() if count}}
+                    for source, profile in sorted(batch.items())},
+        "drift": scores,
+        "alerts": alerts,
+    }
+    # The batch joins the baseline, so the next run compares against every game profiled so far
+    for source, profile in batch.items():
+        baseline.setdefault(source, SourceProfile()).merge(profile)
+    state["checkpoint"] = checkpoint
+    state["profiles"] = {source: profile.to_dict() for source, profile in baseline.items()}
+    state["updated_at"] = report["run_at"]
+    _save_state(directory, state)
+    with open(os.path.join(directory, "runs.jsonl"), "a") as f:
+        f.write(json.dumps(report) + "\n")
+    increment("quality.games_profiled", len(df))
+    increment("quality.alerts", len(alerts))
+    return report
+
+
+def print_report(report):
+    print(f"{report['new_games']} new games since the last run ({report['run_at']})")
+    for source, summary in report["sources"].items():
+        issues = ", ".join(f"{issue} {count}" for issue, count in summary["issues"].items()) or "no issues"
+        print(f"  {source:<10} {summary['games']:>8} games {summary['rows']:>9} rows  {issues}")
+    for source, features in report["drift"].items():
+        print(f"  PSI {source:<10} " + "  ".join(f"{feature} {score:.3f}" for feature, score in features.items()))
+    for alert in report["alerts"]:
+        print(f"ALERT {alert}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "show", "reset"])
+    parser.add_argument("--dir", default=QUALITY_DIR, help=f"State directory (default: {QUALITY_DIR})")
+    parser.add_argument("--max-psi", type=float, default=0.25, help="Drift alert threshold (default: 0.25)")
+    parser.add_argument("--max-issue-rate", type=float, default=0.01,
+                        help="Alert when a larger share of the new games has issues (default: 0.01)")
+    parser.add_argument("--min-rows", type=int, default=500,
+                        help="Training rows a source needs for a drift score (default: 500)")
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run_checks(directory=args.dir, max_psi=args.max_psi, max_issue_rate=args.max_issue_rate,
+                            min_rows=args.min_rows)
+        print_report(report)
+        sys.exit(1 if report["alerts"] else 0)
+    elif args.command == "show":
+        state = load_state(args.dir)
+        if state is None:
+            print(f"No profile in {args.dir}")
+            return
+        print(f"Profile of {state['store']} up to checkpoint {state['checkpoint']} ({state['updated_at']})")
+        for source, data in sorted(state["profiles"].items()):
+            print(f"  {source:<10} {data['games']:>8} games {data['rows']:>9} rows  "
+                  f"{data['flagged']} with issues")
+    else:
+        for name in ("profile.json", "runs.jsonl"):
+            if os.path.exists(os.path.join(args.dir, name)):
+                os.remove(os.path.join(args.dir, name))
+        print(f"Removed the profile and run history in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
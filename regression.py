@@ -1,69 +1,146 @@
-import sqlite3
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
-import json
-
-def load_and_process_data():
-    # Connect to the database
-    conn = sqlite3.connect('guessNumber.db')
-    
-    # Query to get the game data
-    query = """
-    SELECT attempts_array, range_min, range_max, number_to_guess
-    FROM game_stats
-    WHERE attempts_array IS NOT NULL
-    AND user_id != (
-        SELECT id 
-        FROM users 
-        WHERE email = 'ai.player@game.com'
-    )
+import math
+from datetime import datetime, timedelta, timezone
+from users import get_user_cache, user_sources
+from config import SOURCE_WEIGHTS
+from storage import open_store, decode_attempts
+from instrumentation import timed
+
+# Model inputs. Guesses are positions in [0, 1] within the game's range, so the
+# model generalises across range sizes and never sees raw (up to 64-bit) values.
+FEATURES = ['position', 'attempt_count', 'feedback', 'log_span']
+
+def range_features(range_start, range_end, last_guess, attempt_count, feedback):
+    """Model input row for one game state"""
+    span = range_end - range_start
+    return [(last_guess - range_start) / span, attempt_count, feedback, math.log2(span)]
+
+POSITION_SCALE = 2 ** 53  # A float in [0, 1] is a whole number of 2^-53 steps at most
+
+def from_position(position, range_start, range_end):
+    """Integer guess at a predicted position, kept in range.
+
+    The position is scaled to an integer once, so the rest is exact integer
+    arithmetic: a float product would round guesses in ranges wider than 2^53.
     """
-    
-    # Load raw data
-    df_raw = pd.read_sql_query(query, conn)
-    conn.close()
+    steps = round(min(max(float(position), 0.0), 1.0) * POSITION_SCALE)
+    return range_start + (steps * (range_end - range_start) + POSITION_SCALE // 2) // POSITION_SCALE
+
+class GuessBounds:
+    """Interval the target must be in, narrowed by the feedback seen so far.
+
+    Clamping every AI guess into the middle half of the interval means each
+    feedback removes at least a quarter of it, so the AI needs O(log range)
+    guesses whatever the model predicts, for ranges up to 2^63.
+    """
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def update(self, guess, feedback):
+        """Record feedback for a guess: 1 if the target is higher, -1 if lower"""
+        if feedback == 1:
+            self.low = max(self.low, guess + 1)
+        elif feedback == -1:
+            self.high = min(self.high, guess - 1)
+
+    def clamp(self, guess):
+        if self.low > self.high:  # Inconsistent feedback: nothing to narrow to
+            return guess
+        quarter = (self.high - self.low) // 4
+        return max(self.low + quarter, min(self.high - quarter, guess))
+
+def game_training_rows(attempts, range_min, range_max, target):
+    """Training rows (FEATURES + next_position) of one game: one per guess that has a successor"""
+    rows = []
+    for i in range(len(attempts) - 1):
+        current_guess = attempts[i]
+        next_guess = attempts[i + 1]
+        attempt_count = i + 1
+
+        # Determine feedback (-1 for "less", 1 for "more")
+        if current_guess > target:
+            feedback = -1  # need to guess lower
+        elif current_guess < target:
+            feedback = 1   # need to guess higher
+        else:
+            feedback = 0   # correct guess
+
+        rows.append(range_features(range_min, range_max, current_guess, attempt_count, feedback)
+                    + [(next_guess - range_min) / (range_max - range_min)])
+    return rows
+
+@timed("model.load_data")
+def load_and_process_data(store=None, recent_days=None, archive_fraction=0.0, user_ids=None,
+                          source_weights=None):
+    """Build the training set from every non-AI game.
+
+    Args:
+        store (GameStore): Where games are read from (default: configured backend)
+        user_ids (list): Only use games of these players (default: all players)
+        recent_days (int): Only use hot games from the last recent_days days
+        archive_fraction (float): Share of archived games sampled into the set
+        source_weights (dict): Sample weight per source ("real", "simulated"), see
+            users.source_of; 0 leaves a source out. Default: GUESSNUMBER_SOURCE_WEIGHTS,
+            and without it every game weighs the same (no weight column)
+    """
+    source_weights = SOURCE_WEIGHTS if source_weights is None else source_weights
+
+    store = store or open_store()
+    # Users live in the store's database (SQLite) or in the default one (other backends)
+    users_path = getattr(store, "path", None)
+
+    # AI user id from the shared cache, looked up read-only
+    ai_user_id = get_user_cache(users_path).ai_user_id(readonly=True)
+    excluded = [ai_user_id] if ai_user_id is not None else []
+    user_weights = {}
+    if source_weights:
+        for user_id, source in user_sources(path=users_path).items():
+            weight = source_weights.get(source, 1.0)
+            if weight == 0:
+                excluded.append(user_id)
+            else:
+                user_weights[user_id] = weight
+    
+    # Load raw data from the configured storage backend
+    columns = ['attempts_array', 'range_min', 'range_max', 'number_to_guess', 'user_id']
+    since = None
+    if recent_days is not None:
+        since = (datetime.now(timezone.utc) - timedelta(days=recent_days)).strftime('%Y-%m-%d %H:%M:%S')
+    df_raw = store.scan(columns, user_ids=user_ids, exclude_user_ids=excluded, since=since)
+    if archive_fraction > 0:
+        df_archived = store.scan(columns, user_ids=user_ids, exclude_user_ids=excluded,
+                                 include_archive=True, hot=False)
+        df_raw = pd.concat([df_raw, df_archived.sample(frac=archive_fraction, random_state=42)])
+    df_raw = df_raw[df_raw['attempts_array'].notna()]
     
     # Process the data into a format suitable for ML
     processed_data = []
-    
-    for _, row in df_raw.iterrows():
-        attempts = json.loads(row['attempts_array'])
-        range_min = row['range_min']
-        range_max = row['range_max']
-        target = row['number_to_guess']
-        
-        # Process each attempt except the last one
-        for i in range(len(attempts) - 1):
-            current_guess = attempts[i]
-            next_guess = attempts[i + 1]
-            attempt_count = i + 1
-            
-            # Determine feedback (-1 for "less", 1 for "more")
-            if current_guess > target:
-                feedback = -1  # need to guess lower
-            elif current_guess < target:
-                feedback = 1   # need to guess higher
-            else:
-                feedback = 0   # correct guess
-            
-            processed_data.append({
-                'range_start': range_min,
-                'range_end': range_max,
-                'last_guess': current_guess,
-                'attempt_count': attempt_count,
-                'feedback': feedback,
-                'next_guess': next_guess
-            })
-    
-    return pd.DataFrame(processed_data)
+    weights = []
+    
+    for attempts_array, range_min, range_max, target, user_id in df_raw[columns].itertuples(index=False, name=None):
+        attempts = decode_attempts(attempts_array)
+        range_min, range_max, target = int(range_min), int(range_max), int(target)
+        if range_max <= range_min:
+            continue
+        rows = game_training_rows(attempts, range_min, range_max, target)
+        processed_data.extend(rows)
+        weights.extend([user_weights.get(user_id, 1.0)] * len(rows))
+    
+    df = pd.DataFrame(processed_data, columns=FEATURES + ['next_position'])
+    if source_weights:
+        df['weight'] = weights
+    return df
 
 def prepare_data(df):
     # Define features and target
-    X = df[['range_start', 'range_end', 'last_guess', 'attempt_count', 'feedback']]
-    y = df['next_guess']
+    X = df[FEATURES]
+    y = df['next_position']
     
     # Split the dataset into training and testing sets
     X_train, X_test, y_train, y_test = train_test_split(
@@ -72,10 +149,10 @@ def prepare_data(df):
     
     return X_train, X_test, y_train, y_test
 
-def train_model(X_train, y_train):
+def train_model(X_train, y_train, sample_weight=None):
     # Initialize and train the Random Forest model
     model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, sample_weight=sample_weight)
     return model
 
 def evaluate_model(model, X_test, y_test):
@@ -91,33 +168,55 @@ def evaluate_model(model, X_test, y_test):
     
     return y_pred
 
-def predict_next_guess(model, range_start, range_end, last_guess, attempt_count, feedback):
+@timed("model.predict")
+def predict_next_guess(model, range_start, range_end, last_guess, attempt_count, feedback, bounds=None):
     # Create input features for prediction as a DataFrame with named columns
-    features = pd.DataFrame([[range_start, range_end, last_guess, attempt_count, feedback]], 
-                          columns=['range_start', 'range_end', 'last_guess', 'attempt_count', 'feedback'])
-    
-    # Make prediction
-    prediction = model.predict(features)[0]
+    features = pd.DataFrame([range_features(range_start, range_end, last_guess, attempt_count, feedback)],
+                            columns=FEATURES)
     
-    # Ensure prediction stays within the valid range
-    prediction = max(range_start, min(range_end, prediction))
-    return int(round(prediction))
+    # Make prediction and map the position back to an integer in the range
+    guess = from_position(model.predict(features)[0], range_start, range_end)
+    return bounds.clamp(guess) if bounds is not None else guess
 
+@timed("model.predict_batch")
+def predict_next_guesses(model, rows, bounds=None):
+    """Batched predict_next_guess: one model call for many game states.
 
-def initialize_model():
+    Args:
+        rows (list): (range_start, range_end, last_guess, attempt_count, feedback) tuples
+        bounds (list): Optional GuessBounds per row to clamp the guesses to
+
+    Returns:
+        list: Predicted next guesses, rounded and clamped to each range
+    """
+    if not rows:
+        return []
+    features = pd.DataFrame([range_features(*row) for row in rows], columns=FEATURES)
+    guesses = [from_position(position, row[0], row[1]) for position, row in zip(model.predict(features), rows)]
+    if bounds is not None:
+        guesses = [row_bounds.clamp(guess) if row_bounds is not None else guess
+                   for guess, row_bounds in zip(guesses, bounds)]
+    return guesses
+
+
+@timed("model.train")
+def initialize_model(verbose=True, **data_options):
+    """Train the AI model; data_options are passed to load_and_process_data"""
     # Load and prepare data
-    print("Loading and processing data...")
-    df = load_and_process_data()
+    if verbose:
+        print("Loading and processing data...")
+    df = load_and_process_data(**data_options)
     
     # Check if there are at least 10 games
     if len(df) < 10:
         raise ValueError("Not enough data available for training the model. At least 10 games are required.")
     
-    print("\nPreparing data...")
+    if verbose:
+        print("\nPreparing data...")
     X_train, X_test, y_train, y_test = prepare_data(df)
     
-    # Train and return the model
-    model = train_model(X_train, y_train)
+    # Train and return the model (weighted by source if load_and_process_data added weights)
+    model = train_model(X_train, y_train, df.loc[X_train.index, 'weight'] if 'weight' in df else None)
     return model
 
 def main():
@@ -0,0 +1,325 @@
+"""Replay recorded games through an AI model: counterfactual attempts and win rates.
+
+Every recorded human game is played again as a match against the model, with
+the recorded player's attempts_array as the player's moves. As in
+GuessNumberGame.play_game, the AI guesses first each round, from its own last
+guess and the feedback to the player's last guess, within the GuessBounds left
+by the player's guesses. The AI plays the rounds the recorded match lasted
+and wins it if it finds the number in one of them (first, in case of a tie).
+Per game this gives the AI's attempts and whether it would have won.
+
+Matches the player won before the AI store no AI row, so the recorded AI
+result (same match_id) only exists for matches the AI won or both lost: the
+recorded win rate, and the replayed one next to it, cover that subset only
+and favour the AI. (Rows written by simulation.py come from an AI playing
+alone, not against the recorded player.)
+
+The AI's moves only depend on the model and on (difficulty, range_min,
+range_max, target, player attempts), so results are cached in REPLAY_CACHE
+(SQLite, GUESSNUMBER_REPLAY_CACHE, default "replay_cache.db") under that key
+and the model version (a hash of the pickled model). Replaying after new
+games or a new model only computes the keys not cached yet; uncached games
+are played in lock-step batches (one model call per round) across a process
+pool.
+
+Model specs are those of tournament.py: global, midpoint or a .pkl path.
+With --baseline, both models replay the same games and the per-game changes
+are reported, as an offline regression test for AI changes.
+
+Usage:
+    python replay.py [--model global] [--baseline models/old.pkl] [--workers 4]
+                     [--since TS] [--limit N] [--output results.parquet] [--max-regression 0.01]
+"""
+import os
+import sys
+import json
+import pickle
+import hashlib
+import argparse
+import contextlib
+from multiprocessing import Pool
+
+import pandas as pd
+
+import database
+from regression import GuessBounds, predict_next_guesses
+from simulation import LEVELS
+from storage import open_store, decode_attempts, encode_attempts
+from users import get_user_cache
+from instrumentation import increment, timer
+
+REPLAY_CACHE = os.environ.get("GUESSNUMBER_REPLAY_CACHE", "replay_cache.db")
+REPLAY_FORMAT = 2  # Part of every model version: bump when the replayed moves change
+
+# Model shared with pool workers (set by _init_worker)
+_worker_model = None
+
+
+def model_version(model):
+    """Short hash identifying a model's parameters (and REPLAY_FORMAT)"""
+    digest = hashlib.sha256(pickle.dumps(model, protocol=4))
+    digest.update(f"replay:{REPLAY_FORMAT}".encode())
+    return digest.hexdigest()[:16]
+
+
+def match_rounds(difficulty, target, player_attempts):
+    """Rounds a recorded match lasted: up to the player's winning guess, within the level's budget"""
+    rounds = player_attempts.index(target) + 1 if target in player_attempts else len(player_attempts)
+    return min(rounds, LEVELS[difficulty])
+
+
+def replay_games(model, games):
+    """AI attempts in each match of [(difficulty, range_min, range_max, target, player_attempts), ...].
+
+    The AI stops at the number or after the rounds of the recorded match. The
+    games are played in lock-step: each round is one batched model call for
+    every game still running.
+    """
+    rounds = [match_rounds(difficulty, target, player_attempts)
+              for difficulty, _, _, target, player_attempts in games]
+    attempts = [[(range_min + range_max) // 2] for _, range_min, range_max, _, _ in games]
+    bounds = [GuessBounds(range_min, range_max) for _, range_min, range_max, _, _ in games]
+    active = [index for index, game in enumerate(games) if attempts[index][0] != game[3] and rounds[index] > 1]
+    attempt_count = 1
+    while active:
+        rows = []
+        for index in active:
+            _, range_min, range_max, target, player_attempts = games[index]
+            # Feedback to the player's previous guess, which also narrows what the AI knows
+            player_guess = player_attempts[attempt_count - 1]
+            feedback = 1 if player_guess < target else -1
+            bounds[index].update(player_guess, feedback)
+            rows.append((range_min, range_max, attempts[index][-1], attempt_count, feedback))
+        guesses = predict_next_guesses(model, rows, [bounds[index] for index in active])
+        still_active = []
+        for index, guess in zip(active, guesses):
+            attempts[index].append(guess)
+            if guess != games[index][3] and len(attempts[index]) < rounds[index]:
+                still_active.append(index)
+        active = still_active
+        attempt_count += 1
+    return attempts
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def replay_chunk(games):
+    """Replay a chunk of games with the worker's model: (games, attempts)"""
+    return games, replay_games(_worker_model, games)
+
+
+class ReplayCache:
+    """AI attempts per (model version, difficulty, range_min, range_max, target, player attempts)"""
+
+    def __init__(self, path=None):
+        self.conn = database.connect(path or REPLAY_CACHE)
+        self.conn.execute('DROP TABLE IF EXISTS replays')  # REPLAY_FORMAT 1: the AI played alone
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_replays (
+                model_version TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                range_min INTEGER NOT NULL,
+                range_max INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                player_attempts BLOB NOT NULL,  -- storage.encode_attempts() bytes
+                ai_attempts BLOB NOT NULL,
+                PRIMARY KEY (model_version, difficulty, range_min, range_max, target, player_attempts)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def load(self, version):
+        """{(difficulty, range_min, range_max, target, player_attempts): attempts} of a model version"""
+        return {(difficulty, range_min, range_max, target, tuple(decode_attempts(player_attempts))):
+                decode_attempts(ai_attempts)
+                for difficulty, range_min, range_max, target, player_attempts, ai_attempts in self.conn.execute(
+                    'SELECT difficulty, range_min, range_max, target, player_attempts, ai_attempts '
+                    'FROM match_replays WHERE model_version = ?', (version,))}
+
+    def save(self, version, games, attempts):
+        self.conn.executemany('INSERT OR REPLACE INTO match_replays VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              [(version,) + game[:4] + (encode_attempts(game[4]), encode_attempts(game_attempts))
+                               for game, game_attempts in zip(games, attempts)])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def replay_model(model, keys, cache, workers=1, chunk_size=500):
+    """AI attempts for every key, computing only those missing from the cache"""
+    version = model_version(model)
+    known = cache.load(version)
+    missing = sorted(set(keys) - known.keys())
+    increment("replay.cache_hits", len(keys) - len(missing))
+    increment("replay.cache_misses", len(missing))
+    chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+    with timer("replay.play"):
+        if workers > 1 and len(chunks) > 1:
+            with Pool(workers, initializer=_init_worker, initargs=(model,)) as pool:
+                results = pool.imap_unordered(replay_chunk, chunks)
+                for games, attempts in results:
+                    cache.save(version, games, attempts)  # Saved as they arrive: an interrupted run keeps them
+                    known.update(zip(games, attempts))
+        else:
+            _init_worker(model)
+            for games, attempts in map(replay_chunk, chunks):
+                cache.save(version, games, attempts)
+                known.update(zip(games, attempts))
+    return version, {key: known[key] for key in keys}, len(missing)
+
+
+def load_games(store=None, since=None, limit=None, user_ids=None):
+    """Recorded human games to replay, with the recorded AI result of their match when there is one"""
+    store = store or open_store()
+    ai_user_id = get_user_cache().ai_user_id(readonly=True)
+    ai_user_ids = [ai_user_id] if ai_user_id is not None else []
+    with timer("replay.scan"):
+        df = store.scan(user_ids=user_ids, exclude_user_ids=ai_user_ids, since=since, include_archive=True)
+    df = df[df["difficulty"].isin(list(LEVELS)) & (df["range_max"] > df["range_min"])
+            & df["attempts_array"].notna()]
+    df = df.assign(player_attempts=df["attempts_array"].map(lambda value: tuple(decode_attempts(value))))
+    df = df[df["player_attempts"].map(len) > 0]
+    if limit:
+        df = df.sort_values("timestamp", kind="stable").tail(limit)
+    df = df.reset_index(drop=True)
+    df["won"] = df["won"].astype(bool)
+
+    # The AI row of the same match, if it was recorded
+    match_ids = df["match_id"].dropna().unique().tolist()
+    if match_ids and ai_user_ids:
+        df_ai = store.scan(["match_id", "attempts_count", "won"], user_ids=ai_user_ids,
+                           match_ids=match_ids, include_archive=True)
+        df_ai = df_ai.drop_duplicates("match_id").rename(
+            columns={"attempts_count": "recorded_ai_attempts", "won": "recorded_ai_won"})
+        df = df.merge(df_ai, on="match_id", how="left")
+    else:
+        df["recorded_ai_attempts"] = pd.NA
+        df["recorded_ai_won"] = pd.NA
+    return df
+
+
+def game_keys(df):
+    return list(zip(df["difficulty"], df["range_min"].astype(int).tolist(), df["range_max"].astype(int).tolist(),
+                    df["number_to_guess"].astype(int).tolist(), df["player_attempts"]))
+
+
+def counterfactual(df, attempts_by_key, prefix="ai"):
+    """Per-game results of one model: {prefix}_attempts and {prefix}_won (the AI won the match)"""
+    keys = game_keys(df)
+    counts = pd.Series([len(attempts_by_key[key]) for key in keys], index=df.index)
+    won = pd.Series([attempts_by_key[key][-1] == key[3] for key in keys], index=df.index)
+    return pd.DataFrame({f"{prefix}_attempts": counts, f"{prefix}_won": won})
+
+
+def summarize(results, prefix="ai"):
+    """Aggregate rates of one model's columns in the per-game results"""
+    summary = {
+        "games": len(results),
+        "win_rate": float(results[f"{prefix}_won"].mean()) if len(results) else 0.0,
+        "mean_attempts": float(results[f"{prefix}_attempts"].mean()) if len(results) else 0.0,
+    }
+    # Only matches with both rows: matches the player won first have no AI row (see the module docstring)
+    recorded = results[results["recorded_ai_won"].notna()]
+    if len(recorded):
+        summary["recorded_matches"] = len(recorded)
+        summary["recorded_win_rate"] = float(recorded["recorded_ai_won"].astype(bool).mean())
+        summary["replayed_win_rate"] = float(recorded[f"{prefix}_won"].mean())
+    return summary
+
+
+def run_replay(model, baseline=None, store=None, cache_path=None, workers=1, since=None, limit=None):
+    """Replay the recorded games with a model (and optionally a baseline model).
+
+    Returns:
+        tuple: (per-game results DataFrame, report dict)
+    """
+    df = load_games(store, since, limit)
+    keys = game_keys(df)
+    cache = ReplayCache(cache_path)
+    report = {}
+    try:
+        columns = [df[["user_id", "timestamp", "difficulty", "range_min", "range_max", "number_to_guess",
+                       "attempts_count", "won", "match_id", "recorded_ai_attempts", "recorded_ai_won"]]]
+        for prefix, candidate in (("ai", model), ("baseline", baseline)):
+            if candidate is None:
+                continue
+            version, attempts_by_key, computed = replay_model(candidate, keys, cache, workers)
+            columns.append(counterfactual(df, attempts_by_key, prefix))
+            report[prefix] = {"model_version": version, "replayed": computed, "cached": len(set(keys)) - computed}
+        results = pd.concat(columns, axis=1)
+    finally:
+        cache.close()
+
+    for prefix in report:
+        report[prefix].update(summarize(results, prefix))
+    if baseline is not None:
+        attempts_delta = results["ai_attempts"] - results["baseline_attempts"]
+        report["changes"] = {
+            "improved": int(((results["ai_won"] & ~results["baseline_won"])
+                             | ((results["ai_won"] == results["baseline_won"]) & (attempts_delta < 0))).sum()),
+            "regressed": int(((~results["ai_won"] & results["baseline_won"])
+                              | ((results["ai_won"] == results["baseline_won"]) & (attempts_delta > 0))).sum()),
+            "mean_attempts_delta": float(attempts_delta.mean()) if len(results) else 0.0,
+            "win_rate_delta": report["ai"]["win_rate"] - report["baseline"]["win_rate"],
+        }
+    return results, report
+
+
+def print_report(report):
+    for prefix in ("ai", "baseline"):
+        if prefix not in report:
+            continue
+        row = report[prefix]
+        label = "model" if prefix == "ai" else "baseline"
+        print(f"{label:<9} {row['model_version']}  {row['games']:>8} games  match win {row['win_rate']:>6.1%}  "
+              f"attempts {row['mean_attempts']:>5.2f}  ({row['replayed']} replayed, {row['cached']} cached)")
+        if "recorded_matches" in row:
+            print(f"{'':<9} {row['recorded_matches']} matches with both rows recorded: "
+                  f"recorded {row['recorded_win_rate']:.1%}, replayed {row['replayed_win_rate']:.1%} "
+                  f"(matches the player won first store no AI row: biased towards the AI)")
+    if "changes" in report:
+        changes = report["changes"]
+        print(f"changes   {changes['improved']} games improved, {changes['regressed']} regressed, "
+              f"attempts {changes['mean_attempts_delta']:+.3f}, match win rate {changes['win_rate_delta']:+.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="global", help="Model to replay with (default: global)")
+    parser.add_argument("--baseline", default=None, help="Model to compare against")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes")
+    parser.add_argument("--since", default=None, help="Only replay games from this timestamp on")
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the latest N games")
+    parser.add_argument("--cache", default=None, help=f"Replay cache database (default: {REPLAY_CACHE})")
+    parser.add_argument("--output", default=None, help="Write the per-game results (.parquet or .csv)")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="With --baseline: exit 1 if the match win rate drops by more than this")
+    args = parser.parse_args()
+
+    from tournament import load_strategy
+    with contextlib.redirect_stdout(sys.stderr):
+        model = load_strategy(args.model)
+        baseline = load_strategy(args.baseline) if args.baseline else None
+    results, report = run_replay(model, baseline, cache_path=args.cache, workers=args.workers,
+                                 since=args.since, limit=args.limit)
+    print_report(report)
+    if args.output:
+        if args.output.endswith(".parquet"):
+            results.to_parquet(args.output, index=False)
+        else:
+            results.to_csv(args.output, index=False)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if (args.max_regression is not None and "changes" in report
+            and -report["changes"]["win_rate_delta"] > args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
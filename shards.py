@@ -0,0 +1,222 @@
+"""Sharded simulation ingestion: parallel writers without write-lock contention.
+
+SQLite allows one writer at a time, so simulators writing to the game
+database concurrently wait on (and eventually fail with) "database is
+locked". Instead, each writer fills its own shard, a scratch SQLite file
+keyed by email rather than user id:
+
+    shards/
+        shard-<time_ns>-<pid>[-<chunk>].db   table games (OUTPUT_COLUMNS)
+
+and merge_shards() attaches each shard to the game database and bulk-copies
+it with one INSERT ... SELECT per shard, in a single transaction that also
+records the shard in merged_shards, so merging again never duplicates games.
+Shards merge in name order; with a seed, the merged rows are the same for any
+number of workers.
+
+Usage:
+    python simulation.py --sharded --workers 4 ...        # Generate in shards, then merge
+    python simulation.py --format shard --output shards/  # Write shards only (any number of processes)
+    python shards.py merge shards/ [--db PATH] [--keep]
+"""
+import os
+import glob
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import database
+import simulation
+from storage import encode_attempts
+from sketches import sketch_writer_from_env
+from users import AI_EMAIL, AI_PASSWORD
+from instrumentation import increment, timer
+
+SHARD_COLUMNS = simulation.OUTPUT_COLUMNS
+GAME_COLUMNS = ", ".join(SHARD_COLUMNS[1:])  # game_stats columns after user_id
+
+
+class ShardSink:
+    """Write rows to a new shard database in a directory (published on close)"""
+
+    def __init__(self, directory, name=None, batch_size=10_000):
+        os.makedirs(directory, exist_ok=True)
+        name = name or f"shard-{time.time_ns():020d}-{os.getpid()}"
+        self.path = os.path.join(directory, name + ".db")
+        # Hidden temporary name and rename, so merge_shards never reads a shard being written
+        self.temp_path = os.path.join(directory, f".{name}.db.tmp")
+        self.conn = sqlite3.connect(self.temp_path)
+        # A scratch file rebuilt on failure: no journal, no fsync
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("DROP TABLE IF EXISTS games")
+        self.conn.execute('''
+            CREATE TABLE games (
+                email TEXT NOT NULL,
+                timestamp DATETIME,
+                difficulty TEXT,
+                attempts_array BLOB,
+                attempts_count INTEGER,
+                won BOOLEAN,
+                number_to_guess INTEGER,
+                range_min INTEGER,
+                range_max INTEGER,
+                match_id INTEGER
+            )
+        ''')
+        self.batch_size = batch_size
+        self.pending = 0
+
+    def write(self, rows):
+        self.conn.executemany('INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              [row[:3] + (encode_attempts(row[3]),) + tuple(row[4:]) for row in rows])
+        self.pending += len(rows)
+        if self.pending >= self.batch_size:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        os.replace(self.temp_path, self.path)
+
+
+def _write_chunk(task):
+    """Generate the games of a range of players into one shard. Returns the number of rows"""
+    directory, name, player_indices, seed, base_time, options, with_ai = task
+    sink = ShardSink(directory, name)
+    written = 0
+    try:
+        for player_index in player_indices:
+            rows = simulation.player_rows(
+                player_index, simulation.generate_player_games((player_index, seed, base_time, options)), with_ai)
+            sink.write(rows)
+            written += len(rows)
+    finally:
+        sink.close()
+    return written
+
+
+def write_shards(directory, player_count, model=None, seed=None, workers=1, base_time=None, options=None):
+    """Simulate players across worker processes, each writing its own shards.
+
+    Players are split into contiguous chunks, one shard each, named in player
+    order. Returns the number of rows written.
+    """
+    options = {**simulation.DEFAULT_OPTIONS, **(options or {})}
+    if base_time is None:
+        base_time = datetime.now() - timedelta(days=options["days"])  # Same window in every worker
+    run = time.time_ns()
+    chunks = max(1, min(workers * 4, player_count))  # A few chunks per worker evens out their sizes
+    bounds = [player_count * chunk // chunks for chunk in range(chunks + 1)]
+    tasks = [(directory, f"shard-{run:020d}-{os.getpid()}-{chunk:06d}", range(bounds[chunk], bounds[chunk + 1]),
+              seed, base_time, options, bool(model)) for chunk in range(chunks)]
+    with timer("shards.write"):
+        if workers > 1:
+            with Pool(workers, initializer=simulation._init_worker, initargs=(model,)) as pool:
+                written = sum(pool.imap_unordered(_write_chunk, tasks))
+        else:
+            simulation._init_worker(model)
+            written = sum(map(_write_chunk, tasks))
+    increment("shards.rows_written", written)
+    return written
+
+
+def _shards(directory):
+    return sorted(glob.glob(os.path.join(directory, "shard-*.db")))
+
+
+def merge_shards(directory, path=None, keep=False):
+    """Bulk-copy every shard of a directory into the game database.
+
+    Each shard is merged in one transaction, together with its name in
+    merged_shards; shards already listed there are skipped. Merged shards are
+    removed unless keep. Returns the number of rows merged.
+    """
+    conn = database.connect(path)
+    database.initialize_db(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS merged_shards (
+            name TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            merged_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    sketches = sketch_writer_from_env(path)  # Approximate analytics, if enabled
+    merged = 0
+    try:
+        for shard in _shards(directory):
+            merged += _merge_shard(conn, shard, os.path.basename(shard), sketches)
+            if not keep:
+                os.remove(shard)
+    finally:
+        conn.close()
+        if sketches:
+            sketches.flush(force=True)
+    return merged
+
+
+def _merge_shard(conn, shard, name, sketches):
+    """Copy one shard in a single transaction. Returns the number of rows merged (0 if already merged)"""
+    conn.execute('ATTACH DATABASE ? AS shard', (shard,))
+    try:
+        with timer("shards.merge"):
+            # Take the write lock first: another merge of the same shard, or rows committed by other
+            # writers, cannot slip in between the checks below and the copy
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM merged_shards WHERE name = ?', (name,)).fetchone():
+                conn.rollback()
+                increment("shards.skipped")
+                return 0
+            first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM game_stats').fetchone()[0]
+            # Missing users (the AI included) are created like SQLiteSink does: in order of first
+            # appearance, and only when missing, so no AUTOINCREMENT id is used up
+            conn.execute('''
+                INSERT INTO users (email, password)
+                SELECT email, CASE WHEN email = ? THEN ? ELSE ? END FROM shard.games
+                WHERE email NOT IN (SELECT email FROM users)
+                GROUP BY email ORDER BY MIN(rowid)
+            ''', (AI_EMAIL, simulation.password_hash(AI_PASSWORD),
+                  simulation.password_hash(simulation.PLAYER_PASSWORD)))
+            rows = conn.execute(f'''
+                INSERT INTO game_stats (user_id, {GAME_COLUMNS})
+                SELECT users.id, {", ".join("games." + column for column in SHARD_COLUMNS[1:])}
+                FROM shard.games AS games JOIN users ON users.email = games.email
+                ORDER BY games.rowid
+            ''').rowcount
+            conn.execute('INSERT INTO merged_shards (name, rows) VALUES (?, ?)', (name, rows))
+            if sketches:
+                ai_user = conn.execute('SELECT id FROM users WHERE email = ?', (AI_EMAIL,)).fetchone()
+                sketches.update(conn.execute(f'SELECT user_id, {GAME_COLUMNS} FROM game_stats WHERE id > ?',
+                                             (first_id,)).fetchall(), ai_user[0] if ai_user else None)
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE shard')
+    if sketches:
+        sketches.flush()  # Only rows already committed reach a segment
+    increment("shards.merged")
+    increment("shards.rows_merged", rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="Merge the shards of a directory into the game database")
+    merge.add_argument("directory")
+    merge.add_argument("--db", default=None, help="Game database (default: GUESSNUMBER_DB or guessNumber.db)")
+    merge.add_argument("--keep", action="store_true", help="Keep the shard files after merging")
+    args = parser.parse_args()
+    if args.command == "merge":
+        rows = merge_shards(args.directory, args.db, args.keep)
+        print(f"Merged {rows} rows from {args.directory} into {args.db or database.DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,69 @@
-import sqlite3
+import os
 import random
 import json
+import sys
+import csv
+import argparse
+import contextlib
+import hashlib
+from multiprocessing import Pool
 from datetime import datetime, timedelta
-from regression import initialize_model, predict_next_guess
+import numpy as np
+from regression import initialize_model, predict_next_guess, GuessBounds
+import database
+from storage import encode_attempts, new_match_id
+from sketches import sketch_writer_from_env
+from users import AI_EMAIL, AI_PASSWORD, get_user_cache
+from config import LEVELS
 
-def generate_realistic_attempts(target, min_val, max_val, max_attempts):
-    """Generate realistic sequence of guesses based on binary search with some randomness"""
+# Simulated players
+PLAYER_PASSWORD = "test"
+PLAYERS = [(f"player{i}@test.com", PLAYER_PASSWORD) for i in range(1, 11)]
+_password_hashes = {}  # password -> hash, computed once per process
+
+def password_hash(password):
+    """Stored form of a simulated user's password, hashed once per process"""
+    if password not in _password_hashes:
+        from credentials import hash_password
+        _password_hashes[password] = hash_password(password)
+    return _password_hashes[password]
+
+def stored_password(email):
+    """Stored password of a simulated user: the AI's own password or PLAYER_PASSWORD"""
+    return password_hash(AI_PASSWORD if email == AI_EMAIL else PLAYER_PASSWORD)
+
+def derive_seed(master_seed, *keys):
+    """Derive a stable 64-bit seed from a master seed and a tuple of keys
+    (e.g. a player index), independent of the worker that consumes it"""
+    material = ":".join(str(part) for part in (master_seed,) + keys)
+    return int.from_bytes(hashlib.sha256(material.encode()).digest()[:8], "big")
+
+def make_rng(master_seed, *keys):
+    """Seeded random.Random for one unit of work; unseeded if master_seed is None"""
+    if master_seed is None:
+        return random.Random()
+    return random.Random(derive_seed(master_seed, *keys))
+
+def make_np_rng(master_seed, *keys):
+    """Seeded NumPy Generator for one unit of work; unseeded if master_seed is None"""
+    if master_seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(derive_seed(master_seed, *keys))
+
+def generate_realistic_attempts(target, min_val, max_val, max_attempts, rng=random, noise_rate=0.2, jitter=2):
+    """Generate realistic sequence of guesses based on binary search with some randomness
+    (noise_rate and jitter as in PERSONAS)"""
     attempts = []
     low = min_val
     high = max_val
     
     while len(attempts) < max_attempts:
         # Add some randomness to make it more realistic
-        if random.random() < 0.2:  # 20% chance of making a "random" guess
-            guess = random.randint(low, high)
+        if rng.random() < noise_rate:  # 20% chance of making a "random" guess by default
+            guess = rng.randint(low, high)
         else:
             # Use binary search with some randomness
-            guess = (low + high) // 2 + random.randint(-2, 2)
+            guess = (low + high) // 2 + rng.randint(-jitter, jitter)
             guess = max(min_val, min(max_val, guess))  # Keep within bounds
         
         attempts.append(guess)
@@ -30,11 +77,128 @@ def generate_realistic_attempts(target, min_val, max_val, max_attempts):
             
     return attempts
 
+# Player personas for the synthetic generators
+PERSONAS = {
+    "default": {"noise_rate": 0.2, "jitter": 2},   # Same behaviour as generate_realistic_attempts
+    "careful": {"noise_rate": 0.05, "jitter": 1},  # Almost a pure binary search
+    "casual": {"noise_rate": 0.4, "jitter": 5},    # Guesses a lot
+}
+
+def generate_realistic_attempts_batch(targets, range_mins, range_maxs, max_attempts, rng,
+                                      noise_rate=0.2, jitter=2):
+    """Vectorized generate_realistic_attempts: simulate the noisy binary-search player
+    for N games at once.
+
+    Args:
+        targets, range_mins, range_maxs (np.ndarray): One entry per game
+        max_attempts (np.ndarray or int): Attempts allowed per game
+        rng (np.random.Generator): Source of randomness
+        noise_rate (float): Probability of a uniformly random guess in [low, high]
+        jitter (int): Max distance from the midpoint for a binary-search guess
+
+    Returns:
+        tuple: (attempts, counts) - attempts is an (N, max(max_attempts)) int64 array
+               padded with 0, counts is the number of guesses made in each game
+    """
+    targets = np.asarray(targets, dtype=np.int64)
+    range_mins = np.asarray(range_mins, dtype=np.int64)
+    range_maxs = np.asarray(range_maxs, dtype=np.int64)
+    n_games = len(targets)
+    max_attempts = np.broadcast_to(np.asarray(max_attempts, dtype=np.int64), (n_games,))
+    
+    attempts = np.zeros((n_games, int(max_attempts.max(initial=0))), dtype=np.int64)
+    counts = np.zeros(n_games, dtype=np.int64)
+    low = range_mins.copy()
+    high = range_maxs.copy()
+    active = np.arange(n_games)  # Indices of games still being played
+    
+    for step in range(attempts.shape[1]):
+        active = active[max_attempts[active] > step]
+        if not len(active):
+            break
+        lo = low[active]
+        hi = high[active]
+        
+        # Random guesses: the search window can be empty after a noisy guess,
+        # so draw between the smaller and larger bound
+        noisy = rng.random(len(active)) < noise_rate
+        random_guess = rng.integers(np.minimum(lo, hi), np.maximum(lo, hi), endpoint=True)
+        
+        # Binary search with some randomness, kept within bounds
+        search_guess = (lo + hi) // 2 + rng.integers(-jitter, jitter, size=len(active), endpoint=True)
+        search_guess = np.clip(search_guess, range_mins[active], range_maxs[active])
+        
+        guess = np.where(noisy, random_guess, search_guess)
+        attempts[active, step] = guess
+        counts[active] += 1
+        
+        target = targets[active]
+        too_low = guess < target
+        too_high = guess > target
+        low[active[too_low]] = guess[too_low] + 1
+        high[active[too_high]] = guess[too_high] - 1
+        active = active[guess != target]
+    
+    return attempts, counts
+
+def generate_synthetic_games(n_games, seed=None, persona="default", chunk_size=1_000_000,
+                             range_start=(1, 50), range_span=(20, 100), difficulty_mix=None):
+    """Generate synthetic human games in chunks, with the same distributions as
+    simulate_games (random difficulty, range and target).
+
+    difficulty_mix weights the difficulties like the difficulty_mix option
+    (default: uniform).
+
+    Chunk i is generated from make_np_rng(seed, "synthetic", i), so the output only
+    depends on the seed and chunk_size.
+
+    Yields:
+        dict: Arrays for one chunk - difficulty, range_min, range_max, number_to_guess,
+              attempts (padded), attempts_count and won
+    """
+    params = PERSONAS[persona]
+    difficulties = np.array(list(LEVELS.keys()))
+    level_attempts = np.array(list(LEVELS.values()), dtype=np.int64)
+    if difficulty_mix:
+        weights = np.array([difficulty_mix.get(level, 0) for level in LEVELS], dtype=float)
+        weights /= weights.sum()
+    else:
+        weights = None
+    
+    for chunk_index, start in enumerate(range(0, n_games, chunk_size)):
+        size = min(chunk_size, n_games - start)
+        rng = make_np_rng(seed, "synthetic", chunk_index)
+        
+        if weights is None:
+            level = rng.integers(0, len(LEVELS), size=size)
+        else:
+            level = rng.choice(len(LEVELS), size=size, p=weights)
+        range_min = rng.integers(range_start[0], range_start[1], size=size, endpoint=True)
+        range_max = range_min + rng.integers(range_span[0], range_span[1], size=size, endpoint=True)
+        target = rng.integers(range_min, range_max, endpoint=True)
+        
+        attempts, counts = generate_realistic_attempts_batch(
+            target, range_min, range_max, level_attempts[level], rng,
+            noise_rate=params["noise_rate"], jitter=params["jitter"]
+        )
+        last_guess = attempts[np.arange(size), counts - 1]
+        
+        yield {
+            "difficulty": difficulties[level],
+            "range_min": range_min,
+            "range_max": range_max,
+            "number_to_guess": target,
+            "attempts": attempts,
+            "attempts_count": counts,
+            "won": last_guess == target,
+        }
+
 def simulate_ai_game(model, target, range_min, range_max, player_attempts):
     """Simulate AI guesses for the same game"""
     ai_attempts = []
     last_guess = (range_max + range_min) // 2  # Start with middle
     ai_attempts.append(last_guess)
+    bounds = GuessBounds(range_min, range_max)
     
     for attempt_count in range(1, len(player_attempts)):
         if last_guess == target:
@@ -47,6 +211,7 @@ def simulate_ai_game(model, target, range_min, range_max, player_attempts):
             feedback = 1
         else:
             feedback = 0
+        bounds.update(last_guess, feedback)
             
         # Get AI's next guess
         next_guess = predict_next_guess(
@@ -55,7 +220,8 @@ def simulate_ai_game(model, target, range_min, range_max, player_attempts):
             range_max,
             last_guess,
             attempt_count,
-            feedback
+            feedback,
+            bounds
         )
         
         ai_attempts.append(next_guess)
@@ -66,136 +232,415 @@ def simulate_ai_game(model, target, range_min, range_max, player_attempts):
             
     return ai_attempts
 
-def simulate_games():
-    # Initialize the AI model
+# Model shared with pool workers (set by _init_worker)
+_worker_model = None
+
+# Default simulation parameters (the historical hard-coded values)
+DEFAULT_OPTIONS = {
+    "games": (5, 10),          # Games per player (min, max)
+    "range_start": (1, 50),    # Bounds for range_min
+    "range_span": (20, 100),   # Bounds for range_max - range_min
+    "days": 30,                # Width of the timestamp window
+    "difficulty_mix": None,    # Weight per difficulty, None for uniform
+    "persona": "default",      # Guessing behaviour of the players, see PERSONAS
+}
+
+# Column order of the rows produced by iter_game_rows
+OUTPUT_COLUMNS = ["email", "timestamp", "difficulty", "attempts_array", "attempts_count",
+                  "won", "number_to_guess", "range_min", "range_max", "match_id"]
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+def player_email(player_index):
+    return f"player{player_index + 1}@test.com"
+
+def generate_player_games(task):
+    """Generate all game rows for a single player.
+
+    Every random draw comes from an RNG derived from (seed, player_index), so the
+    rows for a player are the same whichever worker generates them.
+
+    Args:
+        task (tuple): (player_index, seed, base_time, options)
+
+    Returns:
+        list: (timestamp, difficulty, attempts, won, ai_attempts, ai_won,
+               number_to_guess, range_min, range_max, match_id) tuples
+    """
+    player_index, seed, base_time, options = task
+    rng = make_rng(seed, player_index)
+    model = _worker_model
+    difficulties = list(LEVELS.keys())
+    mix = options["difficulty_mix"]
+    weights = [mix.get(level, 0) for level in difficulties] if mix else None
+    games = []
+
+    # Random number of games for this player
+    num_games = rng.randint(*options["games"])
+
+    for game_num in range(num_games):
+        # Random difficulty
+        if weights:
+            difficulty = rng.choices(difficulties, weights)[0]
+        else:
+            difficulty = rng.choice(difficulties)
+        max_attempts = LEVELS[difficulty]
+
+        # Random range (keeping it reasonable)
+        range_min = rng.randint(*options["range_start"])
+        range_max = range_min + rng.randint(*options["range_span"])
+
+        # Generate target number
+        number_to_guess = rng.randint(range_min, range_max)
+
+        # Generate realistic attempts
+        attempts = generate_realistic_attempts(
+            number_to_guess, range_min, range_max, max_attempts, rng, **PERSONAS[options["persona"]]
+        )
+
+        # Generate AI attempts for the same game only if model is available
+        if model:
+            ai_attempts = simulate_ai_game(
+                model, number_to_guess, range_min, range_max, attempts
+            )
+            ai_won = ai_attempts[-1] == number_to_guess
+        else:
+            ai_attempts = []
+            ai_won = False
+
+        # Determine if game was won
+        won = attempts[-1] == number_to_guess
+
+        # Calculate timestamp for this game
+        game_time = base_time + timedelta(
+            days=rng.randint(0, options["days"]),
+            hours=rng.randint(0, 23),
+            minutes=rng.randint(0, 59)
+        )
+
+        # Match id linking the human and AI rows, reproducible in seeded runs
+        if seed is not None:
+            match_id = derive_seed(seed, player_index, game_num, "match") >> 1
+        else:
+            match_id = new_match_id()
+
+        games.append((game_time.strftime('%Y-%m-%d %H:%M:%S'), difficulty,
+                      attempts, won, ai_attempts, ai_won,
+                      number_to_guess, range_min, range_max, match_id))
+    return games
+
+def player_rows(player_index, games, with_ai=True):
+    """Rows in OUTPUT_COLUMNS order for the games of generate_player_games"""
+    email = player_email(player_index)
+    rows = []
+    for (timestamp, difficulty, attempts, won, ai_attempts, ai_won,
+         number_to_guess, range_min, range_max, match_id) in games:
+        rows.append((email, timestamp, difficulty, attempts, len(attempts),
+                     won, number_to_guess, range_min, range_max, match_id))
+        if with_ai:
+            rows.append((AI_EMAIL, timestamp, difficulty, ai_attempts, len(ai_attempts),
+                         ai_won, number_to_guess, range_min, range_max, match_id))
+    return rows
+
+def iter_game_rows(player_count, model=None, seed=None, workers=1, base_time=None, options=None):
+    """Stream simulated game rows, one list of rows per player, in player order.
+
+    Players are generated lazily and results are consumed as they arrive, so
+    memory does not grow with player_count.
+
+    Yields:
+        list: Rows in OUTPUT_COLUMNS order (human game, then AI game if a model is given),
+              with attempts_array as a list of guesses (each sink encodes it)
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if base_time is None:
+        base_time = datetime.now() - timedelta(days=options["days"])  # Start of the window
+    tasks = ((index, seed, base_time, options) for index in range(player_count))
+
+    if workers > 1:
+        pool = Pool(workers, initializer=_init_worker, initargs=(model,))
+        results = pool.imap(generate_player_games, tasks, chunksize=16)
+    else:
+        pool = None
+        _init_worker(model)
+        results = map(generate_player_games, tasks)
+
+    try:
+        for player_index, games in enumerate(results):
+            yield player_rows(player_index, games, with_ai=bool(model))
+    finally:
+        if pool:
+            pool.terminate()
+
+def iter_synthetic_rows(player_count, seed=None, base_time=None, options=None, chunk_size=100_000):
+    """Stream human-only game rows from the vectorized generate_synthetic_games.
+
+    Much faster than iter_game_rows for large runs, but without AI games. The
+    number of games of each player and the timestamps follow the same options.
+
+    Yields:
+        list: Rows in OUTPUT_COLUMNS order, one list per chunk of games
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if base_time is None:
+        base_time = datetime.now() - timedelta(days=options["days"])
+    rng = make_np_rng(seed, "synthetic-players")
+    games_per_player = rng.integers(*options["games"], size=player_count, endpoint=True)
+    players = np.repeat(np.arange(player_count), games_per_player)
+    rng.shuffle(players)  # Interleave the players' games, as in a live history
+    emails = [player_email(index) for index in range(player_count)]
+    start = np.datetime64(base_time.replace(microsecond=0), "s")
+    seconds = options["days"] * 86400 + 86399  # Up to the end of the last day, like generate_player_games
+
+    games = generate_synthetic_games(len(players), seed, options["persona"], chunk_size,
+                                     options["range_start"], options["range_span"], options["difficulty_mix"])
+    for chunk_index, chunk in enumerate(games):
+        chunk_players = players[chunk_index * chunk_size:][:len(chunk["won"])]
+        chunk_rng = make_np_rng(seed, "synthetic-rows", chunk_index)
+        times = start + chunk_rng.integers(0, seconds, size=len(chunk_players), endpoint=True)
+        timestamps = np.char.replace(np.datetime_as_string(times, unit="s"), "T", " ")
+        match_ids = chunk_rng.integers(0, 2 ** 63, size=len(chunk_players), dtype=np.int64)
+        yield [(emails[player], str(timestamp), str(difficulty), attempts[:count].tolist(), int(count),
+                bool(won), int(target), int(range_min), int(range_max), int(match_id))
+               for player, timestamp, difficulty, attempts, count, won, target, range_min, range_max, match_id
+               in zip(chunk_players, timestamps, chunk["difficulty"], chunk["attempts"], chunk["attempts_count"],
+                      chunk["won"], chunk["number_to_guess"], chunk["range_min"], chunk["range_max"], match_ids)]
+
+class SQLiteSink:
+    """Write rows into the game_stats table of a SQLite database, committing every batch_size rows"""
+
+    def __init__(self, path=None, batch_size=10_000):
+        self.conn = database.connect(path)
+        self.cursor = self.conn.cursor()
+        database.initialize_db(self.conn)
+        self.batch_size = batch_size
+        self.pending = 0
+        self.users = get_user_cache(path)
+        self.sketches = sketch_writer_from_env(path)  # Approximate analytics, if enabled
+
+    def _user_id(self, email):
+        # Simulated users (and the AI) are created on first use, inside the current batch
+        user_id = self.users.get_id(email, self.conn)
+        if user_id is None:
+            user_id = self.users.get_or_create(email, stored_password(email), self.conn, commit=False)
+        return user_id
+
+    def write(self, rows):
+        game_rows = [(self._user_id(row[0]), row[1], row[2], encode_attempts(row[3])) + tuple(row[4:])
+                     for row in rows]
+        self.cursor.executemany('''
+            INSERT INTO game_stats
+            (user_id, timestamp, difficulty, attempts_array, attempts_count,
+             won, number_to_guess, range_min, range_max, match_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', game_rows)
+        if self.sketches:
+            self.sketches.update(game_rows, self.users.ai_user_id(self.conn, readonly=True))
+        self.pending += len(rows)
+        if self.pending >= self.batch_size:
+            self.conn.commit()
+            self.pending = 0
+            if self.sketches:
+                self.sketches.flush()  # Only rows already committed reach a segment
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        if self.sketches:
+            self.sketches.flush(force=True)
+
+class CSVSink:
+    """Write rows as CSV to a file path or an open text stream"""
+
+    def __init__(self, target):
+        self.owns_file = isinstance(target, str)
+        self.file = open(target, 'w', newline='') if self.owns_file else target
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(row[:3] + (json.dumps(row[3]),) + row[4:] for row in rows)
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+class ParquetSink:
+    """Write rows to a Parquet file, one row group per batch_size rows (requires pyarrow)"""
+
+    def __init__(self, path, batch_size=100_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("email", pa.string()), ("timestamp", pa.string()), ("difficulty", pa.string()),
+            ("attempts_array", pa.list_(pa.int64())), ("attempts_count", pa.int64()), ("won", pa.bool_()),
+            ("number_to_guess", pa.int64()), ("range_min", pa.int64()), ("range_max", pa.int64()),
+            ("match_id", pa.int64()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def _flush(self):
+        if self.buffer:
+            columns = zip(*self.buffer)
+            self.writer.write_table(self.pa.Table.from_arrays(
+                [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema))
+            self.buffer = []
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+def open_sink(output_format, output=None):
+    """Create the sink for an output format: sqlite, csv, parquet or stdout"""
+    if output_format == "sqlite":
+        return SQLiteSink(output)
+    if output_format == "csv":
+        return CSVSink(output or 'simulation.csv')
+    if output_format == "parquet":
+        return ParquetSink(output or 'simulation.parquet')
+    if output_format == "stdout":
+        return CSVSink(sys.stdout)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+def load_model():
+    """Train the AI model, or return None if it cannot be initialized"""
     print("Initializing AI model...")
     try:
-        model = initialize_model()
+        return initialize_model()
     except Exception as e:
         print(f"Failed to initialize AI model: {e}")
-        model = None  # Set model to None if initialization fails
-    
-    # Connect to database
-    conn = sqlite3.connect('guessNumber.db')
-    cursor = conn.cursor()
-    
-    # Add AI player if not exists
-    cursor.execute('INSERT OR IGNORE INTO users (email, password) VALUES (?, ?)', 
-                  ('ai.player@game.com', 'test'))
-    cursor.execute('SELECT id FROM users WHERE email = ?', ('ai.player@game.com',))
-    ai_user_id = cursor.fetchone()[0]
-    
-    # Difficulty levels configuration
-    levels = {"easy": 10, "medium": 7, "hard": 5}
-    
-    # Generate 5 players
-    players = [
-        ("player1@test.com", "test"),
-        ("player2@test.com", "test"),
-        ("player3@test.com", "test"),
-        ("player4@test.com", "test"),
-        ("player5@test.com", "test"),
-        ("player6@test.com", "test"),
-        ("player7@test.com", "test"),
-        ("player8@test.com", "test"),
-        ("player9@test.com", "test"),
-        ("player10@test.com", "test")
-    ]
-    
-    # Register players
-    for email, password in players:
-        cursor.execute('INSERT OR IGNORE INTO users (email, password) VALUES (?, ?)', 
-                      (email, password))
-    conn.commit()
-    
-    # Simulate games for each player
-    base_time = datetime.now() - timedelta(days=30)  # Start from 30 days ago
-    
-    for email, _ in players:
-        # Get user_id
-        cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-        user_id = cursor.fetchone()[0]
-        
-        # Random number of games (5-10) for this player
-        num_games = random.randint(5, 10)
-        
-        for game_num in range(num_games):
-            # Random difficulty
-            difficulty = random.choice(list(levels.keys()))
-            max_attempts = levels[difficulty]
-            
-            # Random range (keeping it reasonable)
-            range_min = random.randint(1, 50)
-            range_max = range_min + random.randint(20, 100)
-            
-            # Generate target number
-            number_to_guess = random.randint(range_min, range_max)
-            
-            # Generate realistic attempts
-            attempts = generate_realistic_attempts(
-                number_to_guess, range_min, range_max, max_attempts
-            )
-            
-            # Generate AI attempts for the same game only if model is available
-            if model:
-                ai_attempts = simulate_ai_game(
-                    model, number_to_guess, range_min, range_max, attempts
-                )
-                ai_won = ai_attempts[-1] == number_to_guess
-            else:
-                ai_attempts = []
-                ai_won = False
-            
-            # Determine if game was won
-            won = attempts[-1] == number_to_guess
-            
-            # Calculate timestamp for this game
-            game_time = base_time + timedelta(
-                days=random.randint(0, 30),
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            )
-            
-            # Insert game data
-            cursor.execute(''' 
-                INSERT INTO game_stats 
-                (user_id, timestamp, difficulty, attempts_array, attempts_count, 
-                 won, number_to_guess, range_min, range_max)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_id,
-                game_time.strftime('%Y-%m-%d %H:%M:%S'),
-                difficulty,
-                json.dumps(attempts),
-                len(attempts),
-                won,
-                number_to_guess,
-                range_min,
-                range_max
-            ))
-            
-            # Insert AI game data only if AI model was available
-            if model:
-                cursor.execute(''' 
-                    INSERT INTO game_stats 
-                    (user_id, timestamp, difficulty, attempts_array, attempts_count, 
-                     won, number_to_guess, range_min, range_max)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    ai_user_id,
-                    game_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    difficulty,
-                    json.dumps(ai_attempts),
-                    len(ai_attempts),
-                    ai_won,
-                    number_to_guess,
-                    range_min,
-                    range_max
-                ))
-            
-    conn.commit()
-    conn.close()
+        return None  # Set model to None if initialization fails
+
+def run_simulation(sink, player_count=len(PLAYERS), model=None, seed=None, workers=1,
+                   base_time=None, options=None, synthetic=False):
+    """Stream a simulation into a sink and close it. Returns the number of rows written.
+
+    With synthetic, the human games come from iter_synthetic_rows (no AI games;
+    model and workers are not used).
+    """
+    if synthetic:
+        batches = iter_synthetic_rows(player_count, seed, base_time, options)
+    else:
+        batches = iter_game_rows(player_count, model, seed, workers, base_time, options)
+    written = 0
+    try:
+        for rows in batches:
+            sink.write(rows)
+            written += len(rows)
+    finally:
+        sink.close()
+    return written
+
+def simulate_games(seed=None, workers=1, base_time=None):
+    """Simulate games for the test players and store them in the database.
+
+    Args:
+        seed (int): Master seed. With a seed and a fixed base_time the generated
+            rows are identical for any number of workers.
+        workers (int): Number of processes used to generate player games
+        base_time (datetime): Start of the 30-day window (default: 30 days ago)
+    """
+    model = load_model()
+    run_simulation(SQLiteSink(), len(PLAYERS), model, seed, workers, base_time)
+
+def parse_pair(value):
+    """Parse 'MIN-MAX' into a tuple of ints"""
+    try:
+        low, high = (int(part) for part in value.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected MIN-MAX, got: {value}")
+    if low > high:
+        raise argparse.ArgumentTypeError(f"MIN must not exceed MAX: {value}")
+    return low, high
+
+def parse_mix(value):
+    """Parse 'easy=1,medium=2,hard=1' into a weight dict"""
+    mix = {}
+    for item in value.split(","):
+        level, _, weight = item.partition("=")
+        if level not in LEVELS:
+            raise argparse.ArgumentTypeError(f"Unknown difficulty: {level}")
+        mix[level] = float(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Guess the Number games")
+    parser.add_argument("--players", type=int, default=len(PLAYERS), help="Number of simulated players")
+    parser.add_argument("--games", type=parse_pair, default=DEFAULT_OPTIONS["games"],
+                        help="Games per player as MIN-MAX (default: 5-10)")
+    parser.add_argument("--range-start", type=parse_pair, default=DEFAULT_OPTIONS["range_start"],
+                        help="Bounds for the range minimum as MIN-MAX (default: 1-50)")
+    parser.add_argument("--range-span", type=parse_pair, default=DEFAULT_OPTIONS["range_span"],
+                        help="Bounds for the range width as MIN-MAX (default: 20-100)")
+    parser.add_argument("--days", type=int, default=DEFAULT_OPTIONS["days"],
+                        help="Width of the timestamp window in days (default: 30)")
+    parser.add_argument("--difficulty-mix", type=parse_mix, default=None,
+                        help="Difficulty weights, e.g. easy=1,medium=2,hard=1 (default: uniform)")
+    parser.add_argument("--format", choices=["sqlite", "csv", "parquet", "stdout", "shard"], default="sqlite",
+                        help="Output target (default: sqlite); shard writes shard databases for shards.py merge")
+    parser.add_argument("--output", default=None,
+                        help="Output path (default: the game database, simulation.csv, simulation.parquet "
+                             "or the shards directory)")
+    parser.add_argument("--sharded", action="store_true",
+                        help="With sqlite: workers write shards, merged into the database at the end")
+    parser.add_argument("--persona", choices=sorted(PERSONAS), default=DEFAULT_OPTIONS["persona"],
+                        help="Guessing behaviour of the simulated players (default: default)")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Generate human games only, with the vectorized generator (much faster, no AI games)")
+    parser.add_argument("--no-ai", action="store_true", help="Do not simulate AI games")
+    parser.add_argument("--seed", type=int, default=None, help="Master seed for reproducible runs")
+    parser.add_argument("--workers", type=int, default=1, help="Number of generator processes")
+    parser.add_argument("--base-time", default=None,
+                        help="Start of the timestamp window, 'YYYY-MM-DD HH:MM:SS' (default: DAYS ago)")
+    args = parser.parse_args()
+
+    base_time = datetime.strptime(args.base_time, '%Y-%m-%d %H:%M:%S') if args.base_time else None
+    options = {
+        "games": args.games,
+        "range_start": args.range_start,
+        "range_span": args.range_span,
+        "days": args.days,
+        "difficulty_mix": args.difficulty_mix,
+        "persona": args.persona,
+    }
+    if args.synthetic and (args.sharded or args.format == "shard"):
+        parser.error("--synthetic cannot be combined with --sharded or --format shard")
+
+    # Keep stdout clean for the data when streaming to it
+    with contextlib.redirect_stdout(sys.stderr):
+        model = None if args.no_ai or args.synthetic else load_model()
+    if args.format == "shard" or (args.sharded and args.format == "sqlite"):
+        from shards import write_shards, merge_shards
+        if args.format == "shard":
+            directory = args.output or "shards"
+        else:
+            directory = (args.output or database.DB_PATH) + ".shards"
+        written = write_shards(directory, args.players, model, args.seed, args.workers, base_time, options)
+        if args.format == "sqlite":
+            merge_shards(directory, args.output)
+            with contextlib.suppress(OSError):
+                os.rmdir(directory)  # Left in place if it holds other shards
+    else:
+        sink = open_sink(args.format, args.output)
+        written = run_simulation(sink, args.players, model, args.seed, args.workers, base_time, options,
+                                 synthetic=args.synthetic)
+    print(f"Simulation completed successfully! {written} rows written.", file=sys.stderr)
 
 if __name__ == "__main__":
-    simulate_games()
-    print("Simulation completed successfully!")
+    main()
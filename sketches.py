@@ -0,0 +1,534 @@
+"""Streaming sketches of the game history for approximate analytics.
+
+With GUESSNUMBER_SKETCHES=<directory> set, every game appended through
+open_store() (and every row of the simulator's SQLite sink) also updates a
+fixed-size summary of the history, so the dashboard's approximate mode never
+scans game_stats:
+
+    number frequency          count-min sketch (+ the most frequent numbers)
+    win rate by range size    count-min sketches of games and wins
+    win rate by player        count-min sketches of games and wins
+    attempts of won games     t-digest per difficulty
+    scatter plots and streaks uniform reservoir sample of human games
+
+Each writer process accumulates a delta and writes it to the directory as an
+immutable sketch-*.pkl segment (every flush_rows rows, and for the rest on
+close or at exit); readers merge the segments, since all three sketch types are
+mergeable. Run `python sketches.py rebuild` once to cover the games stored
+before sketches were enabled.
+
+Error bounds (defaults), N being the number of games counted:
+    count-min (width 2048, depth 5): estimates never undercount, and overcount
+        by at most e/2048 * N (0.13% of N) with probability 1 - e^-5 (99.3%)
+        per query (conservative updates make the typical overcount much
+        smaller). Win rates divide two estimates, so they are accurate for keys
+        holding well over 0.13% of the games; rarer keys (e.g. one player among
+        thousands) are typically within a few points.
+    reservoir (10,000 games): a uniform sample; a proportion p estimated from
+        it has a standard error of sqrt(p(1-p)/10,000), at most 0.5 points.
+    t-digest (compression 100): at most ~100 centroids; quantile error is
+        typically below 1% of rank in the middle and much lower at the tails
+        (the guarantee is empirical, not worst-case).
+Every query costs the same whatever the size of the history.
+
+Usage:
+    python sketches.py rebuild     # Summarize every stored game (replaces the segments)
+    python sketches.py compact     # Merge the segments into one
+    python sketches.py stats
+"""
+import os
+import glob
+import math
+import time
+import pickle
+import random
+import atexit
+import hashlib
+import argparse
+import threading
+from collections import Counter
+
+import numpy as np
+
+from storage import GameStore
+from users import get_user_cache
+from instrumentation import increment, timer
+
+SKETCH_DIR = os.environ.get("GUESSNUMBER_SKETCHES")  # Unset: sketches are not maintained
+COMPACT_SEGMENTS = 16  # load_sketches() merges the segments into one past this many
+
+
+class CountMinSketch:
+    """Approximate counts per key, plus the top_k keys with the largest counts"""
+
+    def __init__(self, width=2048, depth=5, top_k=1000):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.top = {}  # key -> estimate when last counted
+        self._threshold = 0  # Smallest estimate in top once it is full
+
+    def _columns(self, key):
+        # Double hashing over one stable digest (Python's str hash changes per process)
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        # Conservative update: raise each counter only up to the new estimate,
+        # which keeps the guarantees and overcounts far less on skewed streams
+        rows = np.arange(self.depth)
+        columns = self._columns(key)
+        estimate = int(self.table[rows, columns].min()) + count
+        self.table[rows, columns] = np.maximum(self.table[rows, columns], estimate)
+        self.total += count
+        if not self.top_k:
+            return
+        if key in self.top or len(self.top) < self.top_k:
+            self.top[key] = estimate
+        elif estimate > self._threshold:  # Lower bound of the smallest tracked count: a cheap pre-check
+            smallest = min(self.top, key=self.top.get)
+            if estimate > self.top[smallest]:
+                del self.top[smallest]
+                self.top[key] = estimate
+            self._threshold = min(self.top.values())
+
+    def add_counts(self, counts):
+        """add() every key of a {key: count} mapping, e.g. the Counter of a batch"""
+        for key, count in counts.items():
+            self.add(key, count)
+
+    def estimate(self, key):
+        """Count of key: never below the true count"""
+        return int(min(row[column] for row, column in zip(self.table, self._columns(key))))
+
+    def items(self):
+        """(key, estimate) for the tracked most frequent keys"""
+        return [(key, self.estimate(key)) for key in self.top]
+
+    def __getstate__(self):
+        # Pickle only the nonzero counters, in the smallest dtypes that hold them:
+        # the delta of a few games is then a few hundred bytes rather than the whole table
+        state = self.__dict__.copy()
+        flat = self.table.ravel()
+        cells = np.flatnonzero(flat)
+        values = flat[cells]
+        state["table"] = (cells.astype(np.min_scalar_type(flat.size - 1)),
+                          values.astype(np.min_scalar_type(int(values.max()) if values.size else 0)))
+        return state
+
+    def __setstate__(self, state):
+        cells, values = state.pop("table")
+        self.__dict__.update(state)
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.table.ravel()[cells] = values
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        keys = set(self.top) | set(other.top)
+        ranked = sorted(((self.estimate(key), repr(key), key) for key in keys), reverse=True)[:self.top_k]
+        self.top = {key: estimate for estimate, _, key in ranked}
+        self._threshold = min(self.top.values()) if self.top_k and len(self.top) >= self.top_k else 0
+
+
+class ReservoirSample:
+    """Uniform random sample of at most size items of a stream (algorithm R)"""
+
+    def __init__(self, size=10_000, seed=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self.rng = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            slot = self.rng.randrange(self.seen)
+            if slot < self.size:
+                self.items[slot] = item
+
+    def merge(self, other):
+        # Fill each slot from either sample in proportion to the stream it represents
+        mine, theirs = self.items[:], other.items[:]
+        self.rng.shuffle(mine)
+        self.rng.shuffle(theirs)
+        share = self.seen / (self.seen + other.seen) if self.seen + other.seen else 0
+        merged = []
+        while len(merged) < self.size and (mine or theirs):
+            source = mine if mine and (not theirs or self.rng.random() < share) else theirs
+            merged.append(source.pop())
+        self.items = merged
+        self.seen += other.seen
+
+
+class TDigest:
+    """Merging t-digest: approximate quantiles and CDF in at most ~compression centroids"""
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []  # Sorted (mean, weight)
+        self.buffer = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        self.buffer.append((float(value), weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.buffer) >= 5 * self.compression:
+            self._compress()
+
+    def _scale(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _scale_inverse(self, k):
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        total = sum(weight for _, weight in points)
+        merged = []
+        mean, weight = points[0]
+        done = 0
+        limit = total * self._scale_inverse(self._scale(0) + 1)
+        for point_mean, point_weight in points[1:]:
+            if done + weight + point_weight <= limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                done += weight
+                limit = total * self._scale_inverse(self._scale(done / total) + 1)
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+
+    def cdf(self, value):
+        """Approximate share of the values <= value"""
+        self._compress()
+        if not self.count or value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        # Interpolate the cumulative weight between centroid centres (and min/max at the ends)
+        previous_x, previous_y = self.min, 0.0
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            centre = cumulative + weight / 2
+            if value < mean:
+                span = mean - previous_x
+                fraction = (value - previous_x) / span if span > 0 else 1.0
+                return (previous_y + fraction * (centre - previous_y)) / self.count
+            previous_x, previous_y = mean, centre
+            cumulative += weight
+        span = self.max - previous_x
+        fraction = (value - previous_x) / span if span > 0 else 1.0
+        return (previous_y + fraction * (self.count - previous_y)) / self.count
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1)"""
+        self._compress()
+        if not self.count:
+            return math.nan
+        target = q * self.count
+        previous_x, previous_y = self.min, 0.0
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            centre = cumulative + weight / 2
+            if target < centre:
+                span = centre - previous_y
+                return previous_x + (mean - previous_x) * ((target - previous_y) / span if span > 0 else 1.0)
+            previous_x, previous_y = mean, centre
+            cumulative += weight
+        span = self.count - previous_y
+        return previous_x + (self.max - previous_x) * ((target - previous_y) / span if span > 0 else 1.0)
+
+    def merge(self, other):
+        other._compress()
+        self.buffer.extend(other.centroids)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+
+class GameSketches:
+    """The sketches behind the approximate dashboard"""
+
+    def __init__(self):
+        self.games = 0  # Human games counted
+        self.numbers = CountMinSketch()                  # number_to_guess of human games
+        self.range_games = CountMinSketch()              # range size -> human games
+        self.range_wins = CountMinSketch(top_k=0)        # range size -> human wins
+        self.player_games = CountMinSketch()             # user_id -> games (AI included)
+        self.player_wins = CountMinSketch(top_k=0)       # user_id -> wins
+        self.attempts = {}                               # difficulty -> TDigest of won human games
+        self.sample = ReservoirSample()                  # Human game rows, see SAMPLE_COLUMNS
+
+    # Fields of the sampled rows
+    SAMPLE_COLUMNS = ["user_id", "timestamp", "number_to_guess", "attempts_array",
+                      "range_min", "range_max", "won"]
+
+    def update(self, rows, ai_user_id=None):
+        """Count rows given in GAME_COLUMNS order"""
+        # Count the batch first: the count-min sketches then hash each distinct key once
+        counts = {name: Counter() for name in ("numbers", "range_games", "range_wins", "player_games", "player_wins")}
+        for (user_id, timestamp, difficulty, attempts_array, attempts_count, won,
+             number_to_guess, range_min, range_max, _) in rows:
+            won = bool(won)
+            counts["player_games"][user_id] += 1
+            if won:
+                counts["player_wins"][user_id] += 1
+            if user_id == ai_user_id:
+                continue
+            self.games += 1
+            counts["numbers"][int(number_to_guess)] += 1
+            range_size = int(range_max) - int(range_min)
+            counts["range_games"][range_size] += 1
+            if won:
+                counts["range_wins"][range_size] += 1
+                if difficulty not in self.attempts:
+                    self.attempts[difficulty] = TDigest()
+                self.attempts[difficulty].add(attempts_count)
+            self.sample.add((user_id, timestamp, int(number_to_guess), attempts_array,
+                             int(range_min), int(range_max), won))
+        for name, counter in counts.items():
+            getattr(self, name).add_counts(counter)
+
+    def merge(self, other):
+        self.games += other.games
+        for name in ("numbers", "range_games", "range_wins", "player_games", "player_wins", "sample"):
+            getattr(self, name).merge(getattr(other, name))
+        for difficulty, digest in other.attempts.items():
+            if difficulty in self.attempts:
+                self.attempts[difficulty].merge(digest)
+            else:
+                self.attempts[difficulty] = digest
+
+
+def _segments(directory):
+    return sorted(glob.glob(os.path.join(directory, "sketch-*.pkl")))
+
+
+def segment_names(directory=None):
+    """Names of the segments of a sketch directory; they change whenever sketches are written"""
+    directory = directory or SKETCH_DIR
+    return [os.path.basename(path) for path in _segments(directory)] if directory else []
+
+
+def _write_segment(directory, sketches):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"sketch-{time.time_ns():020d}-{os.getpid()}.pkl")
+    # Hidden temporary name and rename, so readers never see a partial segment
+    temp_path = os.path.join(directory, "." + os.path.basename(path) + ".tmp")
+    with open(temp_path, "wb") as f:
+        pickle.dump(sketches, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    return path
+
+
+class _DirectoryLock:
+    """Exclusive lock file, so only one process replaces segments at a time"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ".lock")
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL))
+                return self
+            except FileExistsError:
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        os.remove(self.path)
+
+
+def _replace_segments(directory, sketches, old_segments):
+    """Write sketches as one segment and remove the segments it covers"""
+    path = _write_segment(directory, sketches)
+    for segment in old_segments:
+        os.remove(segment)
+    return path
+
+
+def load_sketches(directory=None):
+    """Merge every segment of a directory into one GameSketches (compacting past COMPACT_SEGMENTS)"""
+    directory = directory or SKETCH_DIR
+    with timer("sketches.load"):
+        segments = _segments(directory) if directory and os.path.isdir(directory) else []
+        merged = GameSketches()
+        for segment in segments:
+            with open(segment, "rb") as f:
+                merged.merge(pickle.load(f))
+        if len(segments) > COMPACT_SEGMENTS:
+            with _DirectoryLock(directory):
+                # Another process may have compacted meanwhile: only replace what is still there
+                if all(os.path.exists(segment) for segment in segments):
+                    _replace_segments(directory, merged, segments)
+        return merged
+
+
+def compact_sketches(directory=None):
+    """Merge all segments into one. Returns the number of segments merged"""
+    directory = directory or SKETCH_DIR
+    with _DirectoryLock(directory):
+        segments = _segments(directory)
+        merged = GameSketches()
+        for segment in segments:
+            with open(segment, "rb") as f:
+                merged.merge(pickle.load(f))
+        if len(segments) > 1:
+            _replace_segments(directory, merged, segments)
+    return len(segments)
+
+
+def rebuild_sketches(store, directory=None):
+    """Summarize every stored game (archive included), replacing the existing segments.
+
+    Run it while no writer is running: games a writer has stored but not yet
+    written to a segment would be counted twice.
+    """
+    from storage import GAME_COLUMNS
+    directory = directory or SKETCH_DIR
+    os.makedirs(directory, exist_ok=True)
+    sketches = GameSketches()
+    with timer("sketches.rebuild"):
+        df = store.scan(include_archive=True)
+        rows = df[GAME_COLUMNS].itertuples(index=False, name=None)
+        sketches.update(rows, get_user_cache(getattr(store, "path", None)).ai_user_id(readonly=True))
+    with _DirectoryLock(directory):
+        _replace_segments(directory, sketches, _segments(directory))
+    return sketches
+
+
+class SketchWriter:
+    """Buffers appended rows in this process and writes their sketches as segments"""
+
+    def __init__(self, directory=None, flush_rows=10_000, db_path=None):
+        self.directory = directory or SKETCH_DIR
+        self.flush_rows = flush_rows
+        self.db_path = db_path  # Database holding the users of the rows (default: database.DB_PATH)
+        self.batches = []  # (ai_user_id, rows) not yet summarized
+        self.pending = 0
+        self._ai_user_id = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush, force=True)
+
+    def update(self, rows, ai_user_id=None):
+        """Count rows given in GAME_COLUMNS order (the AI user defaults to the one of db_path)"""
+        if ai_user_id is None:
+            if self._ai_user_id is None:
+                self._ai_user_id = get_user_cache(self.db_path).ai_user_id(readonly=True)
+            ai_user_id = self._ai_user_id
+        with self._lock:
+            self.batches.append((ai_user_id, list(rows)))
+            self.pending += len(self.batches[-1][1])
+
+    def flush(self, force=False):
+        """Write a segment once flush_rows rows are pending (or now if force)"""
+        with self._lock:
+            if not self.pending or (self.pending < self.flush_rows and not force):
+                return
+            batches, self.batches, self.pending = self.batches, [], 0
+        # Summarized per flush rather than per append: each distinct key is hashed once per segment
+        by_ai_user = {}
+        for ai_user_id, rows in batches:
+            by_ai_user.setdefault(ai_user_id, []).extend(rows)
+        delta = GameSketches()
+        with timer("sketches.update"):
+            for ai_user_id, rows in by_ai_user.items():
+                delta.update(rows, ai_user_id)
+        _write_segment(self.directory, delta)
+        increment("sketches.segments_written")
+
+
+def sketch_writer_from_env(db_path=None):
+    """SketchWriter for GUESSNUMBER_SKETCHES, or None when sketches are disabled"""
+    return SketchWriter(db_path=db_path) if SKETCH_DIR else None
+
+
+class SketchingStore(GameStore):
+    """Wrap a store so that appended games also update the sketches.
+
+    flush() writes a segment once flush_rows games are pending, so flushing
+    after every game does not write a segment per game; the rest is written on
+    close() or at exit.
+    """
+
+    def __init__(self, store, writer=None):
+        self.store = store
+        # Users of a SQLite store live in its own database; other stores use database.DB_PATH
+        self.path = getattr(store, "path", None)
+        self.sketches = writer or SketchWriter(db_path=self.path)
+
+    def append(self, rows):
+        rows = list(rows)
+        self.store.append(rows)
+        self.sketches.update(rows)
+
+    def flush(self):
+        self.store.flush()
+        self.sketches.flush()
+
+    def segment_names(self):
+        """Names of the sketch segments (see segment_names())"""
+        return segment_names(self.sketches.directory)
+
+    def close(self):
+        self.store.close()
+        self.sketches.flush(force=True)
+
+    def scan(self, *args, **kwargs):
+        return self.store.scan(*args, **kwargs)
+
+    def scan_after(self, checkpoint=None, columns=None):
+        return self.store.scan_after(checkpoint, columns)
+
+    def user_summary(self, user_id):
+        return self.store.user_summary(user_id)
+
+    def archive(self, before):
+        return self.store.archive(before)  # Sketches summarize archived games too
+
+    def fingerprint(self):
+        return self.store.fingerprint()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild", "compact", "stats"])
+    parser.add_argument("--dir", default=SKETCH_DIR or "game_sketches",
+                        help="Sketch directory (default: GUESSNUMBER_SKETCHES or game_sketches)")
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        from storage import open_store
+        sketches = rebuild_sketches(open_store(), args.dir)
+        print(f"Summarized {sketches.games} human games into {args.dir}")
+    elif args.command == "compact":
+        print(f"Merged {compact_sketches(args.dir)} segments in {args.dir}")
+    else:
+        sketches = load_sketches(args.dir)
+        print(f"{len(_segments(args.dir))} segments, {sketches.games} human games, "
+              f"{len(sketches.sample.items)} sampled")
+        for difficulty, digest in sorted(sketches.attempts.items()):
+            print(f"  {difficulty}: {digest.count} wins, median {digest.quantile(0.5):.1f} attempts, "
+                  f"p90 {digest.quantile(0.9):.1f} ({len(digest.centroids)} centroids)")
+
+
+if __name__ == "__main__":
+    # Run through the module, so pickled segments refer to sketches.GameSketches rather than __main__
+    import sketches
+    sketches.main()
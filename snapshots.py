@@ -0,0 +1,344 @@
+"""Analytics snapshots: the chart datasets of graph.py as compact binary files.
+
+The export stage scans the games once, computes every chart dataset and writes
+each one as a typed-array file next to a manifest:
+
+    analytics_snapshots/
+        manifest.json                          format, source fingerprint, datasets
+        number_distribution.<sha256:12>.arrow  Arrow IPC file (zstd), or .npz
+
+Data files are named after their content, so they never change once written
+and can be cached indefinitely; the manifest is the only mutable file. The
+snapshot is rebuilt only when the source fingerprint (the store's
+fingerprint() and the users table) differs from the manifest's, so an unchanged
+history costs no scan. The dashboard loads the files as binary buffers and
+hands the typed columns to Bokeh, which embeds them as binary arrays too.
+
+Usage:
+    python snapshots.py [--dir DIR] [--format arrow|npz] [--force] [--approximate]
+
+With --approximate, the datasets are estimated from the streaming sketches of
+sketches.py (GUESSNUMBER_SKETCHES) in time independent of the history size.
+"""
+import os
+import io
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import sketches
+from database import get_connection
+from storage import open_store, decode_attempts
+from instrumentation import increment, timer
+from users import AI_EMAIL
+
+SNAPSHOT_DIR = os.environ.get("GUESSNUMBER_SNAPSHOT_DIR", "analytics_snapshots")
+SNAPSHOT_FORMAT = 1  # Bump when a dataset's columns change; older manifests are rebuilt
+MANIFEST = "manifest.json"
+VS_PLAYER = "player1@test.com"  # Player of the "IA vs Player 1" chart
+VS_MATCHES = 200  # Latest matches of VS_PLAYER read in approximate mode
+
+
+def first_guess(attempts_array):
+    """First guess of a stored attempts array (None if the game has no attempts)"""
+    attempts = decode_attempts(attempts_array)
+    return attempts[0] if attempts else None
+
+
+def source_fingerprint(store, conn):
+    """Token identifying the games and users the datasets are computed from"""
+    max_user_id = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+    return f"users:{max_user_id};{store.fingerprint()}"
+
+
+def build_datasets(store, conn):
+    """Scan every game once and compute the chart datasets: {name: DataFrame}"""
+    # Scan every game once (archived months included) and attach emails
+    with timer("graph.scan"):
+        df_users = pd.read_sql_query("SELECT id AS user_id, email FROM users", conn)
+        df_all = store.scan(include_archive=True).merge(df_users, on='user_id', how='left')
+    df_all['won'] = df_all['won'].astype(bool)
+    df_human = df_all[df_all['email'] != AI_EMAIL]
+    datasets = {}
+
+    with timer("graph.number_distribution"):
+        datasets['number_distribution'] = df_human.groupby('number_to_guess').size().reset_index(name='frequency')
+
+    with timer("graph.first_guess"):
+        datasets['first_guess'] = pd.DataFrame({
+            'first_guess': df_human['attempts_array'].map(first_guess).astype(float),
+            'number_to_guess': df_human['number_to_guess']
+        })
+
+    with timer("graph.win_rate_by_range_size"):
+        datasets['win_rate_by_range_size'] = (
+            df_human.assign(range_size=df_human['range_max'] - df_human['range_min'])
+            .groupby('range_size')['won'].mean()
+            .reset_index(name='win_rate'))
+
+    # Histogram of the attempts of won games, 20 bins per difficulty
+    with timer("graph.attempts_distribution"):
+        df_dist = df_human.loc[df_human['won'], ['difficulty', 'attempts_count']]
+        histograms = []
+        for difficulty in df_dist['difficulty'].unique():
+            hist, edges = np.histogram(df_dist.loc[df_dist['difficulty'] == difficulty, 'attempts_count'], bins=20)
+            histograms.append(pd.DataFrame({'difficulty': difficulty, 'top': hist,
+                                            'left': edges[:-1], 'right': edges[1:]}))
+        datasets['attempts_distribution'] = (pd.concat(histograms, ignore_index=True) if histograms else
+                                             pd.DataFrame(columns=['difficulty', 'top', 'left', 'right']))
+
+    with timer("graph.streaks"):
+        df_streak = df_human.sort_values(['user_id', 'timestamp'], kind='stable')[['email', 'timestamp', 'won']].copy()
+        df_streak['cumulative_wins'] = df_streak.groupby('email')['won'].cumsum()
+        df_streak['timestamp'] = pd.to_datetime(df_streak['timestamp'])
+        datasets['streaks'] = df_streak[['email', 'timestamp', 'cumulative_wins']]
+
+    with timer("graph.success_by_range"):
+        datasets['success_by_range'] = (df_human.groupby(['range_min', 'range_max'])['won'].mean()
+                                        .reset_index(name='success_rate'))
+
+    with timer("graph.win_rate_comparison"):
+        datasets['win_rate_comparison'] = (
+            df_all.assign(player=df_all['email'].where(df_all['email'] != AI_EMAIL, 'AI'))
+            .groupby('player')['won'].mean()
+            .reset_index(name='win_rate'))
+
+    # Guesses of VS_PLAYER and the AI in the same matches (keyed on match_id), one row per guess
+    with timer("graph.ai_vs_player"):
+        df_player = df_all[(df_all['email'] == VS_PLAYER) & df_all['match_id'].notna()]
+        df_ai = df_all[(df_all['email'] == AI_EMAIL) & df_all['match_id'].notna()]
+        df_games = pd.concat([
+            df_player[df_player['match_id'].isin(df_ai['match_id'])],
+            df_ai[df_ai['match_id'].isin(df_player['match_id'])]
+        ]).sort_values('timestamp', kind='stable')[['number_to_guess', 'attempts_array', 'email']]
+        df_games['guess'] = df_games['attempts_array'].map(decode_attempts)
+        df_guesses = df_games.drop(columns='attempts_array').explode('guess')
+        df_guesses['guess'] = df_guesses['guess'].astype(float)  # Plotted only; float holds any guess
+        df_guesses['guess_number'] = df_guesses.groupby(['number_to_guess', 'email']).cumcount() + 1
+        datasets['ai_vs_player'] = df_guesses.reset_index(drop=True)
+
+    return {name: df.reset_index(drop=True) for name, df in datasets.items()}
+
+
+def build_approximate_datasets(summary, store, conn):
+    """The chart datasets estimated from a sketches.GameSketches summary, without scanning the games.
+
+    Frequencies, win rates and the attempts histogram come from the sketches;
+    the per-game charts are drawn from the reservoir sample (streaks are scaled
+    up to each player's estimated number of games). Only the AI vs player chart
+    reads games, those of VS_PLAYER's latest matches.
+    """
+    df_users = pd.read_sql_query("SELECT id AS user_id, email FROM users", conn)
+    emails = dict(zip(df_users['user_id'], df_users['email']))
+    sample = pd.DataFrame(summary.sample.items, columns=summary.SAMPLE_COLUMNS)
+    sample['email'] = sample['user_id'].map(emails)
+    sample['won'] = sample['won'].astype(bool)
+    datasets = {}
+
+    with timer("graph.number_distribution"):
+        datasets['number_distribution'] = pd.DataFrame(
+            sorted(summary.numbers.items()), columns=['number_to_guess', 'frequency'])
+
+    with timer("graph.first_guess"):
+        datasets['first_guess'] = pd.DataFrame({
+            'first_guess': sample['attempts_array'].map(first_guess).astype(float),
+            'number_to_guess': sample['number_to_guess']
+        })
+
+    with timer("graph.win_rate_by_range_size"):
+        datasets['win_rate_by_range_size'] = pd.DataFrame(
+            sorted((size, min(summary.range_wins.estimate(size) / games, 1.0))
+                   for size, games in summary.range_games.items()),
+            columns=['range_size', 'win_rate'])
+
+    # 20 bins per difficulty between the extremes of its digest, filled from its CDF
+    with timer("graph.attempts_distribution"):
+        histograms = []
+        for difficulty, digest in summary.attempts.items():
+            edges = np.linspace(digest.min, digest.max, 21)
+            cdf = np.array([digest.cdf(edge) for edge in edges])
+            cdf[0] = 0.0  # The first bin includes the minimum, as in np.histogram
+            histograms.append(pd.DataFrame({'difficulty': difficulty, 'top': np.diff(cdf) * digest.count,
+                                            'left': edges[:-1], 'right': edges[1:]}))
+        datasets['attempts_distribution'] = (pd.concat(histograms, ignore_index=True) if histograms else
+                                             pd.DataFrame(columns=['difficulty', 'top', 'left', 'right']))
+
+    with timer("graph.streaks"):
+        df_streak = sample.sort_values(['user_id', 'timestamp'], kind='stable')[['user_id', 'email', 'timestamp', 'won']]
+        sampled = df_streak.groupby('user_id')['won'].transform('size')
+        scale = df_streak['user_id'].map(summary.player_games.estimate) / sampled
+        df_streak = df_streak.assign(cumulative_wins=df_streak.groupby('email')['won'].cumsum() * scale,
+                                     timestamp=pd.to_datetime(df_streak['timestamp']))
+        datasets['streaks'] = df_streak[['email', 'timestamp', 'cumulative_wins']]
+
+    with timer("graph.success_by_range"):
+        datasets['success_by_range'] = (sample.groupby(['range_min', 'range_max'])['won'].mean()
+                                        .reset_index(name='success_rate'))
+
+    with timer("graph.win_rate_comparison"):
+        datasets['win_rate_comparison'] = pd.DataFrame(
+            [('AI' if emails.get(user_id) == AI_EMAIL else emails.get(user_id, str(user_id)),
+              min(summary.player_wins.estimate(user_id) / games, 1.0))
+             for user_id, games in summary.player_games.items()],
+            columns=['player', 'win_rate']).sort_values('player', kind='stable')
+
+    # Exact, but limited to the games of VS_PLAYER's latest matches and their AI rows
+    with timer("graph.ai_vs_player"):
+        player_ids = df_users.loc[df_users['email'] == VS_PLAYER, 'user_id'].tolist()
+        df_player = store.scan(["match_id", "timestamp"], user_ids=player_ids, include_archive=True)
+        match_ids = (df_player.dropna(subset=['match_id']).sort_values('timestamp', kind='stable')
+                     ['match_id'].tail(VS_MATCHES).tolist())
+        df_games = (store.scan(match_ids=match_ids, include_archive=True).merge(df_users, on='user_id', how='left')
+                    if match_ids else pd.DataFrame(columns=['user_id', 'email', 'match_id', 'timestamp']))
+        df_games = df_games[df_games['email'].isin([VS_PLAYER, AI_EMAIL])]
+        paired = df_games.groupby('match_id')['email'].transform('nunique') == 2
+        df_games = df_games[paired].sort_values('timestamp', kind='stable')[['number_to_guess', 'attempts_array', 'email']]
+        df_games['guess'] = df_games['attempts_array'].map(decode_attempts)
+        df_guesses = df_games.drop(columns='attempts_array').explode('guess')
+        df_guesses['guess'] = df_guesses['guess'].astype(float)
+        df_guesses['guess_number'] = df_guesses.groupby(['number_to_guess', 'email']).cumcount() + 1
+        datasets['ai_vs_player'] = df_guesses.reset_index(drop=True)
+
+    return {name: df.reset_index(drop=True) for name, df in datasets.items()}
+
+
+def _column_array(series):
+    # Strings as fixed-width unicode arrays, so loading an .npz never needs pickle
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        return series.to_numpy(dtype=str)
+    return series.to_numpy()
+
+
+def _encode(df, fmt):
+    """Bytes of a dataset in the snapshot format"""
+    buffer = io.BytesIO()
+    if fmt == "arrow":
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with ipc.new_file(buffer, table.schema, options=ipc.IpcWriteOptions(compression="zstd")) as writer:
+            writer.write_table(table)
+    else:
+        np.savez_compressed(buffer, **{column: _column_array(df[column]) for column in df.columns})
+    return buffer.getvalue()
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def export_snapshot(directory=SNAPSHOT_DIR, fmt=None, store=None, force=False, approximate=False):
+    """Write the chart datasets unless the snapshot in directory is up to date.
+
+    Args:
+        fmt (str): "arrow" (default when pyarrow is installed) or "npz"
+        force (bool): Rebuild even if the source fingerprint is unchanged
+        approximate (bool): Estimate the datasets from the sketches in
+            sketches.SKETCH_DIR instead of scanning every game
+
+    Returns:
+        dict: The manifest
+    """
+    if fmt is None:
+        try:
+            import pyarrow  # noqa: F401
+            fmt = "arrow"
+        except ImportError:
+            fmt = "npz"
+    store = store or open_store()
+    conn = get_connection(readonly=True)  # Never blocks live games
+    if approximate and not sketches.SKETCH_DIR:
+        raise ValueError("Approximate snapshots need GUESSNUMBER_SKETCHES (see sketches.py)")
+    source = source_fingerprint(store, conn)
+    if approximate:
+        source += ";sketches:" + ",".join(sketches.segment_names())
+    manifest = _read_manifest(directory)
+    if (not force and manifest and manifest["format"] == SNAPSHOT_FORMAT and manifest["source"] == source
+            and manifest["file_format"] == fmt and manifest.get("approximate", False) == approximate
+            and all(os.path.exists(os.path.join(directory, entry["file"]))
+                    for entry in manifest["datasets"].values())):
+        increment("snapshots.cache_hits")
+        return manifest
+    increment("snapshots.cache_misses")
+
+    os.makedirs(directory, exist_ok=True)
+    entries = {}
+    with timer("snapshots.export"):
+        datasets = (build_approximate_datasets(sketches.load_sketches(), store, conn) if approximate else
+                    build_datasets(store, conn))
+        for name, df in datasets.items():
+            data = _encode(df, fmt)
+            digest = hashlib.sha256(data).hexdigest()
+            file_name = f"{name}.{digest[:12]}.{fmt}"
+            path = os.path.join(directory, file_name)
+            if not os.path.exists(path):  # Same content, same name: nothing to write
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            entries[name] = {"file": file_name, "rows": len(df), "bytes": len(data), "sha256": digest,
+                             "columns": {column: str(dtype) for column, dtype in df.dtypes.items()}}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "file_format": fmt,
+        "approximate": approximate,
+        "source": source,
+        "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        "datasets": entries,
+    }
+    with open(os.path.join(directory, MANIFEST + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(directory, MANIFEST + ".tmp"), os.path.join(directory, MANIFEST))
+
+    # Data files no longer referenced by the manifest
+    current = {entry["file"] for entry in entries.values()} | {MANIFEST}
+    for name in os.listdir(directory):
+        if name not in current and name.endswith((".arrow", ".npz")):
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+def load_snapshot(directory=SNAPSHOT_DIR, manifest=None):
+    """Load the datasets of a snapshot as DataFrames of typed columns: {name: DataFrame}"""
+    manifest = manifest or _read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot manifest in {directory}")
+    datasets = {}
+    with timer("snapshots.load"):
+        for name, entry in manifest["datasets"].items():
+            path = os.path.join(directory, entry["file"])
+            if entry["file"].endswith(".arrow"):
+                import pyarrow as pa
+                with pa.memory_map(path) as source:
+                    datasets[name] = pa.ipc.open_file(source).read_all().to_pandas()
+            else:
+                with np.load(path) as arrays:
+                    datasets[name] = pd.DataFrame({column: arrays[column] for column in entry["columns"]})
+    return datasets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help=f"Snapshot directory (default: {SNAPSHOT_DIR})")
+    parser.add_argument("--format", choices=["arrow", "npz"], default=None,
+                        help="File format (default: arrow if pyarrow is installed, else npz)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the games did not change")
+    parser.add_argument("--approximate", action="store_true",
+                        help="Estimate the datasets from the sketches of GUESSNUMBER_SKETCHES")
+    args = parser.parse_args()
+    manifest = export_snapshot(args.dir, args.format, force=args.force, approximate=args.approximate)
+    total = sum(entry["bytes"] for entry in manifest["datasets"].values())
+    print(f"Snapshot of {len(manifest['datasets'])} datasets ({total:,} bytes) in {args.dir}, "
+          f"created {manifest['created_at']}")
+
+
+if __name__ == "__main__":
+    main()
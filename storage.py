@@ -0,0 +1,711 @@
+"""Storage backends for game_stats.
+
+Users stay in the SQLite database (see database.py); game results go through a
+GameStore so that analytics can scan them from a layout suited to the workload:
+
+    SQLiteGameStore    - the game_stats table (default)
+    ColumnarGameStore  - append-only Parquet segments in a directory
+
+The backend is chosen with the GUESSNUMBER_STORAGE environment variable:
+"sqlite" or "columnar:<directory>". With GUESSNUMBER_SKETCHES=<directory>,
+appended games also update the sketches of the approximate dashboard (see
+sketches.py).
+
+attempts_array holds the guesses packed with encode_attempts(); rows written
+before that hold JSON text, so readers go through decode_attempts().
+
+pandas and pyarrow are imported on first scan, not at import time, so the
+game can record results without loading the analytics stack.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import secrets
+import itertools
+import threading
+from datetime import datetime, timezone
+
+import database
+from instrumentation import increment, observe, set_gauge, timer
+
+# Leading byte of encoded attempt lists; JSON text (the legacy format) never starts with it
+ATTEMPTS_FORMAT = 1
+
+# Column order of the rows accepted by GameStore.append
+GAME_COLUMNS = ["user_id", "timestamp", "difficulty", "attempts_array", "attempts_count",
+                "won", "number_to_guess", "range_min", "range_max", "match_id"]
+
+
+def current_timestamp():
+    """Timestamp in the same format and timezone (UTC) as SQLite's CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def encode_attempts(attempts):
+    """Pack guesses as zigzag varints: one byte per guess up to 63, at most ten for 64-bit values"""
+    encoded = bytearray([ATTEMPTS_FORMAT])
+    for value in attempts:
+        value = int(value)
+        value = value << 1 if value >= 0 else (-value << 1) - 1
+        while value > 0x7f:
+            encoded.append(value & 0x7f | 0x80)
+            value >>= 7
+        encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_attempts(value):
+    """List of guesses from encode_attempts() bytes or legacy JSON text ([] if missing)"""
+    if value is None or isinstance(value, float):  # NULL, or NaN from pandas
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    value = bytes(value)
+    if not value or value[0] != ATTEMPTS_FORMAT:
+        return json.loads(value)  # JSON rows read back as binary (older columnar segments)
+    attempts = []
+    current = shift = 0
+    for byte in value[1:]:
+        current |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            attempts.append(current >> 1 if not current & 1 else -((current + 1) >> 1))
+            current = shift = 0
+    return attempts
+
+
+def new_match_id():
+    """Random id linking the human and AI rows of one match (unique across processes)"""
+    return secrets.randbits(63)
+
+
+def game_row(user_id, difficulty, attempts, won, number_to_guess, range_min, range_max, timestamp=None,
+             match_id=None):
+    """Build a row in GAME_COLUMNS order from the values known at the end of a game"""
+    return (user_id, timestamp or current_timestamp(), difficulty, encode_attempts(attempts),
+            len(attempts), bool(won), number_to_guess, range_min, range_max, match_id)
+
+
+class GameStore:
+    """Interface for game_stats persistence"""
+
+    def append(self, rows):
+        """Store rows given in GAME_COLUMNS order"""
+        raise NotImplementedError
+
+    def append_game(self, user_id, difficulty, attempts, won, number_to_guess, range_min, range_max,
+                    timestamp=None, match_id=None):
+        """Store a single finished game"""
+        self.append([game_row(user_id, difficulty, attempts, won, number_to_guess,
+                              range_min, range_max, timestamp, match_id)])
+
+    def scan(self, columns=None, user_ids=None, exclude_user_ids=(), since=None,
+             include_archive=False, hot=True, match_ids=None):
+        """Return the stored games as a DataFrame.
+
+        Args:
+            columns (list): Columns to read (default: all GAME_COLUMNS)
+            user_ids (iterable): Only read games of these users (default: all users)
+            exclude_user_ids (iterable): Users whose games are skipped (e.g. the AI)
+            match_ids (iterable): Only read the games of these matches (default: all games)
+            since (str): Only read games with a timestamp at or after this one
+            include_archive (bool): Also read games moved out by archive()
+            hot (bool): Read games that are not archived (False with include_archive
+                reads only the archive)
+        """
+        raise NotImplementedError
+
+    def scan_after(self, checkpoint=None, columns=None):
+        """Read the games appended since a checkpoint, archived ones included.
+
+        Args:
+            checkpoint: Value returned by a previous call (None: every game)
+            columns (list): Columns to read (default: all GAME_COLUMNS)
+
+        Returns:
+            tuple: (DataFrame of the new games in insertion order, checkpoint to pass next time)
+        """
+        raise NotImplementedError
+
+    def archive(self, before):
+        """Move games older than the `before` timestamp out of the hot store.
+
+        Returns:
+            int: Number of games archived
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support archiving")
+
+    def user_summary(self, user_id):
+        """Return the statistics shown by GuessNumberGame.show_stats.
+
+        Returns:
+            tuple: ((total_games, wins, avg_attempts),
+                    [(difficulty, games, wins, avg_attempts, best_score), ...])
+        """
+        df = self.scan(["difficulty", "attempts_count", "won"], user_ids=[user_id])
+        if df.empty:
+            return (0, None, None), []
+        df["won"] = df["won"].astype(int)
+        overall = (len(df), int(df["won"].sum()), float(df["attempts_count"].mean()))
+        grouped = df.groupby("difficulty").agg(
+            games=("won", "size"), wins=("won", "sum"),
+            avg_attempts=("attempts_count", "mean"), best_score=("attempts_count", "min"))
+        by_difficulty = [(difficulty, int(row.games), int(row.wins), float(row.avg_attempts),
+                          int(row.best_score)) for difficulty, row in grouped.iterrows()]
+        return overall, by_difficulty
+
+    def fingerprint(self):
+        """Cheap token that changes whenever the stored games change (e.g. to cache analytics)"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Make appended rows durable and visible to scan"""
+
+    def close(self):
+        self.flush()
+
+
+class SQLiteGameStore(GameStore):
+    """game_stats table in the SQLite database"""
+
+    def __init__(self, path=None):
+        self.path = path
+        conn = self._conn()
+        database.initialize_db(conn)
+        for table in self.archive_tables():
+            database.add_match_id_column(conn, table)  # Archived before match ids existed
+        conn.commit()
+
+    def _conn(self, readonly=False):
+        return database.get_connection(self.path, readonly=readonly)
+
+    def append(self, rows):
+        conn = self._conn()
+        with conn:  # All rows or none: a failing row rolls back the ones before it
+            conn.executemany(f'''
+                INSERT INTO game_stats ({", ".join(GAME_COLUMNS)})
+                VALUES ({", ".join("?" * len(GAME_COLUMNS))})
+            ''', rows)
+
+    def archive_tables(self):
+        """Names of the per-month archive tables, oldest first"""
+        return [row[0] for row in self._conn(readonly=True).execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'game_stats_archive_%' "
+            "ORDER BY name")]
+
+    def archive(self, before):
+        """Move games older than `before` into game_stats_archive_YYYY_MM tables.
+
+        Each month's games are also added to game_stats_summary, so user_summary
+        stays exact without reading the archive. Runs in a single transaction.
+        """
+        conn = self._conn()
+        columns = ", ".join(GAME_COLUMNS)
+        with conn:
+            months = [row[0] for row in conn.execute(
+                "SELECT DISTINCT strftime('%Y_%m', timestamp) FROM game_stats WHERE timestamp < ?",
+                (before,))]
+            for month in months:
+                table = f"game_stats_archive_{month}"
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        timestamp DATETIME,
+                        difficulty TEXT,
+                        attempts_array JSON,
+                        attempts_count INTEGER,
+                        won BOOLEAN,
+                        number_to_guess INTEGER,
+                        range_min INTEGER,
+                        range_max INTEGER,
+                        match_id INTEGER
+                    )
+                ''')
+                conn.execute(f'''
+                    INSERT INTO {table} (id, {columns})
+                    SELECT id, {columns} FROM game_stats
+                    WHERE timestamp < ? AND strftime('%Y_%m', timestamp) = ?
+                ''', (before, month))
+                conn.execute('''
+                    INSERT INTO game_stats_summary
+                        (user_id, difficulty, month, games, wins, attempts_sum, best_score)
+                    SELECT user_id, difficulty, ?, COUNT(*),
+                           SUM(CASE WHEN won = 1 THEN 1 ELSE 0 END),
+                           SUM(attempts_count), MIN(attempts_count)
+                    FROM game_stats
+                    WHERE timestamp < ? AND strftime('%Y_%m', timestamp) = ?
+                    GROUP BY user_id, difficulty
+                    ON CONFLICT (user_id, difficulty, month) DO UPDATE SET
+                        games = games + excluded.games,
+                        wins = wins + excluded.wins,
+                        attempts_sum = attempts_sum + excluded.attempts_sum,
+                        best_score = MIN(best_score, excluded.best_score)
+                ''', (month, before, month))
+            return conn.execute("DELETE FROM game_stats WHERE timestamp < ?", (before,)).rowcount
+
+    def fingerprint(self):
+        # Rows are only ever appended (higher ids) or moved to archive tables, so the
+        # max id of each table identifies the content without counting rows
+        conn = self._conn(readonly=True)
+        return ";".join(f"{table}:{conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]}"
+                        for table in self.archive_tables() + ["game_stats"])
+
+    def scan(self, columns=None, user_ids=None, exclude_user_ids=(), since=None,
+             include_archive=False, hot=True, match_ids=None):
+        import pandas as pd
+        columns = columns or GAME_COLUMNS
+        conditions, params = [], []
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            conditions.append(f"user_id IN ({', '.join('?' * len(user_ids))})")
+            params += user_ids
+        if match_ids is not None:
+            match_ids = [int(match_id) for match_id in match_ids]
+            conditions.append(f"match_id IN ({', '.join('?' * len(match_ids))})")
+            params += match_ids
+        exclude_user_ids = list(exclude_user_ids)
+        if exclude_user_ids:
+            conditions.append(f"user_id NOT IN ({', '.join('?' * len(exclude_user_ids))})")
+            params += exclude_user_ids
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        # Archived months first, so rows stay in insertion order
+        tables = (self.archive_tables() if include_archive else []) + (["game_stats"] if hot else [])
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        query = " UNION ALL ".join(f"SELECT {', '.join(columns)} FROM {table}{where}" for table in tables)
+        rows = self._conn(readonly=True).execute(query, params * len(tables)).fetchall()
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        if "match_id" in columns:
+            # With NULLs pandas would infer float64, which cannot hold 63-bit ids
+            position = columns.index("match_id")
+            df["match_id"] = pd.array([row[position] for row in rows], dtype="Int64")
+        return df
+
+    def scan_after(self, checkpoint=None, columns=None):
+        # AUTOINCREMENT ids only grow and archive() keeps them, so the checkpoint is the
+        # largest id read; archive tables are included for games archived since then
+        import pandas as pd
+        columns = columns or GAME_COLUMNS
+        checkpoint = checkpoint or 0
+        tables = self.archive_tables() + ["game_stats"]
+        query = " UNION ALL ".join(f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > ?"
+                                   for table in tables)
+        rows = self._conn(readonly=True).execute(f"SELECT * FROM ({query}) ORDER BY id",
+                                                 [checkpoint] * len(tables)).fetchall()
+        df = pd.DataFrame.from_records([row[1:] for row in rows], columns=columns)
+        if "match_id" in columns:
+            position = columns.index("match_id") + 1
+            df["match_id"] = pd.array([row[position] for row in rows], dtype="Int64")
+        return df, rows[-1][0] if rows else checkpoint
+
+    def user_summary(self, user_id):
+        cursor = self._conn().cursor()
+        # Get statistics by difficulty, from the hot table plus the archived totals
+        cursor.execute('''
+            SELECT 
+                difficulty,
+                SUM(games) as games,
+                SUM(wins) as wins,
+                SUM(attempts_sum) as attempts_sum,
+                MIN(best_score) as best_score
+            FROM (
+                SELECT difficulty, COUNT(*) as games,
+                       SUM(CASE WHEN won = 1 THEN 1 ELSE 0 END) as wins,
+                       SUM(attempts_count) as attempts_sum, MIN(attempts_count) as best_score
+                FROM game_stats
+                WHERE user_id = ?
+                GROUP BY difficulty
+                UNION ALL
+                SELECT difficulty, games, wins, attempts_sum, best_score
+                FROM game_stats_summary
+                WHERE user_id = ?
+            )
+            GROUP BY difficulty
+        ''', (user_id, user_id))
+        rows = cursor.fetchall()
+        
+        # Overall statistics are the sum of the difficulties
+        total_games = sum(row[1] for row in rows)
+        if not total_games:
+            return (0, None, None), []
+        overall = (total_games, sum(row[2] for row in rows), sum(row[3] or 0 for row in rows) / total_games)
+        by_difficulty = [(difficulty, games, wins, (attempts_sum or 0) / games, best)
+                         for difficulty, games, wins, attempts_sum, best in rows]
+        return overall, by_difficulty
+
+
+class ColumnarGameStore(GameStore):
+    """Append-only log of Parquet segments (requires pyarrow).
+
+    Appended rows are buffered and written once segment_rows rows are
+    pending, or on flush(). Segments are named by time, process and sequence,
+    so several writers can share a directory and segments sort in write order.
+    A flush of a few rows (one game, under BackgroundWriter) extends this
+    writer's newest segment while it has fewer than open_segment_rows rows and
+    no other segment came after it: the segment is rewritten under a temporary
+    name and renamed, so readers see it before or after, never half written.
+    Rows are only ever added at the end, so scans only need to list the
+    directory and read the projected columns.
+    """
+
+    def __init__(self, directory, segment_rows=50_000, open_segment_rows=10_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("The columnar backend requires pyarrow (pip install pyarrow)")
+        self.pa, self.ds, self.pq = pa, ds, pq
+        self.schema = pa.schema([
+            ("user_id", pa.int64()), ("timestamp", pa.string()), ("difficulty", pa.string()),
+            ("attempts_array", pa.binary()), ("attempts_count", pa.int64()), ("won", pa.bool_()),
+            ("number_to_guess", pa.int64()), ("range_min", pa.int64()), ("range_max", pa.int64()),
+            ("match_id", pa.int64()),  # Null when read from segments written before match ids
+        ])
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.open_segment_rows = open_segment_rows
+        self.buffer = []
+        self._sequence = itertools.count()
+        self._open_segment = None  # Name of this writer's newest segment, while it can be extended
+        self._open_rows = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.segment_rows:
+            self.flush()
+
+    def _new_segment_name(self):
+        # Zero-padded time first: sorts after every older segment, including the segment-<8 digits> ones
+        return f"segment-{time.time_ns():020d}-{os.getpid()}-{next(self._sequence):06d}.parquet"
+
+    def flush(self):
+        if not self.buffer:
+            return
+        columns = zip(*self.buffer)
+        table = self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema)
+        name = self._open_segment
+        if (name is None or self._open_rows + table.num_rows > self.open_segment_rows
+                or self._segments()[-1:] != [name]):
+            name, self._open_rows = self._new_segment_name(), 0
+        else:
+            table = self.pa.concat_tables([self.pq.read_table(os.path.join(self.directory, name),
+                                                              schema=self.schema), table])
+        # Write under a hidden temporary name and rename, so readers never see a partial segment
+        temp_path = os.path.join(self.directory, f".{name}.tmp")
+        self.pq.write_table(table, temp_path)
+        os.replace(temp_path, os.path.join(self.directory, name))
+        self._open_segment, self._open_rows = name, table.num_rows
+        self.buffer = []
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".parquet"))
+
+    def compact(self):
+        """Merge all segments into one, so scans open a single file.
+
+        Run it while no scan or other writer is active: between writing the merged
+        segment and deleting the old ones a reader would see every game twice.
+        """
+        self.flush()
+        segments = self._segments()
+        if len(segments) < 2:
+            return
+        table = self.ds.dataset([os.path.join(self.directory, name) for name in segments],
+                                format="parquet", schema=self.schema).to_table()
+        self.buffer = list(zip(*[column.to_pylist() for column in table.columns]))
+        self._open_segment = None
+        self.flush()
+        for name in segments:
+            os.remove(os.path.join(self.directory, name))
+
+    def fingerprint(self):
+        # Segments are immutable and only added, or replaced by compact()
+        return ";".join(f"{name}:{os.path.getsize(os.path.join(self.directory, name))}"
+                        for name in self._segments())
+
+    def scan(self, columns=None, user_ids=None, exclude_user_ids=(), since=None,
+             include_archive=False, hot=True, match_ids=None):
+        columns = columns or GAME_COLUMNS
+        dataset = self.ds.dataset(self.directory, format="parquet", schema=self.schema,
+                                  exclude_invalid_files=False)
+        row_filter = None
+        if user_ids is not None:
+            row_filter = self.ds.field("user_id").isin(list(user_ids))
+        if match_ids is not None:
+            matches = self.ds.field("match_id").isin([int(match_id) for match_id in match_ids])
+            row_filter = matches if row_filter is None else row_filter & matches
+        exclude_user_ids = list(exclude_user_ids)
+        if exclude_user_ids:
+            exclusion = ~self.ds.field("user_id").isin(exclude_user_ids)
+            row_filter = exclusion if row_filter is None else row_filter & exclusion
+        if not hot:
+            import pandas as pd
+            return pd.DataFrame(columns=columns)  # Segments are never archived
+        if since is not None:
+            recent = self.ds.field("timestamp") >= since
+            row_filter = recent if row_filter is None else row_filter & recent
+        table = dataset.to_table(columns=columns, filter=row_filter)
+        df = table.to_pandas()
+        if "match_id" in columns:
+            import pandas as pd
+            # With nulls pyarrow would convert to float64, which cannot hold 63-bit ids
+            df["match_id"] = table.column("match_id").to_pandas(types_mapper={self.pa.int64(): pd.Int64Dtype()}.get)
+        return df
+
+
+    def scan_after(self, checkpoint=None, columns=None):
+        # Segments are read in order and compact() keeps that order, so the
+        # checkpoint is the number of rows read so far
+        import pandas as pd
+        columns = columns or GAME_COLUMNS
+        checkpoint = checkpoint or 0
+        tables, offset = [], 0
+        for name in self._segments():
+            path = os.path.join(self.directory, name)
+            rows = self.pq.ParquetFile(path).metadata.num_rows  # From the footer, no data read
+            if offset + rows > checkpoint:
+                table = self.ds.dataset(path, format="parquet", schema=self.schema).to_table(columns=columns)
+                tables.append(table.slice(max(0, checkpoint - offset)))
+            offset += rows
+        if not tables:
+            return pd.DataFrame(columns=columns), checkpoint
+        table = self.pa.concat_tables(tables)
+        df = table.to_pandas()
+        if "match_id" in columns:
+            df["match_id"] = table.column("match_id").to_pandas(types_mapper={self.pa.int64(): pd.Int64Dtype()}.get)
+        return df, offset
+
+
+class WriteError(RuntimeError):
+    """Games that a BackgroundWriter could not save.
+
+    failures holds (row, exception) pairs; row is None when the wrapped store
+    failed while flushing rows it had buffered.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} game(s) could not be saved: {failures[0][1]}")
+
+
+class BackgroundWriter(GameStore):
+    """Wrap a store so that append() only enqueues rows.
+
+    A writer thread drains the bounded queue and appends up to max_batch rows per
+    call to the wrapped store (one transaction for SQLite), so callers never wait
+    on disk I/O unless the queue is full. flush() blocks until everything queued
+    so far is written; reads (scan, user_summary, ...) wait for it too, and
+    pending rows are written at interpreter exit. append() after close() raises.
+
+    "database is locked" errors are retried with a backoff. When a batch still
+    fails, its rows are saved one by one so only the bad rows are lost; flush()
+    and close() then raise WriteError with those rows, pop_failures() returns
+    them without waiting, and at exit they are logged to stderr.
+
+    Metrics: writer.queue_depth, writer.blocked_puts, writer.enqueue_wait,
+    writer.batch_write, writer.rows_written, writer.retries,
+    writer.batch_fallbacks, writer.errors.
+    """
+
+    _STOP = object()
+
+    def __init__(self, store, max_queue=10_000, max_batch=500, retries=5):
+        self.store = store
+        self.path = getattr(store, "path", None)  # Database of the users, as for the wrapped store
+        self.max_batch = max_batch
+        self.retries = retries
+        self.failures = []  # (row, exception) since the last flush(); guarded by _failures_lock
+        self._failures_lock = threading.Lock()
+        self.closed = False
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, name="game-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self._close_at_exit)
+
+    def append(self, rows):
+        if self.closed:
+            raise ValueError("append() on a closed BackgroundWriter")
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                # Back-pressure: the writer is behind, wait for room
+                increment("writer.blocked_puts")
+                start = time.perf_counter()
+                self.queue.put(row)
+                observe("writer.enqueue_wait", time.perf_counter() - start)
+        set_gauge("writer.queue_depth", self.queue.qsize())
+
+    def _fail(self, row, error):
+        increment("writer.errors")
+        print(f"Error saving game: {error}", file=sys.stderr)
+        with self._failures_lock:
+            self.failures.append((row, error))
+
+    def _retry(self, operation, *args):
+        """Call operation, retrying while the database is locked by another writer"""
+        for attempt in range(self.retries + 1):
+            try:
+                return operation(*args)
+            except sqlite3.OperationalError as e:
+                transient = "locked" in str(e) or "busy" in str(e)
+                if not transient or attempt == self.retries:
+                    raise
+                increment("writer.retries")
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+    def _write(self, batch):
+        with timer("writer.batch_write"):
+            try:
+                self._retry(self.store.append, batch)
+                written = len(batch)
+            except Exception:
+                # Save the rows one by one, so only the rows that fail again are lost
+                increment("writer.batch_fallbacks")
+                written = 0
+                for row in batch:
+                    try:
+                        self._retry(self.store.append, [row])
+                        written += 1
+                    except Exception as e:
+                        self._fail(row, e)
+        increment("writer.rows_written", written)
+
+    def _flush_store(self):
+        try:
+            self._retry(self.store.flush)
+        except Exception as e:
+            self._fail(None, e)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            # Gather whatever else is already queued, up to max_batch rows
+            while not isinstance(item, threading.Event) and item is not self._STOP:
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+                    break
+            if batch:
+                self._write(batch)
+            set_gauge("writer.queue_depth", self.queue.qsize())
+            if isinstance(item, threading.Event):
+                self._flush_store()
+                item.set()
+            elif item is self._STOP:
+                self._flush_store()
+                return
+
+    def pop_failures(self):
+        """(row, exception) pairs of the writes that failed so far, forgotten once returned"""
+        with self._failures_lock:
+            failures, self.failures = self.failures, []
+        return failures
+
+    def _raise_failures(self):
+        failures = self.pop_failures()
+        if failures:
+            raise WriteError(failures)
+
+    def _drain(self):
+        if self.thread.is_alive():
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait()
+
+    def flush(self):
+        """Wait until every queued game is written; raise WriteError for the ones that failed"""
+        self._drain()
+        self._raise_failures()
+
+    def close(self):
+        self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join()
+        self._raise_failures()
+
+    def _close_at_exit(self):
+        # A traceback during interpreter shutdown would hide which games were lost: log them instead
+        try:
+            self.close()
+        except WriteError as e:
+            print(f"Error at exit: {e}", file=sys.stderr)
+            for row, error in e.failures:
+                print(f"  lost {row!r}: {error}", file=sys.stderr)
+
+    def scan(self, *args, **kwargs):
+        self._drain()  # Read your own writes
+        return self.store.scan(*args, **kwargs)
+
+    def user_summary(self, user_id):
+        self._drain()
+        return self.store.user_summary(user_id)
+
+    def scan_after(self, checkpoint=None, columns=None):
+        self._drain()
+        return self.store.scan_after(checkpoint, columns)
+
+    def archive(self, before):
+        self._drain()
+        return self.store.archive(before)
+
+    def fingerprint(self):
+        self._drain()
+        return self.store.fingerprint()
+
+
+def open_store(spec=None):
+    """Create the store described by spec (default: GUESSNUMBER_STORAGE or "sqlite")"""
+    spec = spec or os.environ.get("GUESSNUMBER_STORAGE", "sqlite")
+    backend, _, location = spec.partition(":")
+    if backend == "sqlite":
+        store = SQLiteGameStore(location or None)
+    elif backend == "columnar":
+        store = ColumnarGameStore(location or "game_stats_segments")
+    else:
+        raise ValueError(f"Unknown storage backend: {spec}")
+    if os.environ.get("GUESSNUMBER_SKETCHES"):
+        from sketches import SketchingStore  # Approximate analytics are maintained on insert
+        store = SketchingStore(store)
+    return store
+
+
+def copy_games(source, target, batch_size=50_000):
+    """Copy every game from one store to another (e.g. to build a columnar log from SQLite)"""
+    df = source.scan(include_archive=True)
+    df["won"] = df["won"].astype(bool)  # SQLite stores booleans as 0/1
+    df["match_id"] = df["match_id"].astype(object).where(df["match_id"].notna(), None)  # NA -> NULL
+    rows = list(df[GAME_COLUMNS].itertuples(index=False, name=None))
+    for start in range(0, len(rows), batch_size):
+        target.append(rows[start:start + batch_size])
+    target.flush()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Copy game_stats between storage backends")
+    parser.add_argument("source", help='Source store, e.g. "sqlite" or "sqlite:other.db"')
+    parser.add_argument("target", help='Target store, e.g. "columnar:game_stats_segments"')
+    args = parser.parse_args()
+    copied = copy_games(open_store(args.source), open_store(args.target))
+    print(f"Copied {copied} games from {args.source} to {args.target}")
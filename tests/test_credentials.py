@@ -0,0 +1,39 @@
+import itertools
+
+import pytest
+
+import database
+from credentials import hash_password, needs_rehash, verify_password
+from guessNumber import GuessNumberGame
+
+
+@pytest.mark.parametrize("scheme, params", [("scrypt", {"n": 2 ** 10, "r": 8, "p": 1}),
+                                            ("pbkdf2", {"iterations": 1000})])
+def test_hashes_verify_and_need_rehash_at_another_cost(scheme, params):
+    stored = hash_password("secret", scheme, params)
+    assert verify_password("secret", stored) and not verify_password("Secret", stored)
+    assert needs_rehash(stored)
+    assert not needs_rehash(stored, scheme, params)
+
+
+def test_plaintext_needs_rehash():
+    assert verify_password("secret", "secret") and not verify_password("other", "secret")
+    assert needs_rehash("secret")
+    assert not needs_rehash(hash_password("secret"))
+
+
+@pytest.mark.parametrize("legacy", ["secret", hash_password("secret", "pbkdf2", {"iterations": 1000})])
+def test_login_rehashes_legacy_passwords(tmp_path, monkeypatch, legacy):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "games.db"))
+    game = GuessNumberGame(human_only=True)
+    game.conn.execute("INSERT INTO users (email, password) VALUES (?, ?)", ("someone@example.com", legacy))
+    game.conn.commit()
+    answers = itertools.cycle(["someone@example.com", "secret"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+
+    assert game.login()
+    stored = game.conn.execute("SELECT password FROM users").fetchone()[0]
+    assert stored != legacy and not needs_rehash(stored) and verify_password("secret", stored)
+    assert game.login()  # The upgraded hash verifies, and is left as it is
+    assert game.conn.execute("SELECT password FROM users").fetchone()[0] == stored
+    game.store.close()
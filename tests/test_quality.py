@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import numpy as np
+
+import quality
+import simulation
+from regression import load_and_process_data
+from storage import SQLiteGameStore
+from users import AI_EMAIL, user_sources
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def simulate(path, seed, **options):
+    options = {"games": (20, 20), **options}
+    simulation.run_simulation(simulation.SQLiteSink(path), 50, seed=seed, base_time=BASE_TIME,
+                              options=options, synthetic=True)
+
+
+def test_psi():
+    rng = np.random.default_rng(5)
+    edges = np.linspace(-4, 4, 21)
+    baseline = np.histogram(rng.normal(0, 1, 10_000), edges)[0]
+    assert quality.psi(baseline, np.histogram(rng.normal(0, 1, 10_000), edges)[0]) < 0.01
+    assert 0.05 < quality.psi(baseline, np.histogram(rng.normal(0.3, 1, 10_000), edges)[0]) < 0.25
+    assert quality.psi(baseline, np.histogram(rng.normal(1, 1, 10_000), edges)[0]) > 0.25
+
+
+def test_run_checks_flags_drift_between_runs(tmp_path):
+    path = str(tmp_path / "games.db")
+    directory = str(tmp_path / "quality")
+    simulate(path, 1)
+    first = quality.run_checks(SQLiteGameStore(path), directory)
+    assert first["new_games"] == 1000 and first["drift"] == {} and first["alerts"] == []
+
+    simulate(path, 2)
+    second = quality.run_checks(SQLiteGameStore(path), directory)
+    assert second["new_games"] == 1000 and second["alerts"] == []
+    assert max(second["drift"]["simulated"].values()) < 0.1
+
+    simulate(path, 3, range_span=(1000, 5000))  # Wider ranges: longer games
+    third = quality.run_checks(SQLiteGameStore(path), directory)
+    assert "simulated: log_span drifted" in " ".join(third["alerts"])
+    assert third["drift"]["simulated"]["log_span"] > 0.25
+
+
+def test_users_come_from_the_store_database(tmp_path):
+    path = str(tmp_path / "games.db")
+    sink = simulation.SQLiteSink(path)
+    sink.write([(AI_EMAIL, "2024-01-01 00:00:00", "easy", [5, 7, 8], 3, True, 8, 1, 10, 1),
+                (simulation.player_email(0), "2024-01-01 00:00:00", "easy", [2, 9], 2, False, 8, 1, 10, 1),
+                ("someone@example.com", "2024-01-01 00:00:00", "easy", [5, 8], 2, True, 8, 1, 10, 2)])
+    sink.close()
+    assert user_sources(path=path, user_ids=[1, 3]) == {1: "ai", 3: "real"}
+
+    store = SQLiteGameStore(path)
+    assert len(load_and_process_data(store)) == 2  # The AI game is left out
+    assert len(load_and_process_data(store, source_weights={"simulated": 0})) == 1
@@ -0,0 +1,37 @@
+import math
+import random
+
+import pytest
+
+from regression import GuessBounds, from_position
+
+LOW, HIGH = -2 ** 63, 2 ** 63 - 1
+
+
+@pytest.mark.parametrize("position, range_start, range_end, expected", [
+    (0.0, LOW, HIGH, LOW),
+    (1.0, LOW, HIGH, HIGH),
+    (0.5, 0, 2 ** 63, 2 ** 62),
+    (0.25, 2 ** 62, 2 ** 62 + 4, 2 ** 62 + 1),
+    (0.75, 1, 2 ** 62 + 3, 3 * 2 ** 60 + 3),  # A float product would give 3 * 2 ** 60 + 1
+    (1 - 2 ** -53, 0, 2 ** 63, 2 ** 63 - 2 ** 10),
+    (-0.5, 10, 20, 10),
+    (1.5, 10, 20, 20),
+])
+def test_from_position_is_exact(position, range_start, range_end, expected):
+    assert from_position(position, range_start, range_end) == expected
+
+
+@pytest.mark.parametrize("position", [0.0, 0.5, 1.0])
+def test_guess_bounds_converge_on_the_widest_range(position):
+    rng = random.Random(4)
+    limit = math.ceil(math.log(HIGH - LOW + 1, 4 / 3)) + 1  # Each guess removes at least a quarter
+    for _ in range(20):
+        target = rng.randint(LOW, HIGH)
+        bounds = GuessBounds(LOW, HIGH)
+        for guesses in range(1, limit + 1):
+            guess = bounds.clamp(from_position(position, LOW, HIGH))
+            if guess == target:
+                break
+            bounds.update(guess, 1 if guess < target else -1)
+        assert guess == target and guesses <= limit
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import database
+import guessNumber
+import simulation
+from config import LEVELS
+from regression import FEATURES, load_and_process_data, train_model
+from replay import replay_games
+from storage import SQLiteGameStore, decode_attempts
+
+
+def test_replay_matches_play_game(tmp_path, monkeypatch):
+    path = str(tmp_path / "games.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    simulation.run_simulation(simulation.SQLiteSink(path), 20, seed=6, base_time=datetime(2024, 1, 1),
+                              options={"games": (10, 10)}, synthetic=True)
+    store = SQLiteGameStore(path)
+    df = load_and_process_data(store)
+    model = train_model(df[FEATURES], df["next_position"])
+    games = [(difficulty, int(range_min), int(range_max), int(target), decode_attempts(attempts))
+             for difficulty, range_min, range_max, target, attempts
+             in store.scan(["difficulty", "range_min", "range_max", "number_to_guess", "attempts_array"])
+             .head(40).itertuples(index=False, name=None)]
+
+    game = guessNumber.GuessNumberGame()
+    game.ai_model = model
+    game.current_user = 1
+    for name in ("show_stats", "_report_save_errors", "restart_game"):
+        monkeypatch.setattr(game, name, lambda: None)
+    ai_guesses = []
+    get_ai_guess = game.get_ai_guess
+    monkeypatch.setattr(game, "get_ai_guess", lambda *args: ai_guesses.append(get_ai_guess(*args)) or ai_guesses[-1])
+
+    for difficulty, range_min, range_max, target, player_attempts in games:
+        game.range_min, game.range_max, game.max_attempts = range_min, range_max, LEVELS[difficulty]
+        monkeypatch.setattr(guessNumber.random, "randint", lambda low, high: target)
+        moves = iter(str(guess) for guess in player_attempts)
+        monkeypatch.setattr("builtins.input", lambda prompt="": next(moves))
+        ai_guesses.clear()
+        game.play_game()
+        played = ai_guesses[:ai_guesses.index(target) + 1] if target in ai_guesses else ai_guesses
+        assert replay_games(model, [(difficulty, range_min, range_max, target, player_attempts)])[0] == played
+    game.store.close()
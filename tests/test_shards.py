@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime
+
+import database
+import shards
+import simulation
+from tournament import PositionModel
+
+PLAYERS = 6
+SEED = 3
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def new_database(path):
+    """Game database with one simulated player already registered"""
+    conn = database.connect(str(path))
+    database.initialize_db(conn)
+    conn.execute("INSERT INTO users (email, password) VALUES ('player2@test.com', 'x')")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def contents(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            "users": conn.execute("SELECT id, email FROM users ORDER BY id").fetchall(),
+            "sequence": conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone(),
+            "games": conn.execute("SELECT user_id, timestamp, difficulty, attempts_array, attempts_count, won, "
+                                  "number_to_guess, range_min, range_max, match_id FROM game_stats "
+                                  "ORDER BY id").fetchall(),
+        }
+    finally:
+        conn.close()
+
+
+def test_sharded_merge_matches_single_writer(tmp_path):
+    model = PositionModel(0.5)
+    single = new_database(tmp_path / "single.db")
+    simulation.run_simulation(simulation.SQLiteSink(single), PLAYERS, model, SEED, base_time=BASE_TIME)
+    expected = contents(single)
+    assert len(expected["games"]) > 0
+    assert len(expected["users"]) == PLAYERS + 1  # The players and the AI
+
+    for workers in (1, 3):
+        path = new_database(tmp_path / f"sharded-{workers}.db")
+        directory = str(tmp_path / f"shards-{workers}")
+        shards.write_shards(directory, PLAYERS, model, SEED, workers, BASE_TIME)
+        assert shards.merge_shards(directory, path) == len(expected["games"])
+        assert contents(path) == expected
+
+
+def test_merge_is_idempotent(tmp_path):
+    path = new_database(tmp_path / "games.db")
+    directory = str(tmp_path / "shards")
+    written = shards.write_shards(directory, PLAYERS, None, SEED, base_time=BASE_TIME)
+    assert shards.merge_shards(directory, path, keep=True) == written
+    merged = contents(path)
+    assert shards.merge_shards(directory, path, keep=True) == 0
+    assert contents(path) == merged
@@ -0,0 +1,38 @@
+from collections import Counter
+from datetime import datetime
+
+import simulation
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def synthetic_rows(**options):
+    rows = []
+    for batch in simulation.iter_synthetic_rows(20, seed=1, base_time=BASE_TIME, options=options):
+        rows.extend(batch)
+    return rows
+
+
+def test_synthetic_rows_follow_the_options():
+    rows = synthetic_rows(games=(2, 4), range_start=(10, 20), range_span=(5, 5), days=3,
+                          difficulty_mix={"hard": 1})
+    games = Counter(row[0] for row in rows)
+    assert set(games) <= {simulation.player_email(index) for index in range(20)}
+    assert all(2 <= count <= 4 for count in games.values()) and len(games) == 20
+    for email, timestamp, difficulty, attempts, count, won, target, range_min, range_max, _ in rows:
+        assert difficulty == "hard" and 10 <= range_min <= 20 and range_max - range_min == 5
+        assert count == len(attempts) <= simulation.LEVELS["hard"]
+        assert won == (attempts[-1] == target)
+        assert "2024-01-01 00:00:00" <= timestamp < "2024-01-05 00:00:00"
+
+
+def test_synthetic_rows_are_reproducible():
+    assert synthetic_rows() == synthetic_rows()
+
+
+def test_persona_changes_the_guesses():
+    win_rates = {}
+    for persona in ("careful", "casual"):
+        rows = synthetic_rows(games=(200, 200), persona=persona)
+        win_rates[persona] = sum(row[5] for row in rows) / len(rows)
+    assert win_rates["careful"] > win_rates["casual"]
@@ -0,0 +1,68 @@
+import math
+import pickle
+import random
+from collections import Counter
+
+import numpy as np
+
+from sketches import CountMinSketch, ReservoirSample, SketchWriter, SketchingStore, TDigest
+from storage import SQLiteGameStore, game_row
+
+
+def test_count_min_error_bound():
+    rng = random.Random(1)
+    keys = [int(rng.paretovariate(1.1)) for _ in range(50_000)]
+    truth = Counter(keys)
+    sketch = CountMinSketch(width=256, depth=5)
+    sketch.add_counts(truth)
+    bound = math.e / sketch.width * len(keys)
+    errors = [sketch.estimate(key) - count for key, count in truth.items()]
+    assert min(errors) >= 0  # Never undercounts
+    assert sum(error > bound for error in errors) <= len(errors) * math.exp(-sketch.depth)
+
+
+def test_count_min_merge_and_pickle_keep_the_counts():
+    first, second = CountMinSketch(), CountMinSketch()
+    first.add_counts({1: 5, 2: 3})
+    second.add_counts({2: 4, 3: 2 ** 40})
+    first.merge(second)
+    restored = pickle.loads(pickle.dumps(first))
+    assert np.array_equal(restored.table, first.table) and restored.table.dtype == np.int64
+    assert [restored.estimate(key) for key in (1, 2, 3)] == [5, 7, 2 ** 40]
+    assert len(pickle.dumps(CountMinSketch())) < 1000  # Empty counters are not stored
+
+
+def test_tdigest_quantiles():
+    rng = random.Random(2)
+    values = sorted(rng.gauss(0, 1) for _ in range(20_000))
+    digest = TDigest()
+    for value in values:
+        digest.add(value)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        rank = np.searchsorted(values, digest.quantile(q)) / len(values)
+        assert abs(rank - q) < 0.01
+
+
+def test_reservoir_is_uniform():
+    sample = ReservoirSample(size=1000, seed=3)
+    for item in range(100_000):
+        sample.add(item)
+    share = sum(item < 50_000 for item in sample.items) / len(sample.items)
+    assert len(sample.items) == 1000
+    assert abs(share - 0.5) < 4 * math.sqrt(0.25 / 1000)
+
+
+def test_store_flush_waits_for_flush_rows(tmp_path):
+    directory = str(tmp_path / "sketches")
+    writer = SketchWriter(directory, flush_rows=3, db_path=str(tmp_path / "games.db"))
+    store = SketchingStore(SQLiteGameStore(str(tmp_path / "games.db")), writer)
+    for _ in range(2):
+        store.append([game_row(2, "easy", [5, 3], True, 3, 1, 10)])
+        store.flush()
+    assert store.segment_names() == []
+    store.append([game_row(2, "easy", [3], True, 3, 1, 10)])
+    store.flush()
+    assert len(store.segment_names()) == 1
+    store.append([game_row(2, "easy", [3], True, 3, 1, 10)])
+    store.close()
+    assert len(store.segment_names()) == 2
@@ -0,0 +1,127 @@
+import os
+import json
+
+import pytest
+
+from storage import (
+    ATTEMPTS_FORMAT, BackgroundWriter, SQLiteGameStore, WriteError, encode_attempts, decode_attempts, game_row,
+)
+
+LARGEST = 2 ** 63 - 1
+SMALLEST = -2 ** 63
+
+
+@pytest.mark.parametrize("attempts", [
+    [],
+    [0],
+    [1, 50, 100],
+    [63, 64, -64, -65, 127, 128],
+    [2 ** 32, -2 ** 32, 2 ** 62],
+    [LARGEST, SMALLEST, LARGEST - 1, SMALLEST + 1],
+])
+def test_encode_round_trip(attempts):
+    encoded = encode_attempts(attempts)
+    assert encoded[0] == ATTEMPTS_FORMAT
+    assert decode_attempts(encoded) == attempts
+
+
+def test_encode_sizes():
+    assert len(encode_attempts([1, 63, -64])) == 1 + 3  # One byte per small guess
+    assert len(encode_attempts([LARGEST])) == 1 + 10
+    assert len(encode_attempts([SMALLEST])) == 1 + 10
+
+
+def test_decode_legacy_json():
+    assert decode_attempts("[5, 10, 7]") == [5, 10, 7]
+    assert decode_attempts(b"[5, 10, 7]") == [5, 10, 7]  # JSON read back as binary
+    assert decode_attempts(json.dumps([LARGEST])) == [LARGEST]
+
+
+def test_decode_missing():
+    assert decode_attempts(None) == []
+    assert decode_attempts(float("nan")) == []
+
+
+def test_decode_memoryview():
+    assert decode_attempts(memoryview(encode_attempts([3, -3]))) == [3, -3]
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SQLiteGameStore(str(tmp_path / "games.db"))
+    store.append_game(1, "easy", [0, LARGEST, 1], True, 1, 0, LARGEST, match_id=LARGEST)
+    store.append_game(1, "hard", [25, 12], False, 13, 1, 50)
+    df = store.scan()
+    assert [decode_attempts(value) for value in df["attempts_array"]] == [[0, LARGEST, 1], [25, 12]]
+    assert df["range_max"].tolist() == [LARGEST, 50]
+    assert int(df["match_id"].iloc[0]) == LARGEST
+
+
+def test_columnar_store_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    from storage import ColumnarGameStore
+    store = ColumnarGameStore(str(tmp_path / "segments"))
+    store.append_game(1, "easy", [SMALLEST, LARGEST], False, 0, SMALLEST, LARGEST)
+    store.flush()
+    df = store.scan()
+    assert decode_attempts(df["attempts_array"].iloc[0]) == [SMALLEST, LARGEST]
+
+
+def test_columnar_flushes_extend_the_open_segment(tmp_path):
+    pytest.importorskip("pyarrow")
+    from storage import ColumnarGameStore
+    directory = str(tmp_path / "segments")
+    store = ColumnarGameStore(directory, open_segment_rows=25)
+    for target in range(60):  # One game per flush, as under BackgroundWriter
+        store.append([game_row(1, "easy", [target], True, target, 0, 100)])
+        store.flush()
+    assert len(os.listdir(directory)) == 3  # 25 + 25 + 10 rows
+    assert store.scan()["number_to_guess"].tolist() == list(range(60))
+
+
+def test_columnar_writers_share_a_directory(tmp_path):
+    pytest.importorskip("pyarrow")
+    from storage import ColumnarGameStore
+    directory = str(tmp_path / "segments")
+    first, second = ColumnarGameStore(directory), ColumnarGameStore(directory)
+    for target in range(10):
+        writer = first if target % 2 else second
+        writer.append([game_row(1, "easy", [target], True, target, 0, 100)])
+        writer.flush()
+    # Each writer starts a new segment once the other wrote after it: nothing is overwritten
+    assert ColumnarGameStore(directory).scan()["number_to_guess"].tolist() == list(range(10))
+    assert first.scan_after()[1] == 10
+
+
+def test_sqlite_append_is_all_or_nothing(tmp_path):
+    store = SQLiteGameStore(str(tmp_path / "games.db"))
+    with pytest.raises(OverflowError):
+        store.append([game_row(1, "easy", [1], True, 1, 0, 10), game_row(1, "easy", [1], True, 2 ** 64, 0, 10)])
+    assert store.scan().empty
+
+
+def test_writer_keeps_the_good_rows_of_a_failed_batch(tmp_path):
+    writer = BackgroundWriter(SQLiteGameStore(str(tmp_path / "games.db")), retries=0)
+    bad = game_row(1, "easy", [1], True, 2 ** 64, 0, 10)
+    writer.append([game_row(1, "easy", [1], True, 1, 0, 10), bad])
+    with pytest.raises(WriteError) as raised:
+        writer.flush()
+    assert [row for row, _ in raised.value.failures] == [bad]
+    assert writer.scan()["number_to_guess"].tolist() == [1]
+    writer.flush()  # Reported failures are not raised again
+    writer.close()
+
+
+def test_writer_rejects_appends_after_close(tmp_path):
+    writer = BackgroundWriter(SQLiteGameStore(str(tmp_path / "games.db")))
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.append([game_row(1, "easy", [1], True, 1, 0, 10)])
+
+
+def test_writer_logs_failures_at_exit(tmp_path, capsys):
+    writer = BackgroundWriter(SQLiteGameStore(str(tmp_path / "games.db")), retries=0)
+    writer.append([game_row(1, "easy", [1], True, 2 ** 64, 0, 10)])
+    writer._close_at_exit()
+    err = capsys.readouterr().err
+    assert "Error at exit" in err and "lost" in err
+    assert writer.pop_failures() == []
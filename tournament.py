@@ -0,0 +1,157 @@
+"""Tournament: several AI strategies play the same seeded targets.
+
+Each strategy is a model accepted by simulation.simulate_ai_game:
+
+    global          the model trained on the current game_stats (initialize_model)
+    midpoint        baseline that always predicts the middle of the range
+    <path>.pkl      a pickled model, e.g. a per-player model from models.py
+
+Every strategy gets the same games (difficulty, range and target drawn from
+--seed), so differences in the leaderboard come from the strategies only.
+Games are split into chunks played across a process pool.
+
+Usage:
+    python tournament.py --strategy global --strategy midpoint --games 2000 --workers 4
+"""
+import sys
+import json
+import time
+import pickle
+import argparse
+import contextlib
+from multiprocessing import Pool
+
+from simulation import LEVELS, DEFAULT_OPTIONS, make_rng, parse_pair, simulate_ai_game
+
+# Strategies shared with pool workers (set by _init_worker)
+_worker_strategies = None
+
+
+class PositionModel:
+    """Baseline model: always predicts the same position in the range (0.5 = middle)"""
+
+    def __init__(self, position=0.5):
+        self.position = position
+
+    def predict(self, features):
+        return [self.position] * len(features)
+
+
+def load_strategy(spec):
+    """Model for a strategy spec: "global", "midpoint" or the path of a pickled model"""
+    if spec == "global":
+        from regression import initialize_model
+        return initialize_model(verbose=False)
+    if spec == "midpoint":
+        return PositionModel(0.5)
+    with open(spec, "rb") as f:
+        return pickle.load(f)
+
+
+def make_targets(games, seed, range_start=DEFAULT_OPTIONS["range_start"],
+                 range_span=DEFAULT_OPTIONS["range_span"]):
+    """Seeded game set: (difficulty, range_min, range_max, target) tuples"""
+    difficulties = list(LEVELS.keys())
+    targets = []
+    for game_index in range(games):
+        rng = make_rng(seed, "tournament", game_index)
+        difficulty = rng.choice(difficulties)
+        range_min = rng.randint(*range_start)
+        range_max = range_min + rng.randint(*range_span)
+        targets.append((difficulty, range_min, range_max, rng.randint(range_min, range_max)))
+    return targets
+
+
+def _init_worker(strategies):
+    global _worker_strategies
+    _worker_strategies = strategies
+
+
+def play_chunk(task):
+    """Play a chunk of games with one strategy: (name, games, wins, attempts, model_calls, seconds)"""
+    name, targets = task
+    model = _worker_strategies[name]
+    wins = attempts = model_calls = 0
+    start = time.perf_counter()
+    for difficulty, range_min, range_max, target in targets:
+        # The attempt budget of the level is the only use of player_attempts
+        ai_attempts = simulate_ai_game(model, target, range_min, range_max, range(LEVELS[difficulty]))
+        wins += ai_attempts[-1] == target
+        attempts += len(ai_attempts)
+        model_calls += len(ai_attempts) - 1  # The opening midpoint guess does not use the model
+    return name, len(targets), wins, attempts, model_calls, time.perf_counter() - start
+
+
+def run_tournament(strategies, targets, workers=1, chunk_size=100):
+    """Play every game with every strategy and return the leaderboard.
+
+    Args:
+        strategies (dict): name -> model
+        targets (list): Games from make_targets
+        workers (int): Number of processes
+
+    Returns:
+        list: One dict per strategy (name, games, win_rate, mean_attempts,
+              move_latency_us: game time per model call), best win rate
+              first, then fewest attempts
+    """
+    chunks = [targets[start:start + chunk_size] for start in range(0, len(targets), chunk_size)]
+    tasks = [(name, chunk) for name in strategies for chunk in chunks]
+    if workers > 1:
+        with Pool(workers, initializer=_init_worker, initargs=(strategies,)) as pool:
+            results = pool.map(play_chunk, tasks)
+    else:
+        _init_worker(strategies)
+        results = map(play_chunk, tasks)
+
+    totals = {name: [0, 0, 0, 0, 0.0] for name in strategies}
+    for name, games, wins, attempts, model_calls, seconds in results:
+        total = totals[name]
+        total[0] += games
+        total[1] += wins
+        total[2] += attempts
+        total[3] += model_calls
+        total[4] += seconds
+    leaderboard = [{
+        "name": name,
+        "games": games,
+        "win_rate": wins / games if games else 0.0,
+        "mean_attempts": attempts / games if games else 0.0,
+        "move_latency_us": seconds / model_calls * 1e6 if model_calls else 0.0,
+    } for name, (games, wins, attempts, model_calls, seconds) in totals.items()]
+    return sorted(leaderboard, key=lambda row: (-row["win_rate"], row["mean_attempts"]))
+
+
+def print_leaderboard(leaderboard):
+    print(f"{'#':>2} {'strategy':<30} {'games':>7} {'win rate':>9} {'attempts':>9} {'us/move':>9}")
+    for rank, row in enumerate(leaderboard, 1):
+        print(f"{rank:>2} {row['name']:<30} {row['games']:>7} {row['win_rate']:>9.1%} "
+              f"{row['mean_attempts']:>9.2f} {row['move_latency_us']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategy", action="append", dest="strategies",
+                        help="Strategy to enter (repeatable; default: global and midpoint)")
+    parser.add_argument("--games", type=int, default=1000, help="Games per strategy")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the game set")
+    parser.add_argument("--range-start", type=parse_pair, default=DEFAULT_OPTIONS["range_start"],
+                        help="Bounds for the range minimum as MIN-MAX (default: 1-50)")
+    parser.add_argument("--range-span", type=parse_pair, default=DEFAULT_OPTIONS["range_span"],
+                        help="Bounds for the range width as MIN-MAX (default: 20-100)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes")
+    parser.add_argument("--json", default=None, help="Also write the leaderboard to this JSON file")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        strategies = {spec: load_strategy(spec) for spec in args.strategies or ["global", "midpoint"]}
+    targets = make_targets(args.games, args.seed, args.range_start, args.range_span)
+    leaderboard = run_tournament(strategies, targets, args.workers)
+    print_leaderboard(leaderboard)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(leaderboard, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""In-process cache of user identities (email -> id, the AI user, session profiles).
+
+The users table only changes on registration, so lookups are cached per
+database path and shared by the game, the simulator and the analytics.
+Call invalidate() after changing users outside of this module.
+"""
+import threading
+from collections import OrderedDict
+
+import database
+from config import SIMULATED_EMAIL
+from instrumentation import increment
+
+AI_EMAIL = "ai.player@game.com"
+AI_PASSWORD = "ai_password"  # Stored hashed; the AI never logs in
+
+
+class UserCache:
+    """LRU cache of email -> user id and user id -> profile for one database"""
+
+    def __init__(self, path=None, max_size=100_000):
+        self.path = path
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _conn(self, conn, readonly):
+        return conn or database.get_connection(self.path, readonly=readonly)
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > self.max_size:
+                cache.popitem(last=False)
+
+    def get_id(self, email, conn=None, readonly=False):
+        """Id of the user with this email, or None if there is none (not cached)"""
+        with self._lock:
+            if email in self._ids:
+                self._ids.move_to_end(email)
+                increment("users.cache_hits")
+                return self._ids[email]
+        increment("users.cache_misses")
+        row = self._conn(conn, readonly).execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
+        if row is None:
+            return None
+        self._remember(self._ids, email, row[0])
+        return row[0]
+
+    def add(self, email, user_id):
+        """Record a user just inserted (e.g. with cursor.lastrowid)"""
+        self._remember(self._ids, email, user_id)
+
+    def get_or_create(self, email, password, conn=None, commit=True):
+        """Id of the user with this email, inserting it with the given stored password if missing"""
+        user_id = self.get_id(email, conn)
+        if user_id is None:
+            conn = self._conn(conn, False)
+            conn.execute('INSERT OR IGNORE INTO users (email, password) VALUES (?, ?)', (email, password))
+            if commit:
+                conn.commit()
+            self.invalidate(email)
+            user_id = self.get_id(email, conn)
+        return user_id
+
+    def ai_user_id(self, conn=None, readonly=False):
+        """Id of the AI player; created unless readonly (then None if it does not exist)"""
+        if readonly:
+            return self.get_id(AI_EMAIL, conn, readonly=True)
+        user_id = self.get_id(AI_EMAIL, conn)
+        if user_id is None:
+            from credentials import hash_password
+            user_id = self.get_or_create(AI_EMAIL, hash_password(AI_PASSWORD), conn)
+        return user_id
+
+    def profile(self, user_id, conn=None):
+        """Session profile of a user: {"id", "email", "created_at"}"""
+        with self._lock:
+            if user_id in self._profiles:
+                self._profiles.move_to_end(user_id)
+                return self._profiles[user_id]
+        row = self._conn(conn, False).execute(
+            'SELECT id, email, created_at FROM users WHERE id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        profile = {"id": row[0], "email": row[1], "created_at": row[2]}
+        self._remember(self._profiles, user_id, profile)
+        return profile
+
+    def invalidate(self, email=None, user_id=None):
+        """Forget one user (by email and/or id), or everything when called without arguments"""
+        with self._lock:
+            if email is None and user_id is None:
+                self._ids.clear()
+                self._profiles.clear()
+                return
+            if email is not None:
+                self._ids.pop(email, None)
+            if user_id is not None:
+                self._profiles.pop(user_id, None)
+
+
+def source_of(email):
+    """Data source of a user: "ai", "simulated" (simulation.py players) or "real" (everyone else)"""
+    if email == AI_EMAIL:
+        return "ai"
+    return "simulated" if email and SIMULATED_EMAIL.fullmatch(email) else "real"
+
+
+def user_sources(conn=None, path=None, user_ids=None):
+    """{user_id: "real", "simulated" or "ai"} for every user, or only for user_ids"""
+    conn = conn or database.get_connection(path, readonly=True)
+    if user_ids is None:
+        return {user_id: source_of(email) for user_id, email in conn.execute("SELECT id, email FROM users")}
+    user_ids = [int(user_id) for user_id in set(user_ids)]
+    sources = {}
+    for start in range(0, len(user_ids), 500):  # Below SQLite's limit on bound parameters
+        chunk = user_ids[start:start + 500]
+        query = f"SELECT id, email FROM users WHERE id IN ({','.join('?' * len(chunk))})"
+        sources.update((user_id, source_of(email)) for user_id, email in conn.execute(query, chunk))
+    return sources
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_user_cache(path=None):
+    """The shared UserCache of a database (default: database.DB_PATH)"""
+    path = path or database.DB_PATH
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = UserCache(path)
+        return _caches[path]